@@ -0,0 +1,246 @@
+# Benchmark of every stage, from the raw data to the simulation, on a synthetic league
+# (see `synthetic_league.py`), e.g. 48 teams and 60 seasons:
+#
+#   python benchmark.py --teams 48 --seasons 60 --repeat 3
+#
+# The inputs only depend on the arguments, and the results are appended to a json-lines file
+# (one record per run, with the git commit), so the runs of different versions can be compared.
+# The memory of the frames / arrays produced by the stages is recorded as well (`bytes`).
+
+
+import os
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+from leagues import get_league, feeder_of
+from parse_data1_raw2clean import ParseRawData
+from parse_data2_create_teamdata import MakeTeamData
+from parse_data3_create_table import create_table_from_team_data
+from parse_data4_clean_efl_champ_data import create_table as create_champ_table
+from parse_data5_att_def_strength import StrengthIndex, append_strength_to_df_team
+from parse_data6_std_cum_pts import append_std_cum_points
+from parse_data7_merge_rival_info import merge_rival_info
+from parse_data_pipeline import save_all
+from poisson_model.compiled import CompiledModels, predict_season
+from poisson_model.fitting import fit_all_teams
+from poisson_model.simulation import BatchSimulateSeason
+from synthetic_league import generate_league
+
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _nbytes(obj):
+    """
+    memory (bytes) of the frames / arrays in `obj`, including the strings of the object columns.
+    obj : DataFrame, array, or a dict / list / tuple of them, or an object with them as attributes
+    """
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True, deep=True))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, dict):
+        return sum(_nbytes(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(_nbytes(v) for v in obj)
+    if hasattr(obj, '__dict__'):
+        return sum(_nbytes(v) for v in vars(obj).values() if isinstance(v, (pd.DataFrame, pd.Series, np.ndarray, dict)))
+    return 0
+
+
+class Benchmark:
+    def __init__(self, repeat=3):
+        self.repeat = repeat
+        self.stages = {}    # Dict[str_stage, Dict]
+
+    def run(self, name, func, rows=None, memory=False):
+        """
+        Run `func()` `self.repeat` times, record the wall times of `name`, and return the last result.
+        rows : number of rows processed by the stage, or a function of the result
+        memory : record the memory of the result (see `_nbytes`)
+        """
+        times = []
+        for _ in range(self.repeat):
+            t0 = time.perf_counter()
+            result = func()
+            times.append(time.perf_counter() - t0)
+
+        self.stages[name] = {
+            'times': times,
+            'min': min(times),
+            'median': float(np.median(times)),
+            'rows': rows(result) if callable(rows) else rows,
+            'bytes': _nbytes(result) if memory else None,
+        }
+        return result
+
+
+def run_benchmark(folder, nteams=20, nseasons=12, repeat=3, nsims=1000, seed=0):
+    """
+    Generate the synthetic league in `folder` and time every stage in it.
+    return Dict[str_stage, Dict], {'times', 'min', 'median', 'rows', 'bytes'} of each stage
+    """
+    if nseasons < 2:
+        raise ValueError('at least 2 seasons: the first one has no strength of the last season')
+
+    bench = Benchmark(repeat)
+    seasons = bench.run('generate', lambda: generate_league(folder, nteams, nseasons, seed=seed))
+
+    # all the stages use the relative paths
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        league = get_league()
+        os.makedirs(league.clean_dir, exist_ok=True)
+        os.makedirs(feeder_of(league).table_dir, exist_ok=True)
+
+        matchs_dict = bench.run(
+            'parse_raw', lambda: {s: ParseRawData(f'{league.raw_dir}/{s}.txt').parse() for s in seasons},
+            rows=lambda res: sum(len(df) for df in res.values()), memory=True
+        )
+
+        team_data_dict = bench.run(
+            'make_team_data',
+            lambda: {s: MakeTeamData(f'{league.clean_dir}/{s}.csv', df).make_all_teams() for s, df in matchs_dict.items()},
+            rows=lambda res: sum(len(df) for d in res.values() for df in d.values()), memory=True
+        )
+
+        pl_tables = bench.run(
+            'create_table', lambda: {s: create_table_from_team_data(d) for s, d in team_data_dict.items()},
+            rows=lambda res: sum(len(table) for table in res.values()), memory=True
+        )
+        cl_tables = bench.run(
+            'champ_table', lambda: {s: create_champ_table(f'{s}.txt') for s in seasons},
+            rows=lambda res: sum(len(table) for table in res.values()), memory=True
+        )
+
+        strength_index = bench.run(
+            'strength', lambda: StrengthIndex.build(pl_tables, cl_tables),
+            rows=lambda res: len(res.rows), memory=True
+        )
+
+        # the first season has no table of the last season
+        featured = seasons[1:]
+        team_data_dict.update(bench.run(
+            'append_strength',
+            lambda: {
+                s: {team: append_strength_to_df_team(df, strength_index, s, team) for team, df in team_data_dict[s].items()}
+                for s in featured
+            },
+            rows=lambda res: sum(len(df) for d in res.values() for df in d.values()), memory=True
+        ))
+        team_data_dict.update(bench.run(
+            'std_points', lambda: {s: append_std_cum_points(team_data_dict[s]) for s in featured},
+            rows=lambda res: sum(len(df) for d in res.values() for df in d.values()), memory=True
+        ))
+        team_data_dict.update(bench.run(
+            'rival_info', lambda: {s: merge_rival_info(team_data_dict[s]) for s in featured},
+            rows=lambda res: sum(len(df) for d in res.values() for df in d.values()), memory=True
+        ))
+
+        bench.run(
+            'write_files', lambda: save_all(matchs_dict, team_data_dict, pl_tables, cl_tables),
+            rows=sum(len(df) for d in team_data_dict.values() for df in d.values())
+        )
+
+        # predict / simulate the last season. The models are trained by seasons[1] ~ seasons[-1]
+        # (in-sample), since the newly promoted teams may have no earlier season in the top league.
+        season = seasons[-1]
+        team_res_dict, _ = bench.run(
+            'fit', lambda: fit_all_teams(season, season_start=seasons[1], season_end=season),
+            rows=lambda res: len(res[0])
+        )
+        bench.run(
+            'predict', lambda: predict_season(CompiledModels.compile(team_res_dict), season),
+            rows=lambda res: sum(len(df) for df in res.values())
+        )
+        bench.run(
+            'simulate', lambda: BatchSimulateSeason(season, team_res_dict).run(nsims, 'sample', seed=seed),
+            rows=nsims * len(matchs_dict[season]), memory=True
+        )
+    finally:
+        os.chdir(cwd)
+
+    return bench.stages
+
+
+def _print_stages(stages, previous=None):
+    """previous : the stages of the last run with the same config, to show the ratios of the time / memory"""
+    print(f'{"stage":<16} {"min (s)":>10} {"median (s)":>11} {"rows":>10} {"MB":>9}' + ('  vs last  memory' if previous else ''))
+    for name, st in stages.items():
+        nbytes = st.get('bytes')
+        line = (
+            f'{name:<16} {st["min"]:10.4f} {st["median"]:11.4f} {st["rows"] if st["rows"] is not None else "":>10} '
+            f'{f"{nbytes/2**20:.2f}" if nbytes is not None else "":>9}'
+        )
+        if previous and name in previous:
+            line += f'  {st["min"] / previous[name]["min"]:7.2f}x'
+            if nbytes is not None and previous[name].get('bytes'):
+                line += f' {nbytes / previous[name]["bytes"]:7.2f}x'
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark every stage on a synthetic league')
+    parser.add_argument('--teams', type=int, default=20, help='number of teams in the top league')
+    parser.add_argument('--seasons', type=int, default=12, help='number of seasons (2 ~ 99)')
+    parser.add_argument('--repeat', type=int, default=3, help='number of runs of every stage')
+    parser.add_argument('--nsims', type=int, default=1000, help='number of simulated seasons')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=os.path.join(REPO_DIR, 'benchmark_results.jsonl'),
+                        help='json-lines file, one record is appended per run')
+    parser.add_argument('--workdir', default=None, help='folder of the synthetic data (a temporary folder if not given)')
+    args = parser.parse_args()
+
+    # the runs of the same config (the same inputs) are comparable
+    config = {'teams': args.teams, 'seasons': args.seasons, 'nsims': args.nsims, 'seed': args.seed}
+    workdir = args.workdir if args.workdir is not None else tempfile.mkdtemp(prefix='football_bench_')
+    try:
+        stages = run_benchmark(workdir, args.teams, args.seasons, args.repeat, args.nsims, args.seed)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    # the last run with the same config
+    previous = None
+    if os.path.exists(args.output):
+        with open(args.output) as file:
+            for line in file:
+                record = json.loads(line)
+                if record['config'] == config:
+                    previous = record['stages']
+
+    _print_stages(stages, previous)
+
+    record = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'config': config,
+        'repeat': args.repeat,
+        'stages': stages,
+    }
+    with open(args.output, 'a') as file:
+        file.write(json.dumps(record) + '\n')
+    print(f'appended to {args.output}')
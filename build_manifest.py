@@ -0,0 +1,145 @@
+# Build manifest of the pipeline: every (stage, season) records a content hash of its inputs (the
+# raw files, the code of the stage, and the digests of the upstream results) and the files it wrote.
+# A rebuild skips the (stage, season) whose inputs have the same hash and whose files are unchanged,
+# e.g. only the seasons after a changed raw file are built again:
+#
+#   raw_data/1819.txt --> matchs/1819 --> team_data/1819 --(table of 1819)--> team_data/1920
+#   table/Championship/raw_txt/*/1819.txt --> table/1819 (Championship) -----> team_data/1920
+#
+# The table of a season is an input of the strength features of the next season (see
+# `Strength._read_file`), so its digest is part of the hash of the next season, and a changed
+# table invalidates the next season.
+#
+# The manifest of a league is .build/<league name>.json, so the leagues can be built in parallel.
+
+
+import os
+import re
+import sys
+import json
+import hashlib
+import importlib
+
+import pandas as pd
+
+from leagues import get_league
+
+
+BUILD_DIR = '.build'
+MANIFEST_VERSION = 1
+
+
+def digest(*parts):
+    """sha256 of json-serializable `parts` (e.g. other digests, file hashes, settings)"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def file_sha256(path, chunksize=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunksize), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def frame_digest(df):
+    """content hash of a df: the columns and all the values (not the index)"""
+    h = hashlib.sha256(json.dumps([str(col) for col in df.columns]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()
+
+
+def code_version(module_names):
+    """hash of the source files of the modules, e.g. ['parse_data1_raw2clean']"""
+    h = hashlib.sha256()
+    for name in module_names:
+        module = sys.modules.get(name) or importlib.import_module(name)
+        h.update(name.encode())
+        h.update(file_sha256(module.__file__).encode())
+    return h.hexdigest()
+
+
+def _output_files(paths):
+    """the files in `paths` (a folder is expanded to all of its files)"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, name) for name in names]
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def _stat(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+class BuildManifest:
+    """
+    The entries of a league: Dict['<stage>/<season>', {'key', 'outputs', ...}]
+        key     : hash of the inputs
+        outputs : Dict[str_path, [size, mtime_ns, sha256]]
+        and the other fields of `record`, e.g. the digest of the table
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as file:
+                data = json.load(file)
+            # an old manifest is ignored, i.e. everything is built again
+            if data.get('version') == MANIFEST_VERSION:
+                self.entries = data['entries']
+
+    @classmethod
+    def of_league(cls, league=None):
+        league = get_league(league)
+        name = re.sub('[^A-Za-z0-9]+', '_', league.name)
+        return cls(os.path.join(league.root, BUILD_DIR, f'{name}.json'))
+
+    def field(self, stage, season, name):
+        """return the field `name` of (stage, season), None if it has not been built"""
+        return self.entries.get(f'{stage}/{season}', {}).get(name)
+
+    def set_field(self, stage, season, name, value):
+        """
+        set the field `name` of (stage, season) without building it, e.g. after `parse_data_update`
+        (the entry is not fresh any more since its files have been changed)
+        """
+        self.entries.setdefault(f'{stage}/{season}', {'key': None, 'outputs': {}})[name] = value
+
+    def _unchanged(self, path, size, mtime_ns, sha):
+        if not os.path.exists(path):
+            return False
+        if list(_stat(path)) == [size, mtime_ns]:
+            return True
+        return file_sha256(path) == sha
+
+    def is_fresh(self, stage, season, key):
+        """True if (stage, season) was built from the same inputs and its files have not been changed"""
+        entry = self.entries.get(f'{stage}/{season}')
+        if entry is None or entry['key'] != key:
+            return False
+        return all(self._unchanged(path, *info) for path, info in entry['outputs'].items())
+
+    def record(self, stage, season, key, outputs, **fields):
+        """
+        outputs : List[str], the files / folders written by (stage, season)
+        fields : other information for the later stages (json-serializable)
+        """
+        self.entries[f'{stage}/{season}'] = {
+            'key': key,
+            'outputs': {path: [*_stat(path), file_sha256(path)] for path in _output_files(outputs)},
+            **fields,
+        }
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump({'version': MANIFEST_VERSION, 'entries': self.entries}, file, indent=1, sort_keys=True)
+        # the manifest is replaced at once, so it always matches the files it records
+        os.replace(tmp_path, self.path)
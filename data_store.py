@@ -0,0 +1,348 @@
+# Columnar storage of team_data and tables.
+# Every column is saved as a typed .npy file which can be memory-mapped (the codes for a categorical
+# column, e.g. 'Rival'), and `index.json` records the columns, the categories and the rows of each
+# team. Loading only touches the requested columns and teams, so the consumers do not need to parse
+# the wide csv files again.
+#
+# store/team_data/<season>/    : all teams of the season, rows grouped by team
+# store/table/<season>/        : table of Premier League
+# store/champ_table/<season>/  : table of Championship League
+# (the folders of every league are in the registry, see `leagues.py`)
+#
+# The csv files are still the exported format, and every `read_*` function falls back to the csv
+# files if the season has not been saved in the store. `index.json` also records the size / mtime of
+# the csv files of the season when it is saved, and the store of a season is not used any more once
+# its csv files are changed (e.g. by the `__main__` of parse_data1 ~ 7, which only write the csv files).
+
+
+import os
+import re
+import glob
+import json
+import numpy as np
+import pandas as pd
+
+from leagues import get_league, feeder_of
+
+
+STORE_VERSION = 1
+
+
+def _folder(kind, season, league=None):
+    """kind : 'team_data' or 'table'"""
+    league = get_league(league)
+    if kind == 'team_data':
+        return f'{league.store_team_data_dir}/{season}'
+    elif kind == 'table':
+        return f'{league.store_table_dir}/{season}'
+    else:
+        raise ValueError("kind should be 'team_data' or 'table'")
+
+
+def _to_array(series):
+    """convert a column to a typed numpy array (the codes of a categorical column)"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.values
+
+    if pd.api.types.is_datetime64_any_dtype(series):
+        # e.g. 2018-08-12, the same as the csv file
+        return series.dt.strftime('%Y-%m-%d').values.astype(str)
+
+    values = series.values
+    if values.dtype == object:
+        if not all(isinstance(v, str) for v in values):
+            raise TypeError(f'column {series.name} should be numerical, boolean or str')
+        values = values.astype(str)
+    return values
+
+
+def save_frame(folder, df, groups=None, sources=None):
+    """
+    Save `df` to `folder`, one .npy file per column.
+    groups : Dict[str_name, (start_row, stop_row)], e.g. the rows of each team
+    sources : Dict[str_path, [size, mtime_ns] or None], the csv files of the same data (see `_sources`)
+    """
+    os.makedirs(folder, exist_ok=True)
+
+    for i, col in enumerate(df.columns):
+        np.save(f'{folder}/{i}.npy', _to_array(df[col]))
+
+    index = {
+        'version': STORE_VERSION,
+        'nrows': int(df.shape[0]),
+        'columns': list(df.columns),
+        'groups': groups if groups is not None else {},
+        # Dict[str_column, List[str]], the categories of the categorical columns (e.g. 'Rival')
+        'categories': {
+            col: df[col].cat.categories.tolist()
+            for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)
+        },
+        'sources': sources if sources is not None else {},
+    }
+    _write_index(folder, index)
+
+
+def _write_index(folder, index):
+    with open(f'{folder}/index.json', 'w') as file:
+        json.dump(index, file, indent=1)
+
+
+# Dict[str_folder, (mtime_of_index, index, Dict[int_column, memmap])]
+_opened = {}
+
+
+def _open(folder):
+    """return (index, memmaps), the memory-mapped columns are opened once and reused"""
+    mtime = os.path.getmtime(f'{folder}/index.json')
+    if folder in _opened and _opened[folder][0] == mtime:
+        return _opened[folder][1:]
+
+    with open(f'{folder}/index.json') as file:
+        index = json.load(file)
+    if index['version'] != STORE_VERSION:
+        raise ValueError(f'{folder} is saved by store version {index["version"]}, but the current version is {STORE_VERSION}')
+
+    _opened[folder] = (mtime, index, {})
+    return _opened[folder][1:]
+
+
+def _read_index(folder):
+    return _open(folder)[0]
+
+
+def _column(folder, icol):
+    memmaps = _open(folder)[1]
+    if icol not in memmaps:
+        memmaps[icol] = np.load(f'{folder}/{icol}.npy', mmap_mode='r')
+    return memmaps[icol]
+
+
+def load_frame(folder, columns=None, groups=None):
+    """
+    Load the `columns` (all columns if None) of the rows in `groups` (all rows if None).
+    The columns are memory-mapped, so only the selected parts are read.
+    """
+    index = _read_index(folder)
+    all_columns = index['columns']
+
+    if columns is None:
+        columns = all_columns
+    else:
+        missing = set(columns).difference(all_columns)
+        if missing:
+            raise KeyError(f'{sorted(missing)} not in {folder}')
+
+    if groups is None:
+        rows = slice(0, index['nrows'])
+    else:
+        rows = np.concatenate([np.arange(*index['groups'][g]) for g in groups])
+
+    categories = index.get('categories', {})
+
+    data = {}
+    for col in columns:
+        values = _column(folder, all_columns.index(col))[rows]
+        if col in categories:
+            data[col] = pd.Categorical.from_codes(np.array(values), categories=categories[col])
+            continue
+        if values.dtype.kind == 'U':
+            values = values.astype(object)
+        data[col] = np.array(values)
+
+    return pd.DataFrame(data, columns=columns)
+
+
+def _stat(path):
+    """[size, mtime_ns] of a file, None if it does not exist"""
+    if not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _sources(kind, season, league=None):
+    """Dict[str_path, [size, mtime_ns] or None], the csv files of (kind, season)"""
+    league = get_league(league)
+    if kind == 'team_data':
+        paths = sorted(glob.glob(f'{league.team_data_dir}/{season}/*.csv'))
+    else:
+        paths = [league.table_csv(season)]
+    return {path: _stat(path) for path in paths}
+
+
+def is_saved(kind, season, league=None):
+    """True if the season has been saved in the store (it may be older than the csv files)"""
+    return os.path.exists(f'{_folder(kind, season, league)}/index.json')
+
+
+def has_season(kind, season, league=None):
+    """True if the season is in the store, and its csv files have not been changed since it was saved"""
+    if not is_saved(kind, season, league):
+        return False
+    return _read_index(_folder(kind, season, league)).get('sources') == _sources(kind, season, league)
+
+
+def _update_sources(kind, season, league=None):
+    """record the current csv files of a saved season, e.g. after they are written from the store"""
+    folder = _folder(kind, season, league)
+    index = dict(_read_index(folder), sources=_sources(kind, season, league))
+    _write_index(folder, index)
+
+
+### team_data
+def save_team_data(season, df_team_dict, league=None):
+    """df_team_dict : Dict[str_team_name, df_of_team]"""
+    teams = sorted(df_team_dict.keys())
+    groups = {}
+    start = 0
+    for team in teams:
+        groups[team] = (start, start + df_team_dict[team].shape[0])
+        start += df_team_dict[team].shape[0]
+
+    df = pd.concat([df_team_dict[team] for team in teams], ignore_index=True)
+    save_frame(_folder('team_data', season, league), df, groups, _sources('team_data', season, league))
+
+
+def _team_csv(season, team, league=None):
+    return f'{get_league(league).team_data_dir}/{season}/{team}.csv'
+
+
+def _csv_teams(season, league=None):
+    folder = f'{get_league(league).team_data_dir}/{season}'
+    return sorted(re.findall('([A-Za-z ]+).csv$', f)[0] for f in glob.glob(f'{folder}/*.csv'))
+
+
+def teams_of_season(season, league=None):
+    """names of all teams in team_data/<season>"""
+    if has_season('team_data', season, league):
+        return sorted(_read_index(_folder('team_data', season, league))['groups'].keys())
+    return _csv_teams(season, league)
+
+
+def team_data_columns(season, league=None):
+    """columns of team_data/<season>"""
+    if has_season('team_data', season, league):
+        return list(_read_index(_folder('team_data', season, league))['columns'])
+    return list(pd.read_csv(_team_csv(season, _csv_teams(season, league)[0], league), nrows=0).columns)
+
+
+def load_team_data(season, teams=None, columns=None, league=None):
+    """
+    return Dict[str_team_name, df_of_team]
+    teams / columns : only read these teams / columns if not None
+    league : League or the name of a registered league, default is Premier League
+    """
+    if teams is None:
+        teams = teams_of_season(season, league)
+
+    if not has_season('team_data', season, league):
+        df_team_dict = {}
+        for team in teams:
+            df_team = pd.read_csv(_team_csv(season, team, league), usecols=columns)
+            df_team_dict[team] = df_team if columns is None else df_team[columns]
+        return df_team_dict
+    return _load_saved_team_data(season, teams, columns, league)
+
+
+def _load_saved_team_data(season, teams=None, columns=None, league=None):
+    """`load_team_data` from the store, even if the csv files have been changed"""
+    folder = _folder('team_data', season, league)
+    if teams is None:
+        teams = sorted(_read_index(folder)['groups'].keys())
+    df = load_frame(folder, columns, teams)
+    groups = _read_index(folder)['groups']
+
+    df_team_dict = {}
+    start = 0
+    for team in teams:
+        nrows = groups[team][1] - groups[team][0]
+        df_team_dict[team] = df.iloc[start:start+nrows].reset_index(drop=True)
+        start += nrows
+    return df_team_dict
+
+
+def read_team_data(season, team, columns=None, league=None):
+    """return df_of_team, the same as pd.read_csv(f'team_data/{season}/{team}.csv')[columns]"""
+    if not has_season('team_data', season, league):
+        # raise FileNotFoundError for the wrong team name, the same as the csv file
+        if not os.path.exists(_team_csv(season, team, league)):
+            raise FileNotFoundError(_team_csv(season, team, league))
+    elif team not in _read_index(_folder('team_data', season, league))['groups']:
+        raise FileNotFoundError(f'{team} is not in {_folder("team_data", season, league)}')
+
+    return load_team_data(season, [team], columns, league)[team]
+
+
+### tables
+def _table_league(level, league=None):
+    """level 0 is `league` itself (default Premier league), 1 is its feeder league (Championship league)"""
+    if level == 0:
+        return get_league(league)
+    elif level == 1:
+        return feeder_of(league)
+    else:
+        raise ValueError('level should be 0 (Premier league) or 1 (Championship league)')
+
+
+def _levels(league=None):
+    """the levels of the tables: the league and its feeder league (if any)"""
+    return (0, 1) if get_league(league).feeder is not None else (0,)
+
+
+def save_table(season, table, level=0, league=None):
+    league = _table_league(level, league)
+    save_frame(_folder('table', season, league), table, sources=_sources('table', season, league))
+
+
+def read_table(season, level=0, columns=None, league=None):
+    """return the table, the same as pd.read_csv(f'table/{season}.csv')[columns] (level=0)"""
+    league = _table_league(level, league)
+    if has_season('table', season, league):
+        return load_frame(_folder('table', season, league), columns)
+
+    table = pd.read_csv(league.table_csv(season))
+    return table if columns is None else table[columns]
+
+
+### csv <-> store
+def export_csv(season, league=None):
+    """write team_data/<season>/*.csv and the tables of `season` from the store (the csv files are replaced)"""
+    if is_saved('team_data', season, league):
+        os.makedirs(f'{get_league(league).team_data_dir}/{season}', exist_ok=True)
+        for team, df_team in _load_saved_team_data(season, league=league).items():
+            df_team.to_csv(_team_csv(season, team, league), index=False)
+        _update_sources('team_data', season, league)
+
+    for level in _levels(league):
+        table_league = _table_league(level, league)
+        if is_saved('table', season, table_league):
+            load_frame(_folder('table', season, table_league)).to_csv(table_league.table_csv(season), index=False)
+            _update_sources('table', season, table_league)
+
+
+def import_csv(season, league=None):
+    """save team_data/<season>/*.csv and the tables of `season` into the store"""
+    teams = _csv_teams(season, league)
+    if teams:
+        df_team_dict = {team: pd.read_csv(_team_csv(season, team, league)) for team in teams}
+        save_team_data(season, df_team_dict, league)
+
+    for level in _levels(league):
+        table_csv = _table_league(level, league).table_csv(season)
+        if os.path.exists(table_csv):
+            save_table(season, pd.read_csv(table_csv), level, league)
+
+
+if __name__ == '__main__':
+    league = get_league()
+    seasons = sorted(filter(lambda f: f.isdigit(), os.listdir(league.team_data_dir)))
+    if league.feeder is not None:
+        seasons += [
+            s.replace('.csv', '') for s in sorted(os.listdir(feeder_of(league).table_dir))
+            if s.replace('.csv', '') not in seasons
+        ]
+
+    for season in seasons:
+        print(f'[{season}] --- ', end='')
+        import_csv(season, league)
+        print('[done]')
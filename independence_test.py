@@ -1,19 +1,39 @@
 # check the statistical independence between the goals scored by both teams in the match
+#
+# The contingency table (home goals x away goals) is accumulated by streaming the match files, and
+# the chi-square test is checked by resampling the tables:
+#   - permutation : the away goals are permuted among the matches, i.e. random tables with the same
+#                   margins (drawn row by row from the hypergeometric distribution)
+#   - bootstrap   : the matches are resampled from the product of the marginal distributions
+# Every test is run per season, and pooled over the seasons, e.g.
+#
+#   python independence_test.py --start 1011 --end 1920 --nresamples 100000
 
 
+import glob
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import pandas as pd
 from scipy.stats import chi2_contingency
 
+from leagues import get_league
+
+
+# number of resamples in one chunk (one random stream) of `resample_test`
+CHUNK_SIZE = 10000
 
-def read_game_result(start, end):
+
+def read_game_result(start, end, league=None):
     n_season = int(end[:2]) - int(start[:2]) + 1
+    clean_dir = get_league(league).clean_dir
 
     df = []
 
     for i in range(n_season):
         season = f'{int(start[:2])+i:02d}{int(start[2:])+i:02d}'
-        df_iseason = pd.read_csv('clean_data/1011.csv', index_col=0)
+        df_iseason = pd.read_csv(f'{clean_dir}/{season}.csv', index_col=0)
         df.append(df_iseason)
 
     df = pd.concat(df)
@@ -21,32 +41,219 @@ def read_game_result(start, end):
     return df
 
 
-def convert_contingency(df, max_goals=4):
-    df.loc[df.HomeScore >= max_goals, 'HomeScore'] = max_goals
-    df.loc[df.AwayScore >= max_goals, 'AwayScore'] = max_goals
+def _labels(max_goals):
+    return list(range(0, max_goals)) + [f'>{max_goals}']
+
 
-    df['tmp'] = 1
+def contingency_counts(home_goals, away_goals, max_goals=4):
+    """return int array (max_goals+1, max_goals+1), the goals >= max_goals are in the last row / column"""
+    ncat = max_goals + 1
+    home = np.minimum(np.asarray(home_goals, dtype=int), max_goals)
+    away = np.minimum(np.asarray(away_goals, dtype=int), max_goals)
+    return np.bincount(home * ncat + away, minlength=ncat*ncat).reshape(ncat, ncat)
 
-    contingency = pd.pivot_table(df, index='HomeScore', columns='AwayScore', values='tmp', aggfunc=np.sum)
-    contingency = contingency.fillna(0)
-    contingency = contingency.astype(int)
 
-    contingency.columns = list(range(0, max_goals)) + [f'>{max_goals}']
+def to_contingency_df(counts):
+    """the df format of `convert_contingency`"""
+    max_goals = counts.shape[0] - 1
+    contingency = pd.DataFrame(counts, index=_labels(max_goals), columns=_labels(max_goals))
     contingency.columns.name = 'Away goals'
-    contingency.index = list(range(0, max_goals)) + [f'>{max_goals}']
     contingency.index.name = 'Home goals'
     return contingency
 
 
+def convert_contingency(df, max_goals=4):
+    """df : df of the matches (not modified)"""
+    return to_contingency_df(contingency_counts(df['HomeScore'].values, df['AwayScore'].values, max_goals))
+
+
+class ContingencyAccumulator:
+    """
+    Contingency tables of the home / away goals, accumulated chunk by chunk, so the match files are
+    never loaded at once. One table per key (e.g. season).
+    """
+
+    def __init__(self, max_goals=4):
+        self.max_goals = max_goals
+        self.counts = {}    # Dict[key, int array]
+
+    def add(self, key, home_goals, away_goals):
+        counts = contingency_counts(home_goals, away_goals, self.max_goals)
+        if key in self.counts:
+            self.counts[key] += counts
+        else:
+            self.counts[key] = counts
+
+    def add_file(self, key, path, chunksize=1000):
+        """stream a match file (clean_data/<season>.csv) into the table of `key`"""
+        for chunk in pd.read_csv(path, usecols=['HomeScore', 'AwayScore'], chunksize=chunksize):
+            self.add(key, chunk['HomeScore'].values, chunk['AwayScore'].values)
+
+    def add_seasons(self, start=None, end=None, league=None, chunksize=1000):
+        """add clean_data/<season>.csv of `league` from `start` to `end` (default all), one table per season"""
+        for path in sorted(glob.glob(f'{get_league(league).clean_dir}/[0-9]*.csv')):
+            season = path[-8:-4]
+            if (start is None or season >= start) and (end is None or season <= end):
+                self.add_file(season, path, chunksize)
+
+    def pooled(self):
+        """return int array, the sum of all tables"""
+        return sum(self.counts.values())
+
+    def table(self, key):
+        return to_contingency_df(self.counts[key])
+
+
+def _trim(counts):
+    """drop the empty rows / columns"""
+    return counts[counts.sum(axis=1) > 0][:, counts.sum(axis=0) > 0]
+
+
+def chi2_statistic(tables):
+    """
+    Pearson chi-square statistic of many tables at once
+    tables : (..., nrows, ncols), return (...)
+    """
+    tables = np.asarray(tables, dtype=float)
+    n = tables.sum(axis=(-2, -1), keepdims=True)
+    expected = tables.sum(axis=-1, keepdims=True) * tables.sum(axis=-2, keepdims=True) / n
+    terms = np.divide((tables - expected) ** 2, expected, out=np.zeros_like(tables), where=expected > 0)
+    return terms.sum(axis=(-2, -1))
+
+
+def permutation_tables(counts, nresamples, rng):
+    """
+    Random tables with the same margins as `counts`, which is the distribution of the table if the
+    away goals are permuted among the matches.
+    return int array (nresamples, nrows, ncols)
+    """
+    nrows, ncols = counts.shape
+    col_left = np.tile(counts.sum(axis=0), (nresamples, 1))
+    tables = np.zeros((nresamples, nrows, ncols), dtype=np.int64)
+
+    for i, row_total in enumerate(counts.sum(axis=1)):
+        if i == nrows - 1:
+            tables[:, i] = col_left
+            break
+
+        # draw row i from the remaining matches, column by column
+        need = np.full(nresamples, row_total)
+        other = col_left.sum(axis=1)
+        for j in range(ncols - 1):
+            other = other - col_left[:, j]
+            x = rng.hypergeometric(col_left[:, j], other, need)
+            tables[:, i, j] = x
+            need = need - x
+        tables[:, i, ncols-1] = need
+        col_left = col_left - tables[:, i]
+
+    return tables
+
+
+def bootstrap_tables(counts, nresamples, rng):
+    """
+    Random tables of the same number of matches, drawn from the product of the marginal distributions
+    (the null hypothesis of the independence)
+    return int array (nresamples, nrows, ncols)
+    """
+    n = counts.sum()
+    p = np.outer(counts.sum(axis=1), counts.sum(axis=0)).ravel() / n**2
+    return rng.multinomial(n, p / p.sum(), size=nresamples).reshape(nresamples, *counts.shape)
+
+
+_RESAMPLERS = {
+    'permutation': permutation_tables,
+    'bootstrap': bootstrap_tables,
+}
+
+
+def _resample_chunk(method, tables, nresamples, seed):
+    """return (ntables, nresamples), the chi-square statistics of the resampled tables"""
+    rng = np.random.default_rng(seed)
+    resample = _RESAMPLERS[method]
+    return np.stack([chi2_statistic(resample(counts, nresamples, rng)) for counts in tables])
+
+
+def resample_test(tables, method='permutation', nresamples=10000, seed=None, nworkers=1, chunksize=CHUNK_SIZE):
+    """
+    p-values of the chi-square statistic by resampling, for many tables at once
+    tables : List[int array], the contingency tables
+    method : 'permutation' or 'bootstrap'
+    seed : None, int or np.random.SeedSequence
+    nworkers : number of processes (None for the number of CPUs). The resamples are split into
+               chunks of `chunksize`, each with its own child stream of `seed`, so the result only
+               depends on `seed` and `chunksize`, not on `nworkers`.
+    return (statistics, p_values), both shape = (ntables,)
+    """
+    if method not in _RESAMPLERS:
+        raise ValueError("method should be 'permutation' or 'bootstrap'")
+
+    tables = [_trim(np.asarray(counts)) for counts in tables]
+    chunks = [chunksize] * (nresamples // chunksize)
+    if nresamples % chunksize:
+        chunks.append(nresamples % chunksize)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    seeds = seed.spawn(len(chunks))
+
+    if nworkers == 1:
+        results = [_resample_chunk(method, tables, n, s) for n, s in zip(chunks, seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=nworkers) as executor:
+            results = list(executor.map(_resample_chunk, [method] * len(chunks), [tables] * len(chunks), chunks, seeds))
+
+    # (ntables, nresamples)
+    resampled = np.concatenate(results, axis=1)
+    statistics = np.array([chi2_statistic(counts) for counts in tables])
+
+    # the tolerance counts the resamples equal to the observed table despite the rounding
+    p_values = ((resampled >= statistics[:, np.newaxis] * (1 - 1e-12)).sum(axis=1) + 1) / (nresamples + 1)
+    return statistics, p_values
+
+
+def independence_tests(accumulator, nresamples=10000, seed=None, nworkers=1):
+    """
+    The chi-square, permutation and bootstrap tests of every table in `accumulator` and of the pooled table.
+    return df, index = the keys of the tables and 'pooled'
+    """
+    keys = list(accumulator.counts) + ['pooled']
+    tables = list(accumulator.counts.values()) + [accumulator.pooled()]
+
+    seeds = np.random.SeedSequence(seed).spawn(2)
+    stats, p_perm = resample_test(tables, 'permutation', nresamples, seeds[0], nworkers)
+    _, p_boot = resample_test(tables, 'bootstrap', nresamples, seeds[1], nworkers)
+
+    results = []
+    for counts, stat, pp, pb in zip(tables, stats, p_perm, p_boot):
+        chi2, p_value, dof, _ = chi2_contingency(_trim(counts))
+        results.append({
+            'matchs': int(counts.sum()), 'chi2': chi2, 'dof': dof,
+            'p_chi2': p_value, 'p_permutation': pp, 'p_bootstrap': pb
+        })
+    return pd.DataFrame(results, index=keys)
+
+
 if __name__ == '__main__':
-    df = read_game_result(start='1718', end='1718')
-    contingency = convert_contingency(df)
-    print('Contingency table:')
-    print('-----------------')
-    print(contingency)
-    print()
-    
-    chi2, p_value, dof, _ = chi2_contingency(contingency)
-    print(f'Chi square statistic = {chi2:.4f}')
-    print(f'degree of freedom    = {dof}')
-    print(f'p-value              = {p_value:.4f}')
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Independence test of the home / away goals')
+    parser.add_argument('--start', default=None, help='first season, e.g. 1011 (default: all seasons)')
+    parser.add_argument('--end', default=None, help='last season, e.g. 1920')
+    parser.add_argument('--leagues', nargs='*', default=[None], help='registered leagues, default is Premier League')
+    parser.add_argument('--max-goals', type=int, default=4)
+    parser.add_argument('--nresamples', type=int, default=10000)
+    parser.add_argument('--nworkers', type=int, default=1, help='number of processes (0 for the number of CPUs)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for league in args.leagues:
+        accumulator = ContingencyAccumulator(args.max_goals)
+        accumulator.add_seasons(args.start, args.end, league)
+
+        print(f'{get_league(league).name}, pooled contingency table:')
+        print('-----------------')
+        print(to_contingency_df(accumulator.pooled()))
+        print()
+
+        df_tests = independence_tests(accumulator, args.nresamples, args.seed, args.nworkers or None)
+        with pd.option_context('display.float_format', '{:.4f}'.format):
+            print(df_tests)
+        print()
@@ -0,0 +1,303 @@
+# Stage-level instrumentation: wall time, peak RSS, rows in / out and files read / written of every
+# stage, season and team, e.g.
+#
+#   with instrument.span('make_team_data', season=season, rows_in=len(df_matchs)) as sp:
+#       df_team_dict = MakeTeamData(...).make_all_teams()
+#       sp.rows_out = sum(len(df) for df in df_team_dict.values())
+#
+# The spans can be nested (e.g. fit -> team). The trace is saved as json or as a Chrome trace-event
+# file (chrome://tracing or https://ui.perfetto.dev), and one stage can be run under cProfile:
+#
+#   python parse_data_pipeline.py --trace trace.json --chrome-trace trace_chrome.json --profile make_team_data
+#
+# It is disabled by default: `span` returns a shared no-op object, and nothing else is hooked.
+# Notes:
+#   - the files are counted by the 'open' audit event (installed at the first `enable`)
+#   - peak RSS is per span on Linux: every span resets VmHWM of the whole process when it starts
+#     (by /proc/self/clear_refs, see `enable`), otherwise it is the peak of the process so far
+#   - only the current process is traced (e.g. use nworkers=1 to trace every shard / team)
+
+
+import os
+import re
+import sys
+import json
+import time
+import cProfile
+import resource
+from contextlib import contextmanager
+
+
+class _NullSpan:
+    """the span when the instrumentation is disabled"""
+    rows_in = None
+    rows_out = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+# the enabled Tracer, None if disabled
+_tracer = None
+
+_audit_installed = False
+
+
+def _read_status():
+    """return (current RSS, peak RSS) in kB"""
+    try:
+        with open('/proc/self/status') as file:
+            status = file.read()
+        return int(re.search(r'VmRSS:\s+(\d+)', status).group(1)), int(re.search(r'VmHWM:\s+(\d+)', status).group(1))
+    except (OSError, AttributeError):
+        # ru_maxrss is in kB on Linux, and in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            peak //= 1024
+        return None, peak
+
+
+def _reset_peak():
+    """reset the peak RSS of the process, return False if it is not supported"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _audit(event, args):
+    if event != 'open' or _tracer is None or not _tracer.stack:
+        return
+
+    path, mode, flags = args
+    if not isinstance(path, (str, bytes)):
+        return
+    path = os.fsdecode(path)
+    if path.endswith(('.py', '.pyc', '.so')) or path.startswith('/proc/'):
+        return
+
+    if mode is not None:
+        write = any(c in mode for c in 'wax+')
+    else:
+        write = bool(flags & (os.O_WRONLY | os.O_RDWR))
+    span = _tracer.stack[-1]
+    (span.files_written if write else span.files_read).add(path)
+
+
+class Span:
+    """
+    A stage (or a season / team of a stage). Set `rows_in` / `rows_out` in the `with` block.
+    """
+
+    def __init__(self, tracer, name, season=None, team=None, rows_in=None, tags=None):
+        self.tracer = tracer
+        self.name = name
+        self.season = season
+        self.team = team
+        self.tags = tags
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.files_read = set()
+        self.files_written = set()
+        self.peak_rss = 0
+        self.profile = None
+
+    def __enter__(self):
+        tracer = self.tracer
+        if tracer.stack:
+            # keep the peak of the parent before it is reset
+            parent = tracer.stack[-1]
+            parent.peak_rss = max(parent.peak_rss, _read_status()[1])
+        tracer.stack.append(self)
+
+        self.rss_start, self.peak_rss = _read_status()
+        if tracer.reset_peak is not False:
+            tracer.reset_peak = _reset_peak()
+        if tracer.reset_peak:
+            # the peak before the span is not a part of it
+            self.peak_rss = self.rss_start
+
+        if tracer.profile_stage == self.name:
+            self.profile = tracer.profiler
+            self.profile.enable()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        t1 = time.perf_counter()
+        if self.profile is not None:
+            self.profile.disable()
+
+        tracer = self.tracer
+        rss_end, peak = _read_status()
+        self.peak_rss = max(self.peak_rss, peak)
+        tracer.stack.pop()
+        if tracer.stack:
+            parent = tracer.stack[-1]
+            parent.peak_rss = max(parent.peak_rss, self.peak_rss)
+            parent.files_read |= self.files_read
+            parent.files_written |= self.files_written
+
+        tracer.records.append({
+            'name': self.name,
+            'season': self.season,
+            'team': self.team,
+            'depth': len(tracer.stack),
+            'start': self.t0 - tracer.t0,
+            'duration': t1 - self.t0,
+            'rss_start_kb': self.rss_start,
+            'rss_end_kb': rss_end,
+            'peak_rss_kb': self.peak_rss,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'files_read': len(self.files_read),
+            'files_written': len(self.files_written),
+            'error': exc[0].__name__ if exc[0] is not None else None,
+            'tags': self.tags,
+        })
+        return False
+
+
+class Tracer:
+    """the records of all the finished spans, in the order they are finished"""
+
+    def __init__(self, profile_stage=None):
+        """profile_stage : name of the stage run under cProfile (all of its spans)"""
+        self.records = []
+        self.stack = []
+        self.t0 = time.perf_counter()
+        self.pid = os.getpid()
+        # whether the peak RSS is reset at the start of every span, None until the first span
+        self.reset_peak = None
+        self.profile_stage = profile_stage
+        self.profiler = cProfile.Profile() if profile_stage is not None else None
+
+    def write_json(self, path):
+        with open(path, 'w') as file:
+            json.dump({'pid': self.pid, 'per_span_peak_rss': bool(self.reset_peak), 'spans': self.records}, file, indent=1)
+
+    def write_chrome_trace(self, path):
+        """Chrome trace-event format, one complete event ('X') per span"""
+        events = []
+        for rec in self.records:
+            tags = rec['tags'] or {}
+            label = ' '.join(str(s) for s in (rec['name'], *tags.values(), rec['season'], rec['team']) if s is not None)
+            events.append({
+                'name': label,
+                'cat': rec['name'],
+                'ph': 'X',
+                'ts': rec['start'] * 1e6,
+                'dur': rec['duration'] * 1e6,
+                'pid': self.pid,
+                'tid': 0,
+                'args': {k: v for k, v in rec.items() if k not in ('name', 'start', 'duration') and v is not None},
+            })
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+    def write_profile(self, path):
+        """save the cProfile stats of `self.profile_stage` (read by pstats / snakeviz)"""
+        if self.profiler is not None:
+            self.profiler.dump_stats(path)
+
+    def summary(self):
+        """return Dict[str_name, Dict], the total of the spans of every stage name"""
+        summary = {}
+        for rec in self.records:
+            st = summary.setdefault(rec['name'], {'count': 0, 'duration': 0., 'peak_rss_kb': 0, 'rows_in': 0, 'rows_out': 0, 'files_read': 0, 'files_written': 0})
+            st['count'] += 1
+            st['duration'] += rec['duration']
+            st['peak_rss_kb'] = max(st['peak_rss_kb'], rec['peak_rss_kb'] or 0)
+            for key in ('rows_in', 'rows_out', 'files_read', 'files_written'):
+                st[key] += rec[key] or 0
+        return summary
+
+    def print_summary(self):
+        print(f'{"stage":<24} {"count":>6} {"time (s)":>9} {"peak RSS (MB)":>14} {"rows in":>9} {"rows out":>9} {"read":>6} {"written":>8}')
+        for name, st in self.summary().items():
+            print(
+                f'{name:<24} {st["count"]:6d} {st["duration"]:9.3f} {st["peak_rss_kb"]/1024:14.1f} '
+                f'{st["rows_in"]:9d} {st["rows_out"]:9d} {st["files_read"]:6d} {st["files_written"]:8d}'
+            )
+
+
+def enable(profile_stage=None):
+    """
+    start a new trace, return Tracer
+    Side effect on Linux: the start of every span resets the peak RSS (VmHWM in /proc/self/status)
+    of the whole process, so the peak seen by other code (e.g. ru_maxrss) is only the peak since the
+    last span started. Nothing is reset before the first span.
+    """
+    global _tracer, _audit_installed
+    if not _audit_installed:
+        # an audit hook cannot be removed, it returns at once if disabled
+        sys.addaudithook(_audit)
+        _audit_installed = True
+    _tracer = Tracer(profile_stage)
+    return _tracer
+
+
+def disable():
+    """stop the trace, return the Tracer (None if it was not enabled)"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def is_enabled():
+    return _tracer is not None
+
+
+def span(name, season=None, team=None, rows_in=None, **tags):
+    """
+    return the context manager of a stage, a shared no-op object if disabled
+    tags : other labels of the span, e.g. league='Premier League'
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+    return Span(_tracer, name, season, team, rows_in, tags or None)
+
+
+@contextmanager
+def tracing(json_path=None, chrome_path=None, profile_stage=None, profile_path=None, summary=True):
+    """
+    Trace the block and write the results, e.g. in the `__main__` of the scripts.
+    profile_path : default is <profile_stage>.prof
+    """
+    tracer = enable(profile_stage)
+    try:
+        yield tracer
+    finally:
+        disable()
+        if json_path is not None:
+            tracer.write_json(json_path)
+        if chrome_path is not None:
+            tracer.write_chrome_trace(chrome_path)
+        if profile_stage is not None:
+            tracer.write_profile(profile_path if profile_path is not None else f'{profile_stage}.prof')
+        if summary:
+            tracer.print_summary()
+
+
+def add_arguments(parser):
+    """the command line options of `tracing` (argparse)"""
+    parser.add_argument('--trace', default=None, help='write the json trace of the stages')
+    parser.add_argument('--chrome-trace', default=None, help='write the Chrome trace-event file of the stages')
+    parser.add_argument('--profile', default=None, help='run the stage under cProfile, saved to <stage>.prof')
+
+
+def tracing_from_args(args):
+    """`tracing` of the options from `add_arguments`, a no-op if none of them is given"""
+    if args.trace is None and args.chrome_trace is None and args.profile is None:
+        return _NULL_SPAN
+    return tracing(args.trace, args.chrome_trace, args.profile)
@@ -0,0 +1,154 @@
+# Registry of the leagues: the directories of the data, the number of teams, the feeder league
+# (the league below it, where the promoted teams come from) and the aliases of the team names.
+# The pipeline checks the number of teams of every parsed season (`League.check_teams`).
+#
+# The default registry is the current data:
+#   Premier League : raw_data/, clean_data/, team_data/, table/<season>.csv and store/
+#   Championship   : the tables only, table/Championship/raw_txt/ and table/Championship/csv/
+# The other leagues keep the same layout under their own root folder, e.g. leagues/la_liga/raw_data,
+# and can be registered from a json file (see `load_registry`):
+#   [{"name": "La Liga", "root": "leagues/la_liga", "nteams": 20, "feeder": "Segunda"},
+#    {"name": "Segunda", "root": "leagues/segunda", "nteams": 22, "matches": false}]
+
+
+import os
+import json
+
+
+class League:
+    """
+    The data of a league. The folders are under `root` unless they are given explicitly.
+    matches : True if the league has the match data (raw_data -> clean_data -> team_data -> table),
+              False if only the tables are available (parsed from `raw_table_dir`, see parse_data4)
+    """
+
+    def __init__(self, name, nteams, root='', feeder=None, aliases=None, matches=True,
+                 raw_dir=None, clean_dir=None, team_data_dir=None, table_dir=None,
+                 raw_table_dir=None, store_team_data_dir=None, store_table_dir=None):
+        """
+        feeder : name of the league where the promoted teams come from, None for the lowest league
+        aliases : Dict[str_name_in_raw_data, str_name], e.g. {'Wolverhampton': 'Wolves'}, so every
+                  team has the same name in all the leagues
+        """
+        self.name = name
+        self.nteams = nteams
+        self.root = root
+        self.feeder = feeder
+        self.aliases = dict(aliases) if aliases else {}
+        self.matches = matches
+
+        self.raw_dir = raw_dir if raw_dir is not None else os.path.join(root, 'raw_data')
+        self.clean_dir = clean_dir if clean_dir is not None else os.path.join(root, 'clean_data')
+        self.team_data_dir = team_data_dir if team_data_dir is not None else os.path.join(root, 'team_data')
+        self.table_dir = table_dir if table_dir is not None else os.path.join(root, 'table')
+        self.raw_table_dir = raw_table_dir if raw_table_dir is not None else os.path.join(root, 'table', 'raw_txt')
+        self.store_team_data_dir = store_team_data_dir if store_team_data_dir is not None else os.path.join(root, 'store', 'team_data')
+        self.store_table_dir = store_table_dir if store_table_dir is not None else os.path.join(root, 'store', 'table')
+
+    def __repr__(self):
+        return f'League({self.name!r}, nteams={self.nteams}, feeder={self.feeder!r})'
+
+    @property
+    def name_col(self):
+        """column of the team names in the tables"""
+        return 'Team' if self.matches else 'Name'
+
+    def table_csv(self, season):
+        return f'{self.table_dir}/{season}.csv'
+
+    def check_teams(self, season, teams):
+        """teams : the team names of `season` (may repeat), raise ValueError if there are not `nteams` teams"""
+        nteams = len(set(teams))
+        if nteams != self.nteams:
+            raise ValueError(f'{self.name} {season}: {nteams} teams, but the league has {self.nteams} teams')
+
+    def canonical(self, names):
+        """names : pd.Series, replace the aliases by the registered names"""
+        if not self.aliases:
+            return names
+        return names.replace(self.aliases)
+
+    def folders(self):
+        """the folders written by the pipeline"""
+        if self.matches:
+            return [self.clean_dir, self.team_data_dir, self.table_dir]
+        return [self.table_dir]
+
+
+PREMIER_LEAGUE = League(
+    'Premier League', nteams=20, feeder='Championship',
+    store_team_data_dir='store/team_data', store_table_dir='store/table'
+)
+CHAMPIONSHIP = League(
+    'Championship', nteams=24, matches=False, aliases={'Wolverhampton': 'Wolves'},
+    table_dir='table/Championship/csv', raw_table_dir='table/Championship/raw_txt',
+    store_table_dir='store/champ_table'
+)
+
+# Dict[str_league_name, League]
+LEAGUES = {}
+
+DEFAULT_LEAGUE = PREMIER_LEAGUE.name
+
+
+def register(league):
+    """add `league` to the registry (replace the league with the same name)"""
+    LEAGUES[league.name] = league
+    return league
+
+
+register(PREMIER_LEAGUE)
+register(CHAMPIONSHIP)
+
+
+def get_league(league=None):
+    """league : League, the name of a registered league, or None for the default league"""
+    if isinstance(league, League):
+        return league
+    if league is None:
+        league = DEFAULT_LEAGUE
+    try:
+        return LEAGUES[league]
+    except KeyError:
+        raise KeyError(f'{league!r} is not a registered league ({", ".join(LEAGUES)})') from None
+
+
+def feeder_of(league=None):
+    """return the feeder League of `league`"""
+    league = get_league(league)
+    if league.feeder is None:
+        raise ValueError(f'{league.name} has no feeder league')
+    return get_league(league.feeder)
+
+
+def load_registry(path='leagues.json'):
+    """register the leagues in the json file (a list of the arguments of `League`), return List[League]"""
+    with open(path) as file:
+        configs = json.load(file)
+    leagues = [register(League(**config)) for config in configs]
+
+    for league in leagues:
+        if league.feeder is not None:
+            get_league(league.feeder)
+    return leagues
+
+
+def shard_waves(names=None):
+    """
+    Split the leagues into waves of independent shards: the feeder of every league is in an earlier
+    wave (or not in `names`), so the leagues in the same wave can be processed in parallel.
+    names : List[str_league_name], default is all registered leagues
+    return List[List[League]]
+    """
+    leagues = [get_league(name) for name in (names if names is not None else LEAGUES)]
+    pending = {league.name: league for league in leagues}
+
+    waves = []
+    while pending:
+        wave = [league for league in pending.values() if league.feeder not in pending]
+        if not wave:
+            raise ValueError(f'circular feeder leagues: {", ".join(pending)}')
+        waves.append(wave)
+        for league in wave:
+            del pending[league.name]
+    return waves
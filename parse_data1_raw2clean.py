@@ -1,101 +1,180 @@
+import io
+import os
+import re
 import glob
+import hashlib
+from collections import namedtuple
 import pandas as pd
 
 
+WEEKDAYS = {'Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday'}
+
+COLUMNS = ['Date', 'Weekday', 'HomeTeam', 'HomeScore', 'AwayScore', 'AwayTeam', 'Winner', 'Stadium', 'City']
+
+# one match in the raw data. `date` is the text of the date line (e.g. 'Sunday 22 May 2011'),
+# it is converted in bulk by `records_to_df`. `lineno` is the line number of the home team in the file.
+RawMatch = namedtuple(
+    'RawMatch',
+    ['date', 'weekday', 'home_team', 'home_score', 'away_score', 'away_team', 'winner', 'stadium', 'city', 'lineno']
+)
+
+# size and sha256 of a parsed raw file, see `parse_new_matchs`
+RawFileState = namedtuple('RawFileState', ['size', 'sha256'])
+
+
+class RawDataError(ValueError):
+    def __init__(self, lineno, msg):
+        super().__init__(f'line {lineno}: {msg}')
+        self.lineno = lineno
+
+
+def _iter_lines(file, start=0, stop=None):
+    """
+    yield (lineno, offset_after_line, line) from byte `start` to byte `stop` of `file`
+    file : file-like object, opened in binary mode (or text mode with '\\n' line endings)
+    lineno is the line number in the whole file (from 1), the lines before `start` are only counted
+    """
+    offset = 0
+    for lineno, line in enumerate(file, 1):
+        size = len(line) if isinstance(line, bytes) else len(line.encode('utf-8'))
+        offset += size
+        if offset <= start:
+            continue
+        if offset - size < start:
+            raise ValueError(f'byte {start} is not at the beginning of a line')
+
+        if stop is not None and offset > stop:
+            break
+        yield lineno, offset, line.decode('utf-8') if isinstance(line, bytes) else line
+
+
+def iter_raw_records(file, start=0, stop=None, date_line=None):
+    """
+    Stream the matches in the raw data.
+    e.g.
+    ====
+    Sunday 22 May 2011    <---- date line
+    Chelsea
+    2-0 
+    Wolves
+
+     Stamford Bridge, 
+    London
+
+    Crystal Palace
+    ...
+
+    file : file-like object of raw_data/<season>.txt
+    start / stop : only parse the lines in the bytes [start, stop), e.g. stop = the size of the new
+                   matchdays at the head of the file (see `parse_new_matchs`)
+    date_line : the date line of the matches before the first date line after `start`
+    yield RawMatch, the line numbers (also of `RawDataError`) are of the whole file
+    """
+    match_info = []    # List: [HomeTeam, Result, AwayTeam, Stadium, City]
+    match_lineno = None
+
+    for lineno, offset, line in _iter_lines(file, start, stop):
+        line = line.strip()
+        if not line:
+            continue
+
+        if not match_info and line.split(' ', 1)[0] in WEEKDAYS:
+            date_line = line
+            continue
+
+        if not match_info:
+            if date_line is None:
+                raise RawDataError(lineno, f'match before any date line: {line!r}')
+            match_lineno = lineno
+
+        match_info.append(line)
+        if len(match_info) == 2 and re.fullmatch('[0-9]+-[0-9]+', line) is None:
+            raise RawDataError(lineno, f'expect the result (e.g. 2-1), but got {line!r}')
+
+        if len(match_info) == 5:
+            home_team, result, away_team, stadium, city = match_info
+            home_score, away_score = map(int, result.split('-'))
+
+            if home_score > away_score:
+                winner = home_team
+            elif home_score < away_score:
+                winner = away_team
+            else:
+                winner = 'Draw'
+
+            weekday = date_line.split()[0]
+            yield RawMatch(date_line, weekday, home_team, home_score, away_score, away_team, winner, stadium.strip(','), city, match_lineno)
+            match_info = []
+
+    if match_info:
+        raise RawDataError(match_lineno, f'incomplete match block: {match_info}')
+
+
+def records_to_df(records):
+    """
+    records : iterable of RawMatch
+    return df, the dates are parsed in bulk
+    """
+    records = list(records)
+    df = pd.DataFrame([r[:-1] for r in records], columns=COLUMNS)
+
+    date = pd.to_datetime(df['Date'], format='%A %d %B %Y', errors='coerce')
+    if date.isna().any():
+        bad = records[date.isna().values.argmax()]
+        raise RawDataError(bad.lineno, f'can not parse the date line {bad.date!r}')
+
+    df['Date'] = date.dt.strftime('%Y-%m-%d')
+    return df
+
+
 class ParseRawData:
-    def __init__(self, filename):
-        with open(filename) as file:
-            self.content = file.readlines()
-            
-    def _is_date(self, line):
-        day = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
-        return any(map(lambda d: d in line, day))
-    
-    def _parse_date(self, line_date):
-        """
-        e.g. line_date = 'Sunday 22 May 2011\n' 
-        return : ('2011-05-22', 'Sunday')
+    def __init__(self, filename, start=0, stop=None):
         """
-        weekday = line_date.split()[0]
-        date = pd.to_datetime(line_date).strftime('%Y-%m-%d')
-        return date, weekday
-    
-    def _parse_match(self, i):
-        """
-        e.g.
-        ====
-        Chelsea     <---- i should be here
-        2-0 
-        Wolves
-
-         Stamford Bridge, 
-        London
-                    <---- returned i is here
-
-        Crystal Palace
-        1-1 
-        Spurs
-
-         Selhurst Park, 
-        London
+        e.g. filename = './raw_data/1920.txt'
+        start / stop : only parse the bytes in [start, stop) (see `iter_raw_records`)
         """
-        content = self.content
-        match_info = []    # List: [HomeTeam, Result, AwayTeam, Stadium, City]
-        
-        while len(match_info) < 5 and i < len(content):
-            line = content[i]
-            if line.strip():
-                match_info.append(line.strip())
-            i += 1
-                
-        home_team = match_info[0]
-        away_team = match_info[2]
-        home_score, away_score = match_info[1].split('-')
-        stadium = match_info[3]
-        city = match_info[4]
-        
-        if home_score > away_score:
-            winner = home_team
-        elif home_score < away_score:
-            winner = away_team
-        elif home_score == away_score:
-            winner = 'Draw'
-        
-        # returned match info
-        rmatch_info = [home_team, int(home_score), int(away_score), away_team, winner, stadium.strip(','), city]
-        
-        return i, rmatch_info
-        
+        self.filename = filename
+        self.start = start
+        self.stop = stop
+
     def parse(self):
-        content = self.content
-        length = len(content)
-        
-        matchs_info = []    # List_matchs[List[str]]
-        i = 0
-        while i < length:
-            line = content[i]
-            
-            if line.strip():
-                
-                if self._is_date(line):
-                    date, weekday = self._parse_date(line)
-                    i += 1
-
-                else:
-                    i, match_info = self._parse_match(i)
-                    matchs_info.append([date, weekday] + match_info)
-                    
-            else:
-                i += 1
-                
-        df = pd.DataFrame(matchs_info)
-        df.columns = ['Date', 'Weekday', 'HomeTeam', 'HomeScore', 'AwayScore', 'AwayTeam', 'Winner', 'Stadium', 'City']
-        return df
+        with open(self.filename, 'rb') as file:
+            return records_to_df(iter_raw_records(file, self.start, self.stop))
+
+
+def raw_file_state(data):
+    """data : bytes of a raw file, return RawFileState"""
+    return RawFileState(len(data), hashlib.sha256(data).hexdigest())
+
+
+def parse_new_matchs(filename, state=None):
+    """
+    Parse only the matches added since the version of the file described by `state`.
+    The raw files list the newest matchday first, so the new matchdays are inserted at the head: if
+    the file ends with the bytes of the last version, only the lines before them are parsed. Otherwise
+    (e.g. a result in the middle is corrected, or matches are added below the first date line) the
+    whole file is parsed again.
+    state : RawFileState of the last parsed version, None to parse the whole file
+    return (df, new_state, head_only)
+        df : the new matches if `head_only`, otherwise all matches of the file
+    """
+    with open(filename, 'rb') as file:
+        data = file.read()
+    new_state = raw_file_state(data)
+
+    if state is not None and len(data) >= state.size:
+        head = len(data) - state.size
+        if raw_file_state(data[head:]) == tuple(state) and (head == 0 or data[head-1:head] == b'\n'):
+            return records_to_df(iter_raw_records(io.BytesIO(data), 0, head)), new_state, True
+    return records_to_df(iter_raw_records(io.BytesIO(data))), new_state, False
     
     
 if __name__ == '__main__':
+    from leagues import get_league
+    league = get_league()
+
     # test the parse result
-    test = ParseRawData('./raw_data/1920.txt').parse()
+    test = ParseRawData(f'{league.raw_dir}/1920.txt').parse()
     print('Test parsing 1920 season raw data')
     print('---------------------------------')
     print(test)
@@ -103,13 +182,13 @@ if __name__ == '__main__':
     
     print('Start to parse all data')
     print('----------------')
-    allseason = sorted(glob.glob('raw_data/*.txt'))
+    allseason = sorted(glob.glob(f'{league.raw_dir}/*.txt'))
 
     for season in allseason:
         print(season)
 
-        # e.g. \\raw_data\\1011.txt -> 1011.csv
-        savefilename = season.split('\\')[1].replace('txt', 'csv')
+        # e.g. raw_data/1011.txt -> 1011.csv
+        savefilename = os.path.basename(season).replace('txt', 'csv')
 
         df = ParseRawData(season).parse()
-        df.to_csv(f'./clean_data/{savefilename}')
\ No newline at end of file
+        df.to_csv(f'{league.clean_dir}/{savefilename}')
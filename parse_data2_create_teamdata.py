@@ -4,21 +4,31 @@ import glob
 import numpy as np
 import pandas as pd
 
+from leagues import get_league
+
+
+# the form windows of team_data: an int n for the sums of the last n matches (e.g. 5 -> 'b5MatchGoal'),
+# 'ewm<n>' for the exponentially weighted means with span n (e.g. 'ewm5' -> 'bEw5MatchGoal')
+FORM_WINDOWS = (5,)
+
 
 class MakeTeamData:
-    def __init__(self, filename):
-        """ e.g. filename = './clean_data/1819.csv' """
-        self.df_season = pd.read_csv(filename, index_col=0)
+    def __init__(self, filename, df_season=None, form_windows=FORM_WINDOWS):
+        """
+        e.g. filename = './clean_data/1819.csv'
+        df_season : df of the matches in this season (e.g. from `ParseRawData.parse()`),
+                    it is read from `filename` if None
+        form_windows : the windows of the form columns of `make_all_teams`, e.g. [3, 5, 10, 'ewm5']
+        """
+        if df_season is None:
+            df_season = pd.read_csv(filename, index_col=0)
+        self.df_season = df_season
+        self.form_windows = form_windows
         self.allteams = sorted(self.df_season['HomeTeam'].unique())
         
         # e.g. filename = './clean_data/1819.csv'  -->  foldername = '1819'
         self.foldername = re.findall('.+/([0-9]{4}).csv', filename)[0]
         
-        try:
-            os.mkdir(f'./team_data/{self.foldername}')
-        except FileExistsError:
-            pass
-        
     def _parse_team(self, team):
         """team: str, return: df of this team"""
         df_team = self.df_season[(self.df_season['HomeTeam'] == team) | (self.df_season['AwayTeam'] == team)].copy()
@@ -55,10 +65,7 @@ class MakeTeamData:
         )).sort_index()
 
         # points earned in the match
-        df2_team['Points'] = df_team['Winner']
-        df2_team['Points'].replace(to_replace=team, value=3, inplace=True)
-        df2_team['Points'].replace(to_replace='Draw', value=1, inplace=True)
-        df2_team.loc[df2_team.Points.str.isnumeric() == False, 'Points'] = 0
+        df2_team['Points'] = _match_points(df2_team['Goal'].values, df2_team['Conceded'].values).astype(int)
 
         # cumulative points including this match
         df2_team['CumPoints'] = df2_team['Points'].cumsum()
@@ -114,7 +121,7 @@ class MakeTeamData:
         df2_team_away['b5AwayMatchPoints'] = df2_team_away['Points'].rolling(6, min_periods=1).sum() - df2_team_away['Points']
         
         # normalized points earned in the last five away matches (excluding this one)
-        b5_max_points = df2_team_away['Round'].rolling(5, min_periods=1).count() * 3 - 3
+        b5_max_points = df2_team_away['Round'].rolling(6, min_periods=1).count() * 3 - 3
         b5_max_points[b5_max_points == 0] = np.nan
         df2_team_away['b5AwayMatchPointRatio'] = df2_team_away['b5AwayMatchPoints'] / b5_max_points
         
@@ -142,17 +149,224 @@ class MakeTeamData:
         
         return df2_team
         
-    def parse(self):
-        for team in self.allteams:    
+    def make_all_teams(self):
+        """return Dict[str_team_name, df_of_team], without writing the csv files"""
+        return make_season_team_data(self.df_season, self.form_windows)
+        
+    def parse(self, league=None):
+        """write team_data/<season>/*.csv of `league` (default Premier League)"""
+        team_data_dir = get_league(league).team_data_dir
+        try:
+            os.mkdir(f'{team_data_dir}/{self.foldername}')
+        except FileExistsError:
+            pass
+        
+        for team, df_team in self.make_all_teams().items():    
             print(team + ' ...', end=' ')
-            df_team = self._parse_team(team)
-            df_team.to_csv(f'./team_data/{self.foldername}/{team}.csv', index=False)
+            df_team.to_csv(f'{team_data_dir}/{self.foldername}/{team}.csv', index=False)
             print('[Done]')
             
             
+def _match_points(goal, conceded):
+    """points earned in the matches: 3 for a win, 1 for a draw and 0 for a loss"""
+    return np.select([goal > conceded, goal == conceded], [3, 1], 0).astype(np.int8)
+
+
+def _group_positions(keys):
+    """
+    keys : array, rows of the same group are contiguous
+    return : the position of each row in its group (start from 0)
+    """
+    n = len(keys)
+    if n == 0:
+        return np.zeros(0, dtype=int)
+    is_start = np.ones(n, dtype=bool)
+    is_start[1:] = keys[1:] != keys[:-1]
+    start = np.flatnonzero(is_start)
+    return np.arange(n) - np.repeat(start, np.diff(np.append(start, n)))
+    
+
+def _form_window(window):
+    """
+    window : int or str, e.g. 5, '5' or 'ewm5'
+    return (column prefix, size, is_ewm), e.g. ('b5', 5, False) or ('bEw5', 5, True)
+    """
+    match = re.fullmatch('(ewm)?([0-9]+)', str(window))
+    if match is None or int(match.group(2)) == 0:
+        raise ValueError(f"form window should be a positive int or 'ewm<span>', but got {window!r}")
+    size = int(match.group(2))
+    if match.group(1):
+        return f'bEw{size}', size, True
+    return f'b{size}', size, False
+
+
+def form_windows_of(columns):
+    """the form windows of the team_data `columns`, e.g. ['b3MatchGoal', 'bEw5MatchGoal'] -> [3, 'ewm5']"""
+    windows = []
+    for col in columns:
+        match = re.fullmatch('b(Ew)?([0-9]+)MatchGoal', col)
+        if match is not None:
+            windows.append(f'ewm{match.group(2)}' if match.group(1) else int(match.group(2)))
+    return windows
+
+
+def _prev_ewm(values, pos, alphas):
+    """
+    The exponentially weighted means of `values` (n, k) before each row (nan for the first row) of the
+    same group, s = alpha * x + (1 - alpha) * s from the first row. The rows of a group are contiguous.
+    One recurrence over the positions for all groups and all `alphas` (m,), return (n, m, k)
+    """
+    n = len(values)
+    out = np.full((n, len(alphas), values.shape[1]), np.nan)
+    if n == 0:
+        return out
+
+    alphas = np.asarray(alphas, dtype=float)[None,:,None]
+    starts = np.flatnonzero(pos == 0)
+    lengths = np.diff(np.append(starts, n))
+    active = np.arange(len(starts))
+    state = np.repeat(values[starts][:,None,:].astype(float), alphas.shape[1], axis=1)
+    for p in range(1, lengths.max()):
+        keep = lengths[active] > p
+        active, state = active[keep], state[keep]
+        rows = starts[active] + p
+        out[rows] = state
+        state = alphas * values[rows][:,None,:] + (1 - alphas) * state
+    return out
+    
+
+def _point_ratio(points, pos, window):
+    """normalized points (=1: earned all points) in the previous `window` matches"""
+    max_points = (np.minimum(pos, window) * 3).astype(float)
+    max_points[max_points == 0] = np.nan
+    return points / max_points
+
+
+def form_columns(points, goal, conceded, pos, windows=FORM_WINDOWS, venue=''):
+    """
+    The cumulative and form columns before each match (excluding it) of all teams.
+    points / goal / conceded : arrays of the matches, the rows of a team are contiguous and sorted by date
+    pos : the position of each row in its team (start from 0), see `_group_positions`
+    windows : the form windows, see `FORM_WINDOWS`
+    venue : '' for all matches, 'Home' or 'Away' for the matches at home / away only
+    return Dict[str_column, array] in the order of the csv files,
+        e.g. 'bCumPoints', 'b5MatchPoints', 'b5MatchPointRatio', 'bCumGoal', 'b5MatchGoal', ... (venue='')
+
+    All windows are derived from one prefix-sum pass (and one EWMA recurrence for the 'ewm' windows)
+    of the stacked points / goal / conceded.
+    """
+    windows = [_form_window(window) for window in windows]
+    values = np.column_stack((points, goal, conceded)).astype(np.int64)
+    n = len(values)
+    
+    cumsum = np.zeros((n + 1, 3), dtype=np.int64)    # cumsum[i] = sum(values[:i])
+    np.cumsum(values, axis=0, out=cumsum[1:])
+    i = np.arange(n)
+    start = i - pos
+    prev_cum = cumsum[i] - cumsum[start]
+
+    ewm_windows = [(prefix, size) for prefix, size, is_ewm in windows if is_ewm]
+    prev_ewm = _prev_ewm(values, pos, [2 / (size + 1) for _, size in ewm_windows])
+    
+    # Dict[str_prefix, ((n, 3) points / goal / conceded, (n,) point ratio)]
+    forms = {}
+    for prefix, size, is_ewm in windows:
+        if is_ewm:
+            form = prev_ewm[:,ewm_windows.index((prefix, size))]
+            forms[prefix] = (form, form[:,0] / 3)
+        else:
+            form = (cumsum[i] - cumsum[np.maximum(i - size, start)]).astype(float)
+            forms[prefix] = (form, _point_ratio(form[:,0], pos, size))
+    
+    cols = {}
+    if not venue:
+        cols['bCumPoints'] = prev_cum[:,0]
+    for prefix, (form, ratio) in forms.items():
+        cols[f'{prefix}{venue}MatchPoints'] = form[:,0]
+        cols[f'{prefix}{venue}MatchPointRatio'] = ratio
+    if venue:
+        cols[f'b{venue}CumGoal'] = prev_cum[:,1]
+        cols[f'b{venue}CumConceded'] = prev_cum[:,2]
+        cols.update({f'{prefix}{venue}MatchGoal': form[:,1] for prefix, (form, _) in forms.items()})
+    else:
+        cols['bCumGoal'] = prev_cum[:,1]
+        cols.update({f'{prefix}MatchGoal': form[:,1] for prefix, (form, _) in forms.items()})
+        cols['bCumConceded'] = prev_cum[:,2]
+    cols.update({f'{prefix}{venue}MatchConceded': form[:,2] for prefix, (form, _) in forms.items()})
+    return cols
+    
+    
+def make_season_team_data(df_season, form_windows=FORM_WINDOWS):
+    """
+    Build the df of all teams in a season at once.
+    df_season : df of the matches, e.g. clean_data/<season>.csv
+    form_windows : the windows of the form columns, see `FORM_WINDOWS`
+    return Dict[str_team_name, df_of_team], the same as `MakeTeamData._parse_team` of every team
+           (with the default `form_windows`)
+    
+    The season is reshaped into a long "team-match" table (two rows per match, sorted by team and date),
+    then every cumulative / form column is computed for all teams by grouped prefix sums (see `form_columns`).
+    The goals / points are int8 and the cumulative counts are int16, 'Rival' is categorical (the
+    teams of the season), and the other columns are float64 as in the csv files.
+    """
+    n = len(df_season)
+    date = pd.to_datetime(df_season['Date']).values
+    home_score = df_season['HomeScore'].values.astype(np.int8)
+    away_score = df_season['AwayScore'].values.astype(np.int8)
+    
+    # the teams are sorted by name, the codes are the index of the team
+    codes, teams = pd.factorize(np.concatenate((df_season['HomeTeam'].values, df_season['AwayTeam'].values)), sort=True)
+    team = codes
+    rival = np.concatenate((codes[n:], codes[:n]))
+    goal = np.concatenate((home_score, away_score))
+    conceded = np.concatenate((away_score, home_score))
+    
+    df = pd.DataFrame({
+        'Date': np.concatenate((date, date)),
+        'isHome': np.repeat([True, False], n),
+        'Rival': pd.Categorical.from_codes(rival, categories=teams),
+        'Goal': goal,
+        'Conceded': conceded,
+        'Points': _match_points(goal, conceded),
+    })
+    order = np.lexsort((df['Date'].values, team))
+    df = df.take(order).reset_index(drop=True)
+    
+    team = team[order]
+    ishome = df['isHome'].values
+    pos = _group_positions(team)
+    df.insert(1, 'Round', (pos + 1).astype(np.int16))
+    
+    points = df['Points'].values
+    goal = df['Goal'].values
+    conceded = df['Conceded'].values
+    
+    cols = form_columns(points, goal, conceded, pos, form_windows)
+    df['CumPoints'] = (cols['bCumPoints'] + points).astype(np.int16)
+    for col, values in cols.items():
+        df[col] = values.astype(np.int16) if col in ('bCumPoints', 'bCumGoal', 'bCumConceded') else values
+    
+    # only consider the matches at home / away
+    for venue, mask in (('Home', ishome), ('Away', ~ishome)):
+        vpos = _group_positions(team[mask])
+        vcols = form_columns(points[mask], goal[mask], conceded[mask], vpos, form_windows, venue)
+        for col, values in vcols.items():
+            full = np.full(len(df), np.nan)
+            full[mask] = values
+            df[col] = full
+    
+    # split into the df of each team
+    df_team_dict = {}
+    bounds = np.flatnonzero(pos == 0).tolist() + [len(df)]
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        df_team_dict[teams[team[start]]] = df.iloc[start:stop].reset_index(drop=True)
+    return df_team_dict
+            
+            
 if __name__ == '__main__':
     # test the parse result
-    df = MakeTeamData('clean_data/1819.csv')._parse_team('Liverpool')
+    league = get_league()
+    df = MakeTeamData(f'{league.clean_dir}/1819.csv')._parse_team('Liverpool')
     print('Test parsing Liverpool data at 1819 season')
     print('------------------------------------------')
     print(df.iloc[:10,:15])
@@ -160,10 +374,10 @@ if __name__ == '__main__':
     
     print('Start to parse all data')
     print('----------------------')
-    csvfiles = glob.glob('./clean_data/*.csv')
+    csvfiles = glob.glob(f'{league.clean_dir}/*.csv')
     csvfiles = list(map(lambda cfile: cfile.replace('\\', '/'), csvfiles))
 
     for cfile in csvfiles:
         print(f' =========== {cfile} ============')
-        MakeTeamData(cfile).parse()
+        MakeTeamData(cfile).parse(league)
         print()
\ No newline at end of file
@@ -3,6 +3,8 @@ import glob
 import re
 import pandas as pd
 
+from leagues import get_league
+
 
 def extract_team_df_info(df):
     win = (df['Points'] == 3).sum()
@@ -30,17 +32,32 @@ def extract_team_df_info(df):
     return return_tup
 
 
-def create_table(season):
-    print(f'===== Read csv files at team_data/{season}/*.csv =====')
-    teams_csv = glob.glob(f'team_data/{season}/*.csv')
+def create_table(season, league=None):
+    """league : League or the name of a registered league (default Premier League)"""
+    team_data_dir = get_league(league).team_data_dir
+    print(f'===== Read csv files at {team_data_dir}/{season}/*.csv =====')
+    teams_csv = sorted(glob.glob(f'{team_data_dir}/{season}/*.csv'))
     
-    table = []    # List[Tuple(team_name, points, home_goals, home_conceded, away_goals, away_conceded)]
+    df_team_dict = {}    # Dict[str_team_name, df_of_team]
     
     for team_csv in teams_csv:        
-        df = pd.read_csv(team_csv)     
+        team_name = re.findall('([A-Za-z ]+).csv$', team_csv)[0]
+        df_team_dict[team_name] = pd.read_csv(team_csv)
+        
+    return create_table_from_team_data(df_team_dict)
+
+
+def create_table_from_team_data(df_team_dict):
+    """
+    df_team_dict : Dict[str_team_name, df_of_team], e.g. from `MakeTeamData.make_all_teams()`
+    Teams with the same points are ranked by the goal difference, then the goals scored (as the
+    Premier League), and the teams still tied keep the order of `df_team_dict`.
+    """
+    table = []    # List[Tuple(team_name, points, home_goals, home_conceded, away_goals, away_conceded)]
+    
+    for team_name, df in df_team_dict.items():
         info = extract_team_df_info(df)
         #points = df.iloc[-1, df.columns.get_loc('CumPoints')]
-        team_name = re.findall('([A-Za-z ]+).csv$', team_csv)[0]
         table.append((team_name, *info))
         
     table = pd.DataFrame(
@@ -51,16 +68,21 @@ def create_table(season):
             'WinAway', 'DrawAway', 'LossAway', 'GoalsAway'
         ]
     )
-    table = table.sort_values(by='Points', ascending=False, ignore_index=True)
+    gf = [df['Goal'].sum() for df in df_team_dict.values()]
+    ga = [df['Conceded'].sum() for df in df_team_dict.values()]
+    table = table.assign(GD=pd.Series(gf) - pd.Series(ga), GF=gf)
+    table = table.sort_values(by=['Points', 'GD', 'GF'], ascending=False, ignore_index=True, kind='mergesort')
+    table = table.drop(columns=['GD', 'GF'])
     table.insert(0, 'Rank', table.index+1)
     return table
 
 
 if __name__ == '__main__':
-    allseason = list(filter(lambda f: f.isdigit(), os.listdir('team_data')))
+    league = get_league()
+    allseason = list(filter(lambda f: f.isdigit(), os.listdir(league.team_data_dir)))
     
     for season in allseason:
-        table = create_table(season)
-        table.to_csv(f'table/{season}.csv', index=False)
-        print(f' Save table at table/{season}.csv')
+        table = create_table(season, league)
+        table.to_csv(league.table_csv(season), index=False)
+        print(f' Save table at {league.table_csv(season)}')
         print()
\ No newline at end of file
@@ -6,12 +6,19 @@ import glob
 import numpy as np
 import pandas as pd
 
+from leagues import CHAMPIONSHIP, get_league
 
-def create_table(season):
+
+def create_table(season, league=CHAMPIONSHIP):
+    """
+    e.g. season = '1819.txt'
+    league : League (or its name) of the tables, the raw_txt files are in `league.raw_table_dir`
+    """
+    league = get_league(league)
     dfs_dict = dict()
     
     for table_type in ['all', 'home', 'away']:
-        path = f'table/Championship/raw_txt/{table_type}/{season}'
+        path = f'{league.raw_table_dir}/{table_type}/{season}'
         with open(path) as file:
             content = file.readlines()
             
@@ -39,15 +46,16 @@ def create_table(season):
         suffixes=('', 'Away')
     )
     
-    df_final['Name'] = df_final['Name'].str.replace('Wolverhampton', 'Wolves')
+    df_final['Name'] = league.canonical(df_final['Name'])
     return df_final
     
     
 if __name__ == '__main__':
-    seasons = list(filter(lambda s: s.endswith('.txt'), os.listdir('table/Championship/raw_txt/all/')))
+    league = CHAMPIONSHIP
+    seasons = list(filter(lambda s: s.endswith('.txt'), os.listdir(f'{league.raw_table_dir}/all/')))
 
     for season in seasons:
         print(f'season {season} -- ', end='')
-        table = create_table(season)
-        table.to_csv(f'table/Championship/csv/{season.replace("txt", "csv")}', index=False)
+        table = create_table(season, league)
+        table.to_csv(league.table_csv(season.replace('.txt', '')), index=False)
         print('[done]')
\ No newline at end of file
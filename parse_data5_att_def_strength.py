@@ -7,23 +7,44 @@ import glob
 import numpy as np
 import pandas as pd
 
+import data_store
+from leagues import get_league, feeder_of
+from team_ids import TEAMS, team_ids
+
+
+def _split_goals(goals):
+    """e.g. goals = ['55:17', ...], return int array [[55, 17], ...], shape = (n, 2)"""
+    return goals.str.split(':', expand=True).astype(int).values
+
+
+def _last_season(season):
+    """e.g. season = '1920' -> '1819'"""
+    return f'{int(season[:2])-1:02d}{int(season[2:])-1:02d}'
+
 
 class Strength:
     """
     Compute attck / defence strength
     """
     
-    def __init__(self, season):
+    def __init__(self, season, pl_tables=None, cl_tables=None, league=None):
         """
         e.g. season=1920
         And it will calculate the attack/defence strength based on the statistics
         of the last (1819) season.
         level = 0 for Premier League, 1 for Championship League
+        pl_tables / cl_tables : Dict[str_season, df_table], the tables of Premier League /
+        Championship League in memory. The tables are read from the csv files if None.
+        league : League or the name of a registered league (default Premier League), level 1 is
+        its feeder league in the registry
         """
         self.season = season
+        self.pl_tables = pl_tables
+        self.cl_tables = cl_tables
+        self.league = get_league(league)
         
     def _get_all_teams(self, season):
-        allteams_path = glob.glob(f'team_data/{season}/*.csv')
+        allteams_path = glob.glob(f'{self.league.team_data_dir}/{season}/*.csv')
         allteams = list(map(lambda s: re.findall('([A-Za-z ]+).csv$', s)[0], allteams_path))
         return allteams
         
@@ -34,9 +55,13 @@ class Strength:
         last_season = f'{y1-1:02d}{y2-1:02d}'
         
         if level == 0:
-            return pd.read_csv(f'table/{last_season}.csv')
+            if self.pl_tables is not None:
+                return self.pl_tables[last_season]
+            return pd.read_csv(self.league.table_csv(last_season))
         elif level == 1:
-            return pd.read_csv(f'table/Championship/csv/{last_season}.csv')
+            if self.cl_tables is not None:
+                return self.cl_tables[last_season]
+            return pd.read_csv(feeder_of(self.league).table_csv(last_season))
         else:
             raise ValueError('self.level should be 0 (Premier league) or 1 (Championship league)')
         
@@ -51,31 +76,31 @@ class Strength:
         # table of last season
         df = self._read_file(level)
         
-        # e.g. goals = '55:17', return (55, 17)
-        split_goals = lambda goals: list(map(lambda s: int(s), goals.split(':')))
-        
-        dfcalc = pd.concat(
-            [
-                df['GoalsHome'].map(split_goals).apply(pd.Series),   # (20, 2)
-                df['GoalsAway'].map(split_goals).apply(pd.Series)    # (20, 2)
-            ],
-            axis=1
+        # e.g. goals = '55:17' -> (55, 17)
+        dfcalc = pd.DataFrame(
+            np.hstack((_split_goals(df['GoalsHome']), _split_goals(df['GoalsAway']))),
+            columns=['HomeGoal', 'HomeConceded', 'AwayGoal', 'AwayConceded'],
+            index=df[self.league.name_col if level == 0 else feeder_of(self.league).name_col]
         )
-        dfcalc.columns = ['HomeGoal', 'HomeConceded', 'AwayGoal', 'AwayConceded']
-        dfcalc.index = df['Team'] if level == 0 else df['Name']
         dfcalc.insert(0, 'Rank', list(range(1, dfcalc.shape[0]+1)))
         
+        # number of home / away matches of each team, and of the entire league
+        # (20 teams and 380 matches in Premier League, 24 teams and 552 matches in Championship League)
+        tms_home = (df['WinHome'] + df['DrawHome'] + df['LossHome']).values
+        tms_away = (df['WinAway'] + df['DrawAway'] + df['LossAway']).values
+        nmatchs = tms_home.sum()
+        
         # League average...
-        lhg = dfcalc['HomeGoal'].sum() / 380      # ...Home Goals
-        lhc = dfcalc['HomeConceded'].sum() / 380  # ...Home Conceded
-        lag = dfcalc['AwayGoal'].sum() / 380      # ...Away Goals
-        lac = dfcalc['AwayConceded'].sum() / 380  # ...Away Conceded
+        lhg = dfcalc['HomeGoal'].sum() / nmatchs      # ...Home Goals
+        lhc = dfcalc['HomeConceded'].sum() / nmatchs  # ...Home Conceded
+        lag = dfcalc['AwayGoal'].sum() / nmatchs      # ...Away Goals
+        lac = dfcalc['AwayConceded'].sum() / nmatchs  # ...Away Conceded
         
         # Teams average...
-        tms_hg = dfcalc['HomeGoal'] / 19        # ...Home Goals
-        tms_hc = dfcalc['HomeConceded'] / 19    # ...Home Conceded
-        tms_ag = dfcalc['AwayGoal'] / 19        # ...Away Goals
-        tms_ac = dfcalc['AwayConceded'] / 19    # ...Away Conceded
+        tms_hg = dfcalc['HomeGoal'] / tms_home        # ...Home Goals
+        tms_hc = dfcalc['HomeConceded'] / tms_home    # ...Home Conceded
+        tms_ag = dfcalc['AwayGoal'] / tms_away        # ...Away Goals
+        tms_ac = dfcalc['AwayConceded'] / tms_away    # ...Away Conceded
         
         # Attack Strength at Home/Away
         dfcalc['ASH'] = tms_hg / lhg
@@ -98,88 +123,140 @@ class Strength:
         """
         # strength are calculated based on last season
         df_pl_strength = self.calc_strength(level=0)
-        df_cl_strength = self.calc_strength(level=1)
         
         # table of this season
-        df = pd.read_csv(f'table/{self.season}.csv')
+        if self.pl_tables is not None:
+            df = self.pl_tables[self.season]
+        else:
+            df = pd.read_csv(self.league.table_csv(self.season))
         
         df_merge_pl = df[['Rank', 'Team', 'Points']].merge(
             df_pl_strength[['ASH', 'ASA', 'DSH', 'DSA']], 
             left_on='Team', right_index=True, 
         )
         df_merge_pl['isFromCL'] = False
+        df_merges = [df_merge_pl]
 
-        df_merge_cl = df[['Rank', 'Team', 'Points']].merge(
-            df_cl_strength[['ASH', 'ASA', 'DSH', 'DSA']], 
-            left_on='Team', right_index=True, 
-        )
-        df_merge_cl['isFromCL'] = True
+        # the promoted teams, from the feeder league in the registry
+        if self.league.feeder is not None:
+            df_cl_strength = self.calc_strength(level=1)
+            df_merge_cl = df[['Rank', 'Team', 'Points']].merge(
+                df_cl_strength[['ASH', 'ASA', 'DSH', 'DSA']], 
+                left_on='Team', right_index=True, 
+            )
+            df_merge_cl['isFromCL'] = True
+            df_merges.append(df_merge_cl)
 
         # final result
-        df_final = pd.concat((df_merge_pl, df_merge_cl), axis=0).sort_values(by='Rank')
+        df_final = pd.concat(df_merges, axis=0).sort_values(by='Rank')
         
         return df_final
     
     
-def append_strength_to_df_team(df_team, df_strength, team_name):
+class StrengthIndex:
+    """
+    Attack / defence strength of every team in many seasons (both promoted teams and the others),
+    stored as arrays and looked up by (season, team, home/away) in O(1):
+        self.strength[row, venue, k] : venue = 0 (home) / 1 (away), k = 0 (attack) / 1 (defence)
+        self.from_cl[row]            : True if the team was in Championship League in the last season
+        row = self.rows[(season, team)]
+    The lookup of many teams is vectorized by the team ids (see `team_ids.py`):
+        row = self.season_rows[season][team_id], -1 if the team is not in the season
+    """
+    
+    def __init__(self, df_strength_dict):
+        """df_strength_dict : Dict[str_season, df_strength], df_strength is from `Strength.compute_result()`"""
+        keys = []
+        ids = {}    # Dict[str_season, int array], the team ids of the rows of the season
+        strength = [np.empty((0, 2, 2))]
+        from_cl = [np.empty(0, dtype=bool)]
+        for season, df_strength in df_strength_dict.items():
+            keys += [(season, team) for team in df_strength['Team']]
+            ids[season] = team_ids(df_strength['Team'].values)
+            strength.append(df_strength[['ASH', 'DSH', 'ASA', 'DSA']].values.reshape(-1, 2, 2))
+            from_cl.append(df_strength['isFromCL'].values.astype(bool))
+        
+        self.rows = {key: i for i, key in enumerate(keys)}
+        self.strength = np.concatenate(strength)
+        self.from_cl = np.concatenate(from_cl)
+        
+        self.season_rows = {}
+        start = 0
+        for season, season_ids in ids.items():
+            season_rows = np.full(len(TEAMS), -1, dtype=int)
+            season_rows[season_ids] = np.arange(start, start + len(season_ids))
+            self.season_rows[season] = season_rows
+            start += len(season_ids)
+        
+    @classmethod
+    def build(cls, pl_tables=None, cl_tables=None, seasons=None, league=None):
+        """
+        pl_tables / cl_tables : Dict[str_season, df_table], read from table/ if None
+        seasons : default is all seasons with the tables of this season and the last season
+        league : League or the name of a registered league (default Premier League), `cl_tables`
+                 are the tables of its feeder league
+        """
+        league = get_league(league)
+        if pl_tables is None:
+            if seasons is None:
+                pl_seasons = [os.path.basename(f)[:-4] for f in glob.glob(f'{league.table_dir}/[0-9]*.csv')]
+            else:
+                pl_seasons = set(seasons) | set(map(_last_season, seasons))
+            pl_tables = {season: data_store.read_table(season, level=0, league=league) for season in pl_seasons}
+        if cl_tables is None:
+            if league.feeder is None:
+                cl_seasons = []
+            elif seasons is None:
+                cl_seasons = [os.path.basename(f)[:-4] for f in glob.glob(f'{feeder_of(league).table_dir}/[0-9]*.csv')]
+            else:
+                cl_seasons = set(map(_last_season, seasons))
+            cl_tables = {season: data_store.read_table(season, level=1, league=league) for season in cl_seasons}
+        if seasons is None:
+            seasons = [
+                season for season in sorted(pl_tables)
+                if _last_season(season) in pl_tables and (league.feeder is None or _last_season(season) in cl_tables)
+            ]
+        
+        return cls({season: Strength(season, pl_tables, cl_tables, league).compute_result() for season in seasons})
+    
+    def lookup(self, season, teams, is_home):
+        """
+        teams / is_home : (n,)
+        return (AS, DS, isFromCL), each shape = (n,), the strength of `teams` at home (is_home) or away
+        """
+        # an unknown name (e.g. a typo of a query) is not registered by the lookup
+        ids = TEAMS.find(teams)
+        season_rows = self.season_rows.get(season, np.empty(0, dtype=int))
+        
+        # -1 for the unknown names, and the teams registered after the index is built (e.g. by the
+        # index of another league) are not in the season either
+        rows = np.full(len(ids), -1, dtype=int)
+        known = (ids >= 0) & (ids < len(season_rows))
+        rows[known] = season_rows[ids[known]]
+        if (rows < 0).any():
+            team = np.asarray(teams, dtype=object)[np.argmax(rows < 0)]
+            raise KeyError(f'no strength of {(season, team)}')
+        
+        venue = np.where(np.asarray(is_home, dtype=bool), 0, 1)
+        return self.strength[rows, venue, 0], self.strength[rows, venue, 1], self.from_cl[rows]
+    
+    
+def append_strength_to_df_team(df_team, strength_index, season, team_name):
     """
     append these columns from to df_team:
     SelfAS, SelfDS, SelfFromCL, RivalAS, RivalDS, RivalFromCL
+    strength_index : StrengthIndex which contains `season`
     """
-    # deal with the attack/defense strength of the rival team
-    # merge the ASH/ASA/DSH/DSA of the rival team
-    df_tmp_rvl = df_team[['Round', 'isHome', 'Rival']].merge(
-        df_strength[['Team', 'ASH', 'ASA', 'DSH', 'DSA', 'isFromCL']],
-        left_on='Rival', right_on='Team', how='left'
-    ).drop('Team', axis=1)
-
-    # decide to keep ASH/DSH or ASA/DSA according to the (rival team) home or away match
-    df_tmp_rvl = pd.concat(
-        [
-            df_tmp_rvl[df_tmp_rvl.isHome].drop(['ASH', 'DSH'], axis=1).rename(
-                {'ASA': 'RivalAS', 'DSA': 'RivalDS', 'isFromCL': 'RivalFromCL'}, axis=1
-            ),
-            df_tmp_rvl[~df_tmp_rvl.isHome].drop(['ASA', 'DSA'], axis=1).rename(
-                {'ASH': 'RivalAS', 'DSH': 'RivalDS', 'isFromCL': 'RivalFromCL'}, axis=1
-            )
-        ]
-    ).sort_values(by='Round')
-
-
-    # merge the AS/DS according to the home or away match
-    df_tmp_self = df_team[['Round', 'isHome']].copy()
-    df_tmp_self['Self'] = team_name
-
-    df_tmp_self = df_tmp_self.merge(
-        df_strength[['Team', 'ASH', 'ASA', 'DSH', 'DSA', 'isFromCL']],
-        left_on='Self', right_on='Team', how='left'
-    ).drop(['Team', 'Self'], axis=1)
-
-    # decide to keep ASH/DSH or ASA/DSA according to the home or away match
-    df_tmp_self = pd.concat(
-        [
-            df_tmp_self[df_tmp_self.isHome].drop(['ASA', 'DSA'], axis=1).rename(
-                {'ASH': 'SelfAS', 'DSH': 'SelfDS', 'isFromCL': 'SelfFromCL'}, axis=1
-            ),
-            df_tmp_self[~df_tmp_self.isHome].drop(['ASH', 'DSH'], axis=1).rename(
-                {'ASA': 'SelfAS', 'DSA': 'SelfDS', 'isFromCL': 'SelfFromCL'}, axis=1
-            )
-        ]
-    ).sort_values(by='Round')
-
-
-    df_tmp_self = df_tmp_self[['SelfAS', 'SelfDS', 'SelfFromCL']]
-    df_tmp_rvl = df_tmp_rvl[['RivalAS', 'RivalDS', 'RivalFromCL']]
-
-    df_team = pd.concat(
-        [
-            df_team,
-            df_tmp_self,
-            df_tmp_rvl
-        ],
-        axis=1
+    is_home = df_team['isHome'].values.astype(bool)
+    
+    # the strength of the team at home / away, and the rival at the other side
+    self_as, self_ds, self_cl = strength_index.lookup(season, [team_name] * len(is_home), is_home)
+    rival_as, rival_ds, rival_cl = strength_index.lookup(season, df_team['Rival'].values, ~is_home)
+    
+    return df_team.assign(
+        SelfAS=self_as, SelfDS=self_ds, SelfFromCL=self_cl,
+        RivalAS=rival_as, RivalDS=rival_ds, RivalFromCL=rival_cl
     )
-    return df_team
     
     
 if __name__ == '__main__':
@@ -190,11 +267,14 @@ if __name__ == '__main__':
     
     print('Test merging strength dataframe to the original team data')
     print('---------------------------------------------------------')
+    league = get_league()
     season = '1920'
     team = 'Man City'
+    strength_index = StrengthIndex.build(league=league)
     test_df = append_strength_to_df_team(
-        pd.read_csv(f'team_data/{season}/{team}.csv'),
-        Strength(season).compute_result(),
+        pd.read_csv(f'{league.team_data_dir}/{season}/{team}.csv'),
+        strength_index,
+        season,
         team
     )
     print(test_df.iloc[10,:])
@@ -202,18 +282,17 @@ if __name__ == '__main__':
     
     print('Update team data')
     print('----------------')
-    for iseason in range(11):
-        season = str(1011 + iseason * 101)
+    # the seasons with the tables of the last season
+    for season in sorted({s for s, _ in strength_index.rows}):
         print(f'[{season}] --- ', end='  ')
 
-        df_strength = Strength(season).compute_result()
-        all_teams = df_strength['Team']
+        all_teams = [team for s, team in strength_index.rows if s == season]
 
         for team in all_teams:
             print(team, end=' / ')
-            df_team = pd.read_csv(f'team_data/{season}/{team}.csv')
-            df_team = append_strength_to_df_team(df_team, df_strength, team)
-            df_team.to_csv(f'team_data/{season}/{team}.csv', index=False)
+            df_team = pd.read_csv(f'{league.team_data_dir}/{season}/{team}.csv')
+            df_team = append_strength_to_df_team(df_team, strength_index, season, team)
+            df_team.to_csv(f'{league.team_data_dir}/{season}/{team}.csv', index=False)
 
         print()
 
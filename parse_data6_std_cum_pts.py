@@ -4,20 +4,18 @@ import glob
 import numpy as np
 import pandas as pd
 
+from leagues import get_league
+
+
+def append_std_cum_points(df_team_dict):
+    """
+    df_team_dict : Dict[str_team_name, df_of_team]
+    return a new dict, and `bStdCumPoints` column is appended to each df_of_team
+    """
+    # cumulative points of all teams
+    # index : all teams, columns : round (start from 0)
+    df_allteams_pts = pd.DataFrame({team: df_team['bCumPoints'] for team, df_team in df_team_dict.items()}).T
 
-for iseason in range(11):
-    season = str(1011 + iseason * 101)
-    print(f'[{season}] --- ', end='  ')
-    
-    allteams = [re.findall('([A-Za-z ]+).csv$', t)[0] for t in glob.glob(f'team_data/{season}/*.csv')]
-    
-    # read df of all teams
-    df_allteams_pts = {}
-    for team in allteams:
-        df_allteams_pts[team] = pd.read_csv(f'team_data/{season}/{team}.csv')['bCumPoints']
-
-    df_allteams_pts = pd.DataFrame(df_allteams_pts).T
-    
     # mean / std cumulative points
     mean_pts = df_allteams_pts.mean()
     std_pts = df_allteams_pts.std()
@@ -25,12 +23,35 @@ for iseason in range(11):
     # result: standardized cumulative points
     # result.index : all teams, result.columns : round (start from 0)
     result = (df_allteams_pts - mean_pts) / std_pts
-    
+
     # insert standardized cumulative points information into team_data
-    for team in allteams:
-        print(team, end=' / ')
-        std_cumpts = result.loc[team,:]
-        df_team = pd.read_csv(f'team_data/{season}/{team}.csv')
-        df_team['bStdCumPoints'] = std_cumpts
-        df_team.to_csv(f'team_data/{season}/{team}.csv', index=False)
-    print()
\ No newline at end of file
+    new_df_team_dict = {}
+    for team, df_team in df_team_dict.items():
+        df_team = df_team.copy()
+        df_team['bStdCumPoints'] = result.loc[team,:]
+        new_df_team_dict[team] = df_team
+    return new_df_team_dict
+
+
+if __name__ == '__main__':
+    league = get_league()
+
+    # the first season has no features of the last season
+    seasons = sorted(filter(lambda f: f.isdigit(), os.listdir(league.team_data_dir)))[1:]
+
+    for season in seasons:
+        print(f'[{season}] --- ', end='  ')
+
+        allteams = [re.findall('([A-Za-z ]+).csv$', t)[0] for t in glob.glob(f'{league.team_data_dir}/{season}/*.csv')]
+
+        # read df of all teams
+        df_team_dict = {}
+        for team in allteams:
+            df_team_dict[team] = pd.read_csv(f'{league.team_data_dir}/{season}/{team}.csv')
+
+        df_team_dict = append_std_cum_points(df_team_dict)
+
+        for team, df_team in df_team_dict.items():
+            print(team, end=' / ')
+            df_team.to_csv(f'{league.team_data_dir}/{season}/{team}.csv', index=False)
+        print()
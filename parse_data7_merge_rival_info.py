@@ -4,49 +4,93 @@ import glob
 import numpy as np
 import pandas as pd
 
+from leagues import get_league
+from team_ids import TEAMS, team_ids
 
-def merge_rival_info_to_df_team(team, season):
-    df_team = pd.read_csv(f'team_data/{season}/{team}.csv')
-    rivals = df_team['Rival'].unique()
 
-    df_rivals = []
+def merge_rival_columns(df_allteams):
+    """
+    append the `b*` columns of the rival (renamed to `bRival*`) by one self-join
+    df_allteams : the combined df of all teams, with columns 'Team', 'Date', 'Rival' and the `b*` columns.
+                  (and 'Season' if it contains several seasons)
+    return the combined df with `bRival*` columns, the rows keep the order of `df_allteams`
+    
+    Every row is joined by one integer key of (match day, team id, rival id), see `team_ids.py`.
+    """
+    keys = [col for col in ('Season', 'Date') if col in df_allteams.columns]
+    
+    target_cols = df_allteams.columns[df_allteams.columns.str.startswith('b')]
+    
+    day = np.zeros(len(df_allteams), dtype=np.int64)
+    for col in keys:
+        codes, uniques = pd.factorize(df_allteams[col])
+        day = day * len(uniques) + codes
+    team = team_ids(df_allteams['Team'].values).astype(np.int64)
+    rival = team_ids(df_allteams['Rival'].values).astype(np.int64)
+    nteams = len(TEAMS)
+    
+    # the row of the rival: (Date, Team=rival, Rival=team) -> (Date, Team=team, Rival=rival)
+    row_keys = pd.Index((day * nteams + team) * nteams + rival)
+    if not row_keys.is_unique:
+        raise ValueError('a team has more than one match against the same rival on the same day')
+    irival = row_keys.get_indexer((day * nteams + rival) * nteams + team)
+    found = irival >= 0
+    
+    df_rivals = df_allteams[target_cols].iloc[irival[found]].reset_index(drop=True)
+    df_rivals.columns = df_rivals.columns.str.replace('b', 'bRival')
+    
+    return pd.concat([df_allteams[found].reset_index(drop=True), df_rivals], axis=1)
 
-    for rival in rivals:
-        df_rival = pd.read_csv(f'team_data/{season}/{rival}.csv')
 
-        target_cols = df_rival.columns[df_rival.columns.str.startswith('b')]
-        target_cols = target_cols.insert(0, 'Date')
+def merge_rival_info(df_team_dict):
+    """
+    df_team_dict : Dict[str_team_name, df_of_team] of a season
+    return a new dict, and the `bRival*` columns are appended to each df_of_team
+    """
+    df_allteams = pd.concat(df_team_dict, names=['Team', None]).reset_index(level=0).reset_index(drop=True)
+    df_allteams = merge_rival_columns(df_allteams)
+    
+    return {
+        team: df_team.drop('Team', axis=1).reset_index(drop=True)
+        for team, df_team in df_allteams.groupby('Team', sort=False)
+    }
 
-        df_rivals.append(
-            df_rival.loc[df_rival['Rival'] == team, target_cols]
-        )
 
-    df_rivals = pd.concat(df_rivals).sort_values(by='Date')
-    df_rivals.columns = df_rivals.columns.str.replace('b', 'bRival')
+def merge_rival_info_to_df_team(team, season, df_team_dict=None, league=None):
+    """
+    append the `b*` columns of the rival (renamed to `bRival*`) to the df of `team`
+    df_team_dict : Dict[str_team_name, df_of_team] in memory. The dfs are read from
+                   team_data/<season>/*.csv of `league` (default Premier League) if None.
+    """
+    if df_team_dict is None:
+        df_team_dict = read_season(season, league)
+    return merge_rival_info(df_team_dict)[team]
 
-    df_team = df_team.merge(df_rivals, on='Date')
-    return df_team
+
+def read_season(season, league=None):
+    """return Dict[str_team_name, df_of_team], read from team_data/<season>/*.csv of `league` (default Premier League)"""
+    team_data_dir = get_league(league).team_data_dir
+    allteams = list(
+        map(
+            lambda s: s.replace('.csv', ''), 
+            filter(lambda s: s.endswith('csv'), os.listdir(f'{team_data_dir}/{season}/'))
+        )
+    )
+    return {team: pd.read_csv(f'{team_data_dir}/{season}/{team}.csv') for team in allteams}
 
 
 if __name__ == '__main__':
-    for iseason in range(11):
-        season = str(1011 + iseason * 101)
-        print(f'[{season}] --- ', end='  ')
+    league = get_league()
 
-        allteams = list(
-            map(
-                lambda s: s.replace('.csv', ''), 
-                filter(lambda s: s.endswith('csv'), os.listdir(f'team_data/{season}/'))
-            )
-        )
+    # the first season has no features of the last season
+    seasons = sorted(filter(lambda f: f.isdigit(), os.listdir(league.team_data_dir)))[1:]
 
-        df_team_dict = {}    # Dict[str_team_name, df_team]
+    for season in seasons:
+        print(f'[{season}] --- ', end='  ')
 
-        for team in allteams:
-            print(team, end=' / ')        
-            df_team = merge_rival_info_to_df_team(team, season)
-            df_team_dict[team] = df_team
-        print()
+        df_team_dict = merge_rival_info(read_season(season, league))    # Dict[str_team_name, df_team]
 
         for team, df_team in df_team_dict.items():
-            df_team.to_csv(f'team_data/{season}/{team}.csv', index=False)
\ No newline at end of file
+            print(team, end=' / ')        
+            df_team.to_csv(f'{league.team_data_dir}/{season}/{team}.csv', index=False)
+        print()
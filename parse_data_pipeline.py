@@ -0,0 +1,452 @@
+# Run all the parse_data stages in memory, and write the results only once:
+# raw_data/*.txt -> clean_data -> team_data -> table -> attack/defence strength
+#                -> standardized cumulative points -> rival information
+# It replaces running parse_data1 ~ parse_data7 one by one, and produces the same files. The teams
+# with the same points in table/*.csv are ranked by the goal difference, then the goals scored, then
+# the name (`create_table_from_team_data`), while the original parse_data3 kept the arbitrary order
+# of `glob` (which depends on the file system).
+#
+# Every league in the registry (see `leagues.py`) is an independent shard, and `build_leagues`
+# processes the shards in parallel. The feeder league of a league is processed in an earlier wave,
+# and its tables are read from the saved files.
+#
+# A league is built season by season, and the (stage, season) whose inputs have not been changed
+# since the last build are skipped (see `build_manifest.py`), `--force` builds everything again.
+#
+# e.g.
+#   python parse_data_pipeline.py                                   # the default registry
+#   python parse_data_pipeline.py --registry leagues.json --nworkers 4
+#   python parse_data_pipeline.py --force
+#   python parse_data_pipeline.py --form-windows 3 5 10 ewm5       # more form columns, see `FORM_WINDOWS`
+
+
+import os
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import data_store
+import instrument
+from build_manifest import BuildManifest, code_version, digest, file_sha256, frame_digest
+from leagues import CHAMPIONSHIP, LEAGUES, get_league, feeder_of, register, load_registry, shard_waves
+from parse_data1_raw2clean import ParseRawData
+from parse_data2_create_teamdata import FORM_WINDOWS, MakeTeamData
+from parse_data3_create_table import create_table_from_team_data
+from parse_data4_clean_efl_champ_data import create_table as create_champ_table
+from parse_data5_att_def_strength import StrengthIndex, append_strength_to_df_team
+from parse_data6_std_cum_pts import append_std_cum_points
+from parse_data7_merge_rival_info import merge_rival_info
+
+
+# the modules of each stage, a changed module invalidates all seasons of the stage
+MATCHS_CODE = ['parse_data1_raw2clean']
+CHAMP_TABLE_CODE = ['parse_data4_clean_efl_champ_data']
+TEAM_DATA_CODE = [
+    'parse_data2_create_teamdata', 'parse_data3_create_table', 'parse_data5_att_def_strength',
+    'parse_data6_std_cum_pts', 'parse_data7_merge_rival_info', 'team_ids', 'data_store', 'parse_data_pipeline'
+]
+
+
+def last_season_of(season):
+    """e.g. season = '1920' -> '1819'"""
+    return f'{int(season[:2])-1:02d}{int(season[2:])-1:02d}'
+
+
+def parse_all_matchs(raw_files=None, league=None):
+    """
+    raw_files : List[str], default is raw_data/*.txt of `league` (default Premier League)
+    return Dict[str_season, df_matchs], df_matchs is the same as clean_data/<season>.csv
+    """
+    league = get_league(league)
+    if raw_files is None:
+        raw_files = sorted(glob.glob(f'{league.raw_dir}/*.txt'))
+
+    matchs_dict = {}
+    for raw_file in raw_files:
+        # e.g. raw_data/1011.txt -> 1011
+        season = os.path.splitext(os.path.basename(raw_file))[0]
+        with instrument.span('parse_raw', season=season) as sp:
+            df_matchs = canonical_matchs(ParseRawData(raw_file).parse(), league)
+            sp.rows_out = len(df_matchs)
+        matchs_dict[season] = df_matchs
+    return matchs_dict
+
+
+def canonical_matchs(df_matchs, league=None):
+    """replace the aliases of the team names in the matches by the registered names, in place"""
+    league = get_league(league)
+    if league.aliases:
+        df_matchs['HomeTeam'] = league.canonical(df_matchs['HomeTeam'])
+        df_matchs['AwayTeam'] = league.canonical(df_matchs['AwayTeam'])
+    return df_matchs
+
+
+def _match_teams(df_matchs):
+    """all the team names in the matches (with repeats)"""
+    return list(df_matchs['HomeTeam']) + list(df_matchs['AwayTeam'])
+
+
+def parse_all_champ_tables(league=CHAMPIONSHIP):
+    """return Dict[str_season, df_table], the tables of Championship League (or a league with the tables only)"""
+    league = get_league(league)
+    seasons = sorted(filter(lambda s: s.endswith('.txt'), os.listdir(f'{league.raw_table_dir}/all')))
+    tables = {}
+    for season in seasons:
+        name = season.replace('.txt', '')
+        with instrument.span('champ_table', season=name) as sp:
+            tables[name] = create_champ_table(season, league)
+            sp.rows_out = len(tables[name])
+        league.check_teams(name, tables[name]['Name'])
+    return tables
+
+
+def feeder_tables(league=None):
+    """
+    return Dict[str_season, df_table], the tables of the feeder league of `league` in the registry,
+    parsed from the raw tables if the feeder has the tables only, otherwise read from its saved tables
+    """
+    league = get_league(league)
+    if league.feeder is None:
+        return {}
+
+    feeder = feeder_of(league)
+    if not feeder.matches:
+        return parse_all_champ_tables(feeder)
+
+    seasons = sorted(os.path.basename(f)[:-4] for f in glob.glob(f'{feeder.table_dir}/[0-9]*.csv'))
+    return {season: data_store.read_table(season, league=feeder) for season in seasons}
+
+
+def add_season_features(season, df_team_dict, pl_tables, cl_tables, strength_index=None):
+    """
+    Append attack/defence strength, standardized cumulative points and rival information
+    to the dfs of all teams in `season`. (stage 5 ~ 7)
+    df_team_dict : Dict[str_team_name, df_of_team], from `MakeTeamData.make_all_teams()`
+    pl_tables / cl_tables : Dict[str_season, df_table]
+    strength_index : StrengthIndex which contains `season`, built from the tables if None
+    """
+    nrows = sum(df_team.shape[0] for df_team in df_team_dict.values())
+    with instrument.span('strength', season=season, rows_in=nrows) as sp:
+        if strength_index is None:
+            strength_index = StrengthIndex.build(pl_tables, cl_tables, [season])
+        df_team_dict = {
+            team: append_strength_to_df_team(df_team, strength_index, season, team)
+            for team, df_team in df_team_dict.items()
+        }
+        sp.rows_out = nrows
+    with instrument.span('std_points', season=season, rows_in=nrows) as sp:
+        df_team_dict = append_std_cum_points(df_team_dict)
+        sp.rows_out = nrows
+    with instrument.span('rival_info', season=season, rows_in=nrows) as sp:
+        df_team_dict = merge_rival_info(df_team_dict)
+        sp.rows_out = nrows
+    return df_team_dict
+
+
+def build_all(raw_files=None, verbose=False, league=None, cl_tables=None, form_windows=FORM_WINDOWS):
+    """
+    Run all the stages in memory.
+    league : League or the name of a registered league, default is Premier League
+    cl_tables : Dict[str_season, df_table], the tables of the feeder league (see `feeder_tables` if None)
+    form_windows : the windows of the form columns of team_data, e.g. [3, 5, 10, 'ewm5']
+    return (matchs_dict, team_data_dict, pl_tables, cl_tables)
+        matchs_dict    : Dict[str_season, df_matchs]
+        team_data_dict : Dict[str_season, Dict[str_team_name, df_of_team]]
+        pl_tables      : Dict[str_season, df_table]
+        cl_tables      : Dict[str_season, df_table]
+    The strength / rival features are only added to the seasons with the tables of the last season.
+    """
+    def log(msg, t0):
+        if verbose:
+            print(f'{msg:<40} {time.time()-t0:7.3f} s')
+
+    league = get_league(league)
+
+    t0 = time.time()
+    matchs_dict = parse_all_matchs(raw_files, league)
+    for season, df_matchs in matchs_dict.items():
+        league.check_teams(season, _match_teams(df_matchs))
+    log('parse raw data', t0)
+
+    t0 = time.time()
+    team_data_dict = {}
+    for season, df_matchs in matchs_dict.items():
+        with instrument.span('make_team_data', season=season, rows_in=len(df_matchs)) as sp:
+            team_data_dict[season] = MakeTeamData(f'{league.clean_dir}/{season}.csv', df_matchs, form_windows).make_all_teams()
+            sp.rows_out = sum(df_team.shape[0] for df_team in team_data_dict[season].values())
+    log('create team data', t0)
+
+    t0 = time.time()
+    pl_tables = {}
+    for season, df_team_dict in team_data_dict.items():
+        with instrument.span('create_table', season=season) as sp:
+            pl_tables[season] = create_table_from_team_data(df_team_dict)
+            sp.rows_out = len(pl_tables[season])
+    if cl_tables is None:
+        cl_tables = feeder_tables(league)
+    log('create tables', t0)
+
+    t0 = time.time()
+    with instrument.span('strength_index') as sp:
+        strength_index = StrengthIndex.build(pl_tables, cl_tables, league=league)
+        sp.rows_out = len(strength_index.rows)
+    for season, df_team_dict in team_data_dict.items():
+        last_season = last_season_of(season)
+        if last_season in pl_tables and (league.feeder is None or last_season in cl_tables):
+            team_data_dict[season] = add_season_features(season, df_team_dict, pl_tables, cl_tables, strength_index)
+    log('strength / std points / rival info', t0)
+
+    return matchs_dict, team_data_dict, pl_tables, cl_tables
+
+
+def save_all(matchs_dict, team_data_dict, pl_tables, cl_tables, csv=True, league=None):
+    """
+    write the results of `build_all` to the columnar store (see `data_store`),
+    and to clean_data/, team_data/ and table/ if `csv` is True
+    `cl_tables` are written to the folders of the feeder league of `league`
+    """
+    league = get_league(league)
+    nrows = sum(df_team.shape[0] for df_team_dict in team_data_dict.values() for df_team in df_team_dict.values())
+
+    # the csv files first: the store records them, and is only read while they are unchanged
+    if csv:
+        with instrument.span('save_csv', rows_in=nrows):
+            for folder in league.folders():
+                os.makedirs(folder, exist_ok=True)
+
+            for season, df_matchs in matchs_dict.items():
+                df_matchs.to_csv(f'{league.clean_dir}/{season}.csv')
+
+            for season, df_team_dict in team_data_dict.items():
+                os.makedirs(f'{league.team_data_dir}/{season}', exist_ok=True)
+                for team, df_team in df_team_dict.items():
+                    df_team.to_csv(f'{league.team_data_dir}/{season}/{team}.csv', index=False)
+
+            for season, table in pl_tables.items():
+                table.to_csv(league.table_csv(season), index=False)
+
+            if cl_tables:
+                feeder = feeder_of(league)
+                os.makedirs(feeder.table_dir, exist_ok=True)
+                for season, table in cl_tables.items():
+                    table.to_csv(feeder.table_csv(season), index=False)
+
+    with instrument.span('save_store', rows_in=nrows):
+        for season, df_team_dict in team_data_dict.items():
+            data_store.save_team_data(season, df_team_dict, league)
+        for season, table in pl_tables.items():
+            data_store.save_table(season, table, level=0, league=league)
+        for season, table in cl_tables.items():
+            data_store.save_table(season, table, level=1, league=league)
+
+
+def _saved_table(season, level=0, league=None):
+    """the saved table (store or csv) of `season`, None if it has not been saved"""
+    table_league = get_league(league) if level == 0 else feeder_of(league)
+    if data_store.has_season('table', season, table_league) or os.path.exists(table_league.table_csv(season)):
+        return data_store.read_table(season, level, league=league)
+    return None
+
+
+def _feeder_table(season, league):
+    """the table of the feeder league of `league` in `season` (the same as `feeder_tables(league)[season]`)"""
+    table = _saved_table(season, level=1, league=league)
+    feeder = feeder_of(league)
+    if table is None and not feeder.matches and os.path.exists(f'{feeder.raw_table_dir}/all/{season}.txt'):
+        table = create_champ_table(f'{season}.txt', feeder)
+    return table
+
+
+def _feeder_table_digest(season, league):
+    """digest of the feeder table in `season` from the manifest of the feeder, None if there is no table"""
+    feeder = feeder_of(league)
+    stage = 'team_data' if feeder.matches else 'table'
+    table_digest = BuildManifest.of_league(feeder).field(stage, season, 'table')
+    if table_digest is None:
+        table = _feeder_table(season, league)
+        table_digest = None if table is None else frame_digest(table)
+    return table_digest
+
+
+def _build_champ_tables(league, manifest, csv=True, force=False):
+    """the incremental `parse_all_champ_tables` and save, return (number of seasons, number of built seasons)"""
+    code = code_version(CHAMP_TABLE_CODE)
+    seasons = sorted(f[:-4] for f in os.listdir(f'{league.raw_table_dir}/all') if f.endswith('.txt'))
+
+    nbuilt = 0
+    for season in seasons:
+        raw_files = [f'{league.raw_table_dir}/{kind}/{season}.txt' for kind in ('all', 'home', 'away')]
+        key = digest('table', code, [file_sha256(f) for f in raw_files if os.path.exists(f)], league.aliases, csv)
+        if not force and manifest.is_fresh('table', season, key):
+            continue
+
+        with instrument.span('champ_table', season=season) as sp:
+            table = create_champ_table(f'{season}.txt', league)
+            sp.rows_out = len(table)
+        league.check_teams(season, table['Name'])
+        outputs = [data_store._folder('table', season, league)]
+        if csv:
+            os.makedirs(league.table_dir, exist_ok=True)
+            table.to_csv(league.table_csv(season), index=False)
+            outputs.append(league.table_csv(season))
+        data_store.save_table(season, table, league=league)
+
+        manifest.record('table', season, key, outputs, table=frame_digest(table))
+        manifest.save()
+        nbuilt += 1
+    return len(seasons), nbuilt
+
+
+def _build_matchs_seasons(league, manifest, csv=True, force=False, form_windows=FORM_WINDOWS):
+    """
+    The incremental `build_all` and `save_all`, season by season.
+    A season is built again if its raw file, the table of the last season (of the league or its
+    feeder league) or the code has been changed.
+    return (number of seasons, number of built (stage, season))
+    """
+    matchs_code = code_version(MATCHS_CODE)
+    team_data_code = code_version(TEAM_DATA_CODE)
+    raw_files = sorted(glob.glob(f'{league.raw_dir}/*.txt'))
+    seasons = [os.path.splitext(os.path.basename(f))[0] for f in raw_files]
+
+    nbuilt = 0
+    tables = {}    # Dict[str_season, df_table], the tables built in this run
+    for season, raw_file in zip(seasons, raw_files):
+        # stage 1: raw_data -> clean_data
+        raw_sha256 = file_sha256(raw_file)
+        matchs_key = digest('matchs', matchs_code, raw_sha256, league.aliases, csv)
+        df_matchs = None
+        if force or not manifest.is_fresh('matchs', season, matchs_key):
+            df_matchs = parse_all_matchs([raw_file], league)[season]
+            league.check_teams(season, _match_teams(df_matchs))
+            outputs = []
+            if csv:
+                os.makedirs(league.clean_dir, exist_ok=True)
+                df_matchs.to_csv(f'{league.clean_dir}/{season}.csv')
+                outputs.append(f'{league.clean_dir}/{season}.csv')
+            # the raw file of clean_data, `parse_data_update` parses only the matches added after it
+            manifest.record('matchs', season, matchs_key, outputs, raw=[os.path.getsize(raw_file), raw_sha256])
+            manifest.save()
+            nbuilt += 1
+
+        # stage 2 ~ 7: team_data, table and the features from the tables of the last season
+        last_season = last_season_of(season)
+        has_last = last_season in seasons
+        key = digest(
+            'team_data', team_data_code, matchs_key,
+            manifest.field('team_data', last_season, 'table') if has_last else None,
+            _feeder_table_digest(last_season, league) if league.feeder is not None else None,
+            [str(window) for window in form_windows], csv
+        )
+        if not force and manifest.is_fresh('team_data', season, key):
+            continue
+
+        if df_matchs is None:
+            df_matchs = parse_all_matchs([raw_file], league)[season]
+        with instrument.span('make_team_data', season=season, rows_in=len(df_matchs)) as sp:
+            df_team_dict = MakeTeamData(f'{league.clean_dir}/{season}.csv', df_matchs, form_windows).make_all_teams()
+            sp.rows_out = sum(df_team.shape[0] for df_team in df_team_dict.values())
+        with instrument.span('create_table', season=season) as sp:
+            tables[season] = create_table_from_team_data(df_team_dict)
+            sp.rows_out = len(tables[season])
+
+        pl_tables = {season: tables[season]}
+        cl_tables = {}
+        if has_last:
+            last_table = tables[last_season] if last_season in tables else _saved_table(last_season, league=league)
+            if last_table is not None:
+                pl_tables[last_season] = last_table
+        if league.feeder is not None:
+            feeder_table = _feeder_table(last_season, league)
+            if feeder_table is not None:
+                cl_tables[last_season] = feeder_table
+        if last_season in pl_tables and (league.feeder is None or last_season in cl_tables):
+            strength_index = StrengthIndex.build(pl_tables, cl_tables, [season], league)
+            df_team_dict = add_season_features(season, df_team_dict, pl_tables, cl_tables, strength_index)
+
+        save_all({}, {season: df_team_dict}, {season: tables[season]}, {}, csv=csv, league=league)
+        outputs = [data_store._folder('team_data', season, league), data_store._folder('table', season, league)]
+        if csv:
+            outputs += [f'{league.team_data_dir}/{season}/{team}.csv' for team in df_team_dict]
+            outputs.append(league.table_csv(season))
+
+        manifest.record('team_data', season, key, outputs, table=frame_digest(tables[season]))
+        manifest.save()
+        nbuilt += 1
+    return len(seasons), nbuilt
+
+
+def build_league(league, csv=True, force=False, form_windows=FORM_WINDOWS):
+    """
+    Build and save one shard: all seasons of `league`. The tables of its feeder league are not
+    written again (they are the shard of the feeder league).
+    The (stage, season) which have the same inputs as the last build are skipped, unless `force`.
+    form_windows : the windows of the form columns of team_data, see `FORM_WINDOWS`
+    return (league name, number of seasons, number of built (stage, season), wall time in seconds)
+    """
+    t0 = time.time()
+    league = get_league(league)
+    manifest = BuildManifest.of_league(league)
+
+    with instrument.span('build_league', league=league.name):
+        if not league.matches:
+            nseasons, nbuilt = _build_champ_tables(league, manifest, csv, force)
+        else:
+            nseasons, nbuilt = _build_matchs_seasons(league, manifest, csv, force, form_windows)
+
+    return league.name, nseasons, nbuilt, time.time() - t0
+
+
+def _init_worker(leagues):
+    """the registry of the main process (the leagues may be registered from a json file)"""
+    for league in leagues:
+        register(league)
+
+
+def build_leagues(names=None, nworkers=None, csv=True, verbose=False, force=False, form_windows=FORM_WINDOWS):
+    """
+    Build and save the leagues `names` (default: all registered leagues) as independent shards,
+    on a process pool with `nworkers` processes (None for the number of CPUs).
+    force : build all seasons again, even if their inputs have not been changed
+    form_windows : the windows of the form columns of team_data, see `FORM_WINDOWS`
+    return Dict[str_league_name, (number of seasons, number of built (stage, season), wall time in seconds)]
+    """
+    summary = {}
+    for wave in shard_waves(names):
+        if nworkers == 1:
+            results = [build_league(league, csv, force, form_windows) for league in wave]
+        else:
+            with ProcessPoolExecutor(max_workers=nworkers, initializer=_init_worker, initargs=(list(LEAGUES.values()),)) as executor:
+                results = list(executor.map(
+                    build_league, wave, [csv] * len(wave), [force] * len(wave), [form_windows] * len(wave)
+                ))
+
+        for name, nseasons, nbuilt, wall_time in results:
+            summary[name] = (nseasons, nbuilt, wall_time)
+            if verbose:
+                print(f'{name:<30} {nseasons:3d} seasons {nbuilt:3d} built {wall_time:7.3f} s')
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the data of all leagues in the registry')
+    parser.add_argument('--registry', default=None, help='json file of the leagues, see `leagues.load_registry`')
+    parser.add_argument('--leagues', nargs='*', default=None, help='names of the leagues, default is all')
+    parser.add_argument('--nworkers', type=int, default=None, help='number of processes, default is the number of CPUs')
+    parser.add_argument('--force', action='store_true', help='build all seasons again, ignore the build manifest')
+    parser.add_argument('--form-windows', nargs='+', default=list(FORM_WINDOWS),
+                        help="windows of the form columns, e.g. 3 5 10 ewm5 (default 5)")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.registry is not None:
+        load_registry(args.registry)
+
+    # the stages are traced in this process only
+    nworkers = 1 if args.trace or args.chrome_trace or args.profile else args.nworkers
+
+    t0 = time.time()
+    with instrument.tracing_from_args(args):
+        build_leagues(args.leagues, nworkers, verbose=True, force=args.force, form_windows=args.form_windows)
+    print(f'{"total":<40} {time.time()-t0:7.3f} s')
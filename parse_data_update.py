@@ -0,0 +1,319 @@
+# Incremental update of the current season when new results are added to raw_data/<season>.txt
+# Only the new matchdays at the head of the raw file are parsed, if the build manifest has the raw
+# file of clean_data/<season>.csv (see `parse_new_matchs`), otherwise the whole file is parsed.
+# Only the rows affected by the new matches are recomputed:
+#   - the tail rows (from the first new match) of the teams playing the new matches
+#   - `bStdCumPoints` of all teams at the rounds of these tail rows
+#   - the `bRival*` columns of the rows whose rival row has been changed
+# The other seasons and the unchanged rows are not touched.
+#
+# e.g.
+#   python parse_data_update.py 2021            # update team_data/2021
+#   python parse_data_update.py 2021 --verify   # check that the result is the same as a full rebuild before writing
+
+
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+import data_store
+import instrument
+from build_manifest import BuildManifest
+from parse_data1_raw2clean import RawFileState, parse_new_matchs
+from parse_data2_create_teamdata import FORM_WINDOWS, form_windows_of, make_season_team_data
+from parse_data3_create_table import create_table_from_team_data
+from parse_data5_att_def_strength import StrengthIndex, append_strength_to_df_team
+from parse_data7_merge_rival_info import merge_rival_columns
+from parse_data_pipeline import last_season_of, add_season_features, canonical_matchs
+from leagues import get_league
+
+
+MATCH_KEYS = ['Date', 'HomeTeam', 'AwayTeam']
+
+
+def find_new_matchs(df_old, df_new):
+    """
+    df_old / df_new : df of the matches (clean_data/<season>.csv) before / after the new results
+    return df of the matches which are in `df_new` but not in `df_old` (or whose result has been changed)
+    raise ValueError if some matches of `df_old` are removed from `df_new`
+    """
+    merged = df_new.merge(df_old, how='outer', indicator=True)
+    removed = merged[merged['_merge'] == 'right_only']
+    added = merged[merged['_merge'] == 'left_only']
+
+    # a changed result appears in both `removed` and `added`
+    removed = removed.merge(added[MATCH_KEYS], how='left', indicator='_changed')
+    if (removed['_changed'] == 'left_only').any():
+        raise ValueError(f'matches are removed from the raw data:\n{removed[MATCH_KEYS]}')
+
+    return added.drop('_merge', axis=1).reset_index(drop=True)
+
+
+def _read_tables(season, league=None):
+    """return (pl_tables, cl_tables) of the last season, which are needed by `StrengthIndex`"""
+    last_season = last_season_of(season)
+    try:
+        pl_tables = {last_season: data_store.read_table(last_season, level=0, league=league)}
+        cl_tables = {}
+        if get_league(league).feeder is not None:
+            cl_tables[last_season] = data_store.read_table(last_season, level=1, league=league)
+    except FileNotFoundError:
+        return {}, {}
+    return pl_tables, cl_tables
+
+
+def rebuild_season(season, df_matchs, league=None, form_windows=FORM_WINDOWS):
+    """
+    Full rebuild of `season` (stage 2 ~ 7) from the matches, the same as `parse_data_pipeline.build_all`.
+    return (df_team_dict, table)
+    """
+    df_team_dict = make_season_team_data(df_matchs, form_windows)
+    table = create_table_from_team_data(df_team_dict)
+
+    pl_tables, cl_tables = _read_tables(season, league)
+    if pl_tables:
+        pl_tables[season] = table
+        strength_index = StrengthIndex.build(pl_tables, cl_tables, [season], league)
+        df_team_dict = add_season_features(season, df_team_dict, pl_tables, cl_tables, strength_index)
+    return df_team_dict, table
+
+
+def _to_date_str(df_team):
+    df_team = df_team.copy()
+    df_team['Date'] = pd.to_datetime(df_team['Date']).dt.strftime('%Y-%m-%d')
+    return df_team
+
+
+def _update_std_cum_points(df_team_dict, rounds):
+    """recompute `bStdCumPoints` at `rounds` (Set[int]) of all teams, in place"""
+    df_allteams_pts = pd.DataFrame({team: df_team['bCumPoints'] for team, df_team in df_team_dict.items()}).T
+    icols = sorted(r - 1 for r in rounds)
+    df_pts = df_allteams_pts[icols]
+    result = (df_pts - df_pts.mean()) / df_pts.std()
+
+    for team, df_team in df_team_dict.items():
+        irows = [i for i in icols if i < df_team.shape[0]]
+        df_team.loc[irows, 'bStdCumPoints'] = result.loc[team, irows].values
+
+
+def _update_rival_info(df_team_dict, changed):
+    """
+    recompute the `bRival*` columns of the rows whose rival row is changed, in place
+    changed : Dict[str_team_name, bool_array], the changed rows of each team
+    """
+    teams = list(df_team_dict.keys())
+    df_allteams = pd.concat(df_team_dict, names=['Team', None]).reset_index(level=0).reset_index(drop=True)
+    is_changed = np.concatenate([changed[team] for team in teams])
+
+    # targets: the rows whose (Date, Rival) is the (Date, Team) of a changed row
+    changed_keys = pd.MultiIndex.from_frame(df_allteams.loc[is_changed, ['Date', 'Team']])
+    is_target = pd.MultiIndex.from_frame(df_allteams[['Date', 'Rival']]).isin(changed_keys)
+
+    rival_cols = list(df_allteams.columns[df_allteams.columns.str.startswith('bRival')])
+    sub = df_allteams.loc[is_changed | is_target].drop(rival_cols, axis=1)
+    sub.insert(0, 'Row', sub.index)
+    merged = merge_rival_columns(sub)
+    merged = merged[is_target[merged['Row'].values]]
+
+    df_allteams.loc[merged['Row'].values, rival_cols] = merged[rival_cols].values
+
+    for team, df_team in df_allteams.groupby('Team', sort=False):
+        df_team_dict[team] = df_team.drop('Team', axis=1).reset_index(drop=True)
+    return is_target
+
+
+def update_season(season, df_matchs, df_old_matchs, df_team_dict, league=None):
+    """
+    Update the team data of `season` with the new matches.
+    df_matchs     : df of all matches of the season, including the new results
+    df_old_matchs : df of the matches which `df_team_dict` is built from
+    df_team_dict  : Dict[str_team_name, df_of_team], the current team data (not modified)
+    league        : League or the name of a registered league, default is Premier League
+    return (df_team_dict, table, changed)
+        changed : Dict[str_team_name, bool_array], the rows which are recomputed
+    """
+    df_new = find_new_matchs(df_old_matchs, df_matchs)
+    dtypes = {team: df_team.dtypes for team, df_team in df_team_dict.items()}
+    df_team_dict = {team: df_team.copy() for team, df_team in df_team_dict.items()}
+    changed = {team: np.zeros(df_team.shape[0], dtype=bool) for team, df_team in df_team_dict.items()}
+    if df_new.empty:
+        return df_team_dict, create_table_from_team_data(df_team_dict), changed
+
+    columns = next(iter(df_team_dict.values())).columns
+    has_features = 'bStdCumPoints' in columns
+
+    # the first date of the new matches of each team
+    first_date = pd.concat((
+        df_new[['HomeTeam', 'Date']].set_axis(['Team', 'Date'], axis=1),
+        df_new[['AwayTeam', 'Date']].set_axis(['Team', 'Date'], axis=1),
+    )).groupby('Team')['Date'].min()
+
+    # stage 2: the basic columns of the involved teams (only the tail rows are kept)
+    involved = df_matchs['HomeTeam'].isin(first_date.index) | df_matchs['AwayTeam'].isin(first_date.index)
+    # the same form windows as the current team data
+    df_base_dict = make_season_team_data(df_matchs[involved], form_windows_of(columns))
+
+    heads, tails = {}, {}
+    for team, date in first_date.items():
+        df_base = _to_date_str(df_base_dict[team])
+        istart = int((df_base['Date'] < date).sum())
+        heads[team] = df_team_dict.get(team, df_base).iloc[:istart]
+        tails[team] = df_base.iloc[istart:].reset_index(drop=True)
+
+        df_team_dict[team] = pd.concat((heads[team], tails[team]), ignore_index=True)
+        changed[team] = np.arange(df_team_dict[team].shape[0]) >= istart
+
+    # stage 3: table of this season
+    df_team_dict = dict(sorted(df_team_dict.items()))
+    changed = {team: changed[team] for team in df_team_dict}
+    table = create_table_from_team_data(df_team_dict)
+    if not has_features:
+        return df_team_dict, table, changed
+
+    # stage 5: strength of the tail rows
+    pl_tables, cl_tables = _read_tables(season, league)
+    pl_tables[season] = table
+    strength_index = StrengthIndex.build(pl_tables, cl_tables, [season], league)
+    for team, df_tail in tails.items():
+        df_tail = append_strength_to_df_team(df_tail, strength_index, season, team)
+        df_team_dict[team] = pd.concat((heads[team], df_tail), ignore_index=True)
+
+    # stage 6: std cumulative points at the rounds of the tail rows
+    rounds = set()
+    for team, df_tail in tails.items():
+        rounds.update(df_tail['Round'])
+    _update_std_cum_points(df_team_dict, rounds)
+    for team, df_team in df_team_dict.items():
+        changed[team] = changed[team] | df_team['Round'].isin(rounds).values
+
+    # stage 7: rival information
+    is_target = _update_rival_info(df_team_dict, changed)
+    start = 0
+    for team, df_team in df_team_dict.items():
+        changed[team] = changed[team] | is_target[start:start+df_team.shape[0]]
+        start += df_team.shape[0]
+
+    # the new rows are filled column by column, restore the dtypes (e.g. int / bool) of the current team data
+    for team in dtypes:
+        df_team = df_team_dict[team]
+        for col, dtype in dtypes[team].items():
+            if df_team[col].dtype == dtype:
+                continue
+            if isinstance(dtype, pd.CategoricalDtype):
+                # e.g. 'Rival', the categories are extended by the teams which are not in the current team data
+                categories = dtype.categories.union(pd.Index(df_team[col].unique()))
+                df_team[col] = pd.Categorical(df_team[col], categories=categories)
+            else:
+                df_team[col] = df_team[col].values.astype(dtype)
+
+    return df_team_dict, table, changed
+
+
+def update_from_raw(season, raw_file=None, verbose=False, league=None):
+    """
+    Parse raw_data/<season>.txt, and update the team data of `season` incrementally (nothing is written).
+    return (df_matchs, df_team_dict, table, changed, raw_state), see `update_season`
+        raw_state : RawFileState of the raw file, for `save_season`
+    """
+    def log(msg, t0):
+        if verbose:
+            print(f'{msg:<40} {time.time()-t0:7.3f} s')
+
+    league = get_league(league)
+    if raw_file is None:
+        raw_file = f'{league.raw_dir}/{season}.txt'
+
+    t0 = time.time()
+    df_old_matchs = pd.read_csv(f'{league.clean_dir}/{season}.csv', index_col=0)
+    raw_state = BuildManifest.of_league(league).field('matchs', season, 'raw')
+    with instrument.span('parse_raw', season=season) as sp:
+        df_matchs, raw_state, head_only = parse_new_matchs(raw_file, RawFileState(*raw_state) if raw_state else None)
+        df_matchs = canonical_matchs(df_matchs, league)
+        sp.rows_out = len(df_matchs)
+    if head_only:
+        # the new matchdays are above the matches of clean_data (the newest first)
+        df_matchs = pd.concat((df_matchs, df_old_matchs), ignore_index=True) if len(df_matchs) else df_old_matchs
+    log('parse raw data' if not head_only else 'parse the new matchdays', t0)
+
+    t0 = time.time()
+    with instrument.span('read_team_data', season=season) as sp:
+        if data_store.has_season('team_data', season, league):
+            df_team_dict = data_store.load_team_data(season, league=league)
+        else:
+            # parse the floats exactly, so the unchanged rows are written back without any difference
+            df_team_dict = {
+                team: pd.read_csv(f'{league.team_data_dir}/{season}/{team}.csv', float_precision='round_trip')
+                for team in data_store.teams_of_season(season, league)
+            }
+        sp.rows_out = sum(df_team.shape[0] for df_team in df_team_dict.values())
+    log('read data', t0)
+
+    t0 = time.time()
+    with instrument.span('update_season', season=season, rows_in=len(df_matchs)) as sp:
+        df_team_dict, table, changed = update_season(season, df_matchs, df_old_matchs, df_team_dict, league)
+        sp.rows_out = int(sum(c.sum() for c in changed.values()))
+    log('update team data', t0)
+
+    return df_matchs, df_team_dict, table, changed, raw_state
+
+
+def save_season(season, df_matchs, df_team_dict, table, changed, raw_state=None, league=None):
+    """
+    write clean_data / table and the changed team_data of `season` (and the store if it has the season)
+    raw_state : RawFileState of the raw file of `df_matchs`, recorded in the build manifest for the next update
+    """
+    league = get_league(league)
+    df_matchs.to_csv(f'{league.clean_dir}/{season}.csv')
+    for team, df_team in df_team_dict.items():
+        if changed[team].any():
+            df_team.to_csv(f'{league.team_data_dir}/{season}/{team}.csv', index=False)
+    table.to_csv(league.table_csv(season), index=False)
+
+    if data_store.is_saved('team_data', season, league):
+        data_store.save_team_data(season, df_team_dict, league)
+    if data_store.is_saved('table', season, league):
+        data_store.save_table(season, table, level=0, league=league)
+
+    if raw_state is not None:
+        manifest = BuildManifest.of_league(league)
+        manifest.set_field('matchs', season, 'raw', list(raw_state))
+        manifest.save()
+
+
+def verify_season(season, df_matchs, df_team_dict, table, league=None):
+    """raise AssertionError if the updated team data / table are not the same as a full rebuild"""
+    form_windows = form_windows_of(next(iter(df_team_dict.values())).columns)
+    df_full_dict, full_table = rebuild_season(season, df_matchs, league, form_windows)
+
+    assert list(df_full_dict.keys()) == list(df_team_dict.keys())
+    for team, df_full in df_full_dict.items():
+        # the updated team data keep the dtypes of the current files (e.g. int64 / object from the csv files)
+        df_full = _to_date_str(df_full).astype(df_team_dict[team].dtypes.to_dict())
+        pd.testing.assert_frame_equal(df_team_dict[team], df_full, check_exact=True)
+    pd.testing.assert_frame_equal(table, full_table)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Update the team data of a season from its raw data')
+    parser.add_argument('season', nargs='?', default='2021')
+    parser.add_argument('--verify', action='store_true', help='check the result against a full rebuild before writing')
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    season = args.season
+
+    with instrument.tracing_from_args(args):
+        t0 = time.time()
+        results = update_from_raw(season, verbose=True)
+        print(f'{sum(c.sum() for c in results[3].values())} rows are updated')
+
+        if args.verify:
+            with instrument.span('verify', season=season):
+                verify_season(season, *results[:3])
+            print('The same as the full rebuild')
+
+        t1 = time.time()
+        with instrument.span('save', season=season):
+            save_season(season, *results)
+        print(f'{"write files":<40} {time.time()-t1:7.3f} s')
+        print(f'{"total":<40} {time.time()-t0:7.3f} s')
@@ -0,0 +1,82 @@
+# Variable selection of the Poisson regression by backward elimination (minimal AIC).
+# It is the same procedure as `BackwardElimination` in `Modeling.ipynb`, but all candidate drops of
+# one iteration are fitted as a batch by `fit_poisson_subsets`, starting from the parent model.
+
+
+import numpy as np
+
+from poisson_model.glm import fit_poisson_subsets, poisson_aic
+
+
+# a drop is accepted if the AIC does not increase by more than the accuracy of the fit,
+# e.g. dropping a column of zeros (a team never promoted from the Championship League).
+# `Modeling.ipynb` compares the AICs exactly, so its choice between such tied AICs depends on the
+# rounding of statsmodels, and the selected variables of a few teams differ (see README.md).
+AIC_TOL = 1e-6
+
+
+class BackwardElimination:
+    def __init__(self, y, X, columns=None):
+        """
+        y : (nobs,), X : (nobs, nvars), and the first column of X is the intercept term.
+        Rows with nan are dropped (missing='drop').
+        columns : names of the columns of X (e.g. X.columns)
+        """
+        self.y = np.asarray(y, dtype=float)
+        self.X = np.asarray(X, dtype=float)
+        self.columns = columns
+
+    def _fit(self, subsets, start_params=None):
+        """return (aics, params), aics.shape = (nsubsets,), params.shape = (nsubsets, nvars)"""
+        params, cov, rank, valid, mu = fit_poisson_subsets(self.y, self.X, subsets, start_params)
+        return poisson_aic(self.y, mu, valid, rank), params
+
+    def find(self, print_iter=False):
+        """return the variables and the minimal AIC"""
+        candidates = set(range(1, self.X.shape[1]))   # start from 1 to exclude intercept term
+
+        # fit full model: `target_aic` should be as lower as possible
+        aics, params = self._fit([list(range(self.X.shape[1]))])
+        target_aic, parent_params = aics[0], params[0]
+
+        iiter = 1
+        while candidates:
+            cs = sorted(candidates)
+            aics, params = self._fit([[0] + [c for c in cs if c != drop] for drop in cs], parent_params)
+
+            minidx = aics.argmin()
+
+            if print_iter:
+                self._print_iteration(iiter, cs, aics, minidx, target_aic)
+
+            if aics[minidx] <= target_aic + AIC_TOL:
+                target_aic = aics[minidx]
+                parent_params = params[minidx]
+                candidates.remove(cs[minidx])
+                iiter += 1
+            else:
+                break
+
+        if self.columns is None:
+            # add intercept term back
+            return [0] + sorted(candidates), target_aic
+        else:
+            return self.columns[[0] + sorted(candidates)], target_aic
+
+    def _print_iteration(self, iiter, cs, aics, minidx, target_aic):
+        print('=======================================')
+        print('Iteration: ', iiter)
+
+        if self.columns is None:
+            print('minimal dropped variable: ', cs[minidx])
+        else:
+            print('minimal dropped variable: ', self.columns[cs[minidx]])
+
+        print('corresponding AIC: ', aics[minidx])
+        print('original AIC: ', target_aic)
+        if aics[minidx] <= target_aic + AIC_TOL:
+            print('drop or stop:  [Drop]')
+        else:
+            print('drop or stop:  [Stop]')
+
+        print()
@@ -0,0 +1,111 @@
+# The fitted models of all teams compiled into dense arrays:
+#   coef : (nteams, nvars), the eliminated variables are 0
+#   cov  : (nteams, nvars, nvars)
+# so mu and its confidence interval of every match in a season are computed by a few array
+# operations, instead of calling the result object of each team.
+
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtri
+
+import instrument
+from data_store import load_team_data
+from poisson_model.fitting import TEAM_DATA_COLS, reg_variables
+from poisson_model.league_state import REG_VARS
+
+
+class CompiledModels:
+    def __init__(self, teams, variables, coef, cov, used):
+        """
+        teams : (nteams,), variables : (nvars,)
+        coef : (nteams, nvars), cov : (nteams, nvars, nvars)
+        used : (nteams, nvars) bool, whether the variable is kept in the model of the team
+        """
+        self.teams = np.asarray(teams)
+        self.variables = list(variables)
+        self.coef = coef
+        self.cov = cov
+        self.used = used
+        self.team_idx = {team: i for i, team in enumerate(self.teams)}
+
+    @classmethod
+    def compile(cls, team_res_dict, teams=None, variables=None):
+        """
+        team_res_dict : Dict[str_team_name, GLM_result_obj]
+                        (statsmodels result or `PoissonGLMResult`)
+        teams : order of the teams, default is the order of `team_res_dict`
+        variables : order of the variables, default is REG_VARS and the other variables of the models
+        """
+        if teams is None:
+            teams = list(team_res_dict.keys())
+        if variables is None:
+            variables = list(REG_VARS)
+            for team in teams:
+                variables += [var for var in team_res_dict[team].model.exog_names if var not in variables]
+
+        nvars = len(variables)
+        coef = np.zeros((len(teams), nvars))
+        cov = np.zeros((len(teams), nvars, nvars))
+        used = np.zeros((len(teams), nvars), dtype=bool)
+
+        for iteam, team in enumerate(teams):
+            res = team_res_dict[team]
+            ivar = [variables.index(var) for var in res.model.exog_names]
+            coef[iteam, ivar] = np.asarray(res.params)
+            cov[iteam][np.ix_(ivar, ivar)] = np.asarray(res.cov_params())
+            used[iteam, ivar] = True
+
+        return cls(teams, variables, coef, cov, used)
+
+    def predict(self, teams, X, alpha=0.05):
+        """
+        teams : (n,), the team (name or index) of each row
+        X : (n, nvars), regression data, the columns follow `self.variables`.
+            The variables not used by the team are ignored (they may be nan).
+        return (mu, ci), mu.shape = (n,), ci.shape = (n, 2)
+            the same as `glmres.predict(X)` and `PredictGoals._conf_int_mu`
+        """
+        iteams = np.array([self.team_idx[t] if isinstance(t, str) else t for t in teams], dtype=int)
+        X = np.where(self.used[iteams], np.asarray(X, dtype=float), 0)
+
+        eta = np.einsum('ni,ni->n', X, self.coef[iteams])
+        eta_stderr = np.sqrt(np.einsum('ni,nij,nj->n', X, self.cov[iteams], X))
+
+        z_cri = ndtri(1-alpha/2)   # norm.ppf
+        ci = np.exp(np.stack((eta - z_cri * eta_stderr, eta + z_cri * eta_stderr), axis=1))
+        return np.exp(eta), ci
+
+
+def predict_season(compiled, season, alpha=0.05):
+    """
+    Predict the goals of every match in `season` (team_data/<season>) by the compiled models.
+    return Dict[str_team_name, df], df.columns = ['Rival', 'isHome', 'obs', 'mu', 'ci', 'predict'],
+    the same as the first columns of `PredictGoals.predict_by_real_data`
+    """
+    with instrument.span('read_team_data', season=season) as sp:
+        df_team_dict = load_team_data(season, list(compiled.teams), TEAM_DATA_COLS + ['Rival'])
+        df_all = pd.concat(df_team_dict.values(), ignore_index=True)
+        sp.rows_out = len(df_all)
+    iteams = np.repeat(np.arange(len(compiled.teams)), [df.shape[0] for df in df_team_dict.values()])
+
+    with instrument.span('predict', season=season, rows_in=len(df_all)) as sp:
+        X = reg_variables(df_all)[compiled.variables].values
+        mu, ci = compiled.predict(iteams, X, alpha)
+        sp.rows_out = len(mu)
+
+    df_all = pd.DataFrame({
+        'Rival': df_all['Rival'].values,
+        'isHome': df_all['isHome'].values,
+        'obs': df_all['Goal'].values,
+        'mu': mu,
+        'ci': ci.tolist(),
+        'predict': np.floor(mu),
+    })
+
+    predict_res = {}
+    start = 0
+    for team, df_team in df_team_dict.items():
+        predict_res[team] = df_all.iloc[start:start+df_team.shape[0]].reset_index(drop=True)
+        start += df_team.shape[0]
+    return predict_res
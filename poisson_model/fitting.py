@@ -0,0 +1,110 @@
+# Fit the Poisson regression model of every team (backward elimination + the final fit).
+# The teams are independent, so they can be spread over a process pool.
+
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import instrument
+from data_store import teams_of_season
+from leagues import get_league
+from poisson_model.backward_elimination import BackwardElimination
+from poisson_model.glm import fit_poisson
+from poisson_model.league_state import REG_VARS
+from poisson_model.team_data import get_df_team
+
+
+# columns of team_data used to build the regression variables
+TEAM_DATA_COLS = [
+    'Date', 'Goal',
+    'Round', 'isHome',
+    'b5MatchGoal',
+    'bRival5MatchGoal', 'bRival5MatchConceded',
+    'SelfAS', 'SelfDS', 'RivalAS', 'RivalDS',
+    'SelfFromCL', 'RivalFromCL',
+    'bStdCumPoints', 'bRivalStdCumPoints'
+]
+
+
+def reg_variables(df):
+    """
+    df : team_data of a team (at least the columns in TEAM_DATA_COLS)
+    return df of the regression variables: REG_VARS and 'PtDiff_Round',
+    the same as `PredictGoals._convert_to_reg_data` in `Modeling.ipynb`
+    """
+    X = df[REG_VARS[1:-2]].copy()
+    X['PtDiff'] = df['bStdCumPoints'] - df['bRivalStdCumPoints']
+    X['PtDiff_Round'] = X['Round'] * X['PtDiff']
+    X['isDec'] = pd.DatetimeIndex(df['Date']).month == 12
+
+    # convert all bool-columns into numerical
+    X = X.astype(float)
+    X.insert(0, 'const', 1.)
+    return X
+
+
+def team_reg_data(team, season_start='1011', season_end='1718', league=None):
+    """
+    return (y, X) of `team` from `season_start` to `season_end`, the same as `Modeling.ipynb`
+    X.columns = REG_VARS (with the intercept term 'const')
+    """
+    df = get_df_team(team, season_start, season_end, columns=TEAM_DATA_COLS, league=league)
+    return df['Goal'], reg_variables(df)[REG_VARS]
+
+
+def fit_team(team, season_start='1011', season_end='1718', league=None):
+    """
+    Select the variables by backward elimination, then fit the model with scale='X2'.
+    return (PoissonGLMResult, wall time in seconds)
+    """
+    t0 = time.perf_counter()
+    with instrument.span('fit_team', season=season_end, team=team) as sp:
+        y, X = team_reg_data(team, season_start, season_end, league)
+        sp.rows_in = len(y)
+        idxcol, aic = BackwardElimination(y.values, X.values, columns=X.columns).find()
+        res = fit_poisson(y, X[idxcol], scale='X2')
+    return res, time.perf_counter() - t0
+
+
+def _fit_team(args):
+    return fit_team(*args)
+
+
+def fit_all_teams(season='1819', teams=None, season_start='1011', season_end=None, nworkers=1, verbose=False, league=None):
+    """
+    Fit the models of all teams in `season`, which are trained by the seasons
+    from `season_start` to `season_end` (default: the last season of `season`).
+    teams : List[str], default is all teams in team_data/<season> of `league`
+    nworkers : number of processes (None for the number of CPUs)
+    league : League or the name of a registered league, default is Premier League
+    return (team_res_dict, wall_times)
+        team_res_dict : Dict[str_team_name, PoissonGLMResult]
+        wall_times    : Dict[str_team_name, float], wall time of each team in seconds
+    """
+    if teams is None:
+        teams = teams_of_season(season, league)
+    if season_end is None:
+        season_end = f'{int(season[:2])-1:02d}{int(season[2:])-1:02d}'
+
+    # the League object itself is passed to the workers, a league registered at runtime is not in their registry
+    league = get_league(league)
+    args = [(team, season_start, season_end, league) for team in teams]
+    with instrument.span('fit', season=season) as sp:
+        if nworkers == 1:
+            results = list(map(_fit_team, args))
+        else:
+            with ProcessPoolExecutor(max_workers=nworkers) as executor:
+                results = list(executor.map(_fit_team, args))
+        sp.rows_out = len(results)
+
+    team_res_dict = {}
+    wall_times = {}
+    for team, (res, wall_time) in zip(teams, results):
+        team_res_dict[team] = res
+        wall_times[team] = wall_time
+        if verbose:
+            print(f'{team:<20} {wall_time:7.3f} s')
+
+    return team_res_dict, wall_times
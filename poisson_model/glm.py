@@ -0,0 +1,201 @@
+# Poisson regression (log link) fitted by IRLS in numpy.
+# It fits many column subsets of the same design matrix at once: the coefficients of all subsets
+# are stacked into a (nsubsets, nvars) array, and every IRLS iteration is a few batched numpy calls.
+# The results follow `sm.GLM(y, X, family=sm.families.Poisson(), missing='drop').fit()`.
+
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from scipy.special import gammaln, xlogy
+
+
+# the same default convergence criterion as statsmodels (change of the deviance)
+TOL = 1e-8
+MAXITER = 100
+
+ModelInfo = namedtuple('ModelInfo', ['exog_names', 'endog_names'])
+
+
+class PoissonGLMResult:
+    """
+    The fitted Poisson regression, with the attributes of the statsmodels GLM result that are used
+    in this project: params, bse, cov_params(), aic, llf, deviance, pearson_chi2, scale, nobs,
+    df_model, df_resid, model.exog_names and predict().
+    """
+
+    def __init__(self, params, normalized_cov, y, mu, rank, exog_names, scale='1'):
+        """
+        params : (nvars,), normalized_cov : (nvars, nvars), inverse of X' W X
+        y / mu : (nobs,), the observed / fitted values of the rows used in the fit
+        rank   : rank of the design matrix
+        scale  : '1' (default of statsmodels) or 'X2' (Pearson chi2 / df_resid)
+        """
+        self.model = ModelInfo(list(exog_names), 'y')
+        self.nobs = len(y)
+        self.df_model = rank - 1
+        self.df_resid = self.nobs - rank
+        self.fittedvalues = pd.Series(mu)
+
+        self.deviance = float(2 * np.sum(xlogy(y, y / mu) - (y - mu)))
+        self.pearson_chi2 = float(np.sum((y - mu) ** 2 / mu))
+
+        if scale == '1':
+            self.scale = 1.
+        elif scale == 'X2':
+            self.scale = self.pearson_chi2 / self.df_resid
+        else:
+            raise ValueError("scale should be '1' or 'X2'")
+
+        # the log-likelihood is divided by the scale, as statsmodels
+        self.llf = float(np.sum(xlogy(y, mu) - mu - gammaln(y + 1))) / self.scale
+        self.aic = -2 * self.llf + 2 * rank
+
+        self.normalized_cov_params = normalized_cov
+        self.params = pd.Series(params, index=self.model.exog_names)
+        self.bse = pd.Series(np.sqrt(np.diag(normalized_cov) * self.scale), index=self.model.exog_names)
+
+    def cov_params(self):
+        names = self.model.exog_names
+        return pd.DataFrame(self.normalized_cov_params * self.scale, index=names, columns=names)
+
+    def predict(self, exog):
+        """
+        exog : (n, nvars) or one row (nvars,), the columns follow `self.model.exog_names`
+        return (n,) array, or a Series with the index of `exog` if it is a df (as statsmodels)
+        """
+        mu = np.atleast_1d(np.exp(np.asarray(exog, dtype=float) @ self.params.values))
+        if isinstance(exog, pd.DataFrame):
+            return pd.Series(mu, index=exog.index)
+        return mu
+
+
+def _gram(w, X):
+    """(nsubsets, nvars, nvars) weighted Gram matrix X' diag(w[k]) X of each subset, w.shape = (nsubsets, nobs)"""
+    return np.matmul(X.T[np.newaxis,:,:] * w[:,np.newaxis,:], X)
+
+
+def _deviance(y, mu, valid):
+    """(nsubsets,) deviance of each subset, `valid` (nsubsets, nobs) marks the rows used in the fit"""
+    return 2 * np.sum(np.where(valid, xlogy(y, y / mu) - (y - mu), 0), axis=1)
+
+
+def poisson_aic(y, mu, valid, rank):
+    """(nsubsets,) AIC of each subset, the arguments are from `fit_poisson_subsets`"""
+    y = np.where(np.isnan(y), 0, y)
+    llf = np.sum(np.where(valid, xlogy(y, mu) - mu - gammaln(y + 1), 0), axis=1)
+    return -2 * llf + 2 * rank
+
+
+def fit_poisson_subsets(y, X, subsets, start_params=None, tol=TOL, maxiter=MAXITER):
+    """
+    Fit the Poisson regression of `y` on `X[:, subset]` for every subset at once.
+    The rows with nan in `y` or in the columns of the subset are dropped (missing='drop').
+
+    y : (nobs,), X : (nobs, nvars)
+    subsets : List[List[int]], the columns of each model
+    start_params : (nvars,), e.g. the coefficients of the model with all columns of the subsets.
+                   The first iteration of all subsets starts from its fitted values, so they share
+                   one weighted Gram matrix (per pattern of dropped rows).
+    return (params, normalized_cov, rank, valid, mu)
+        params : (nsubsets, nvars), zero for the columns out of the subset
+        normalized_cov : (nsubsets, nvars, nvars), inverse of X' W X (zero out of the subset)
+        rank : (nsubsets,), rank of the design matrix
+        valid : (nsubsets, nobs), the rows used in the fit
+        mu : (nsubsets, nobs), the fitted values
+    """
+    y = np.asarray(y, dtype=float)
+    X = np.asarray(X, dtype=float)
+    nsubsets, nvars = len(subsets), X.shape[1]
+
+    masks = np.zeros((nsubsets, nvars), dtype=bool)
+    for i, subset in enumerate(subsets):
+        masks[i, subset] = True
+    masks2 = masks[:,:,np.newaxis] & masks[:,np.newaxis,:]
+
+    # rows with nan (in the columns of the subset) are dropped
+    isnan = np.isnan(X)
+    valid = ~np.isnan(y) & ~(isnan[np.newaxis,:,:] & masks[:,np.newaxis,:]).any(axis=2)
+    y = np.where(np.isnan(y), 0, y)
+    X = np.where(isnan, 0, X)
+
+    # rank of the design matrix of each subset (e.g. a column of zeros does not count)
+    rank = np.linalg.matrix_rank(_gram(valid.astype(float), X) * masks2, hermitian=True)
+    full_rank = rank == masks.sum(axis=1)
+    eye = np.eye(nvars) * ~masks[:,:,np.newaxis]
+
+    def solve(gram, rhs):
+        """return (params, inverse of the Gram matrix), both are zero out of the subset"""
+        inv = np.empty_like(gram)
+        if full_rank.any():
+            # the columns out of the subset get an identity block, so the masked Gram matrix is invertible
+            inv[full_rank] = np.linalg.inv(gram[full_rank] * masks2[full_rank] + eye[full_rank])
+        if not full_rank.all():
+            # pseudo inverse (as statsmodels), so a constant / duplicated column does not fail the fit
+            inv[~full_rank] = np.linalg.pinv(gram[~full_rank] * masks2[~full_rank], hermitian=True)
+        inv *= masks2
+        return np.matmul(inv, (rhs * masks)[:,:,np.newaxis])[:,:,0], inv
+
+    # first iteration
+    if start_params is None:
+        # the same start as statsmodels: mu = (y + mean(y)) / 2
+        ymean = np.sum(y * valid, axis=1) / valid.sum(axis=1)
+        mu = (y[np.newaxis,:] + ymean[:,np.newaxis]) / 2
+        eta = np.log(mu)
+        w = mu * valid
+        z = eta + (y - mu) / mu
+        gram = _gram(w, X)
+    else:
+        eta0 = X @ np.asarray(start_params, dtype=float)
+        mu0 = np.exp(eta0)
+        z0 = eta0 + (y - mu0) / mu0
+
+        # one weighted Gram matrix for every pattern of dropped rows, sliced by the mask of each subset
+        ipattern = {}
+        for v in valid:
+            ipattern.setdefault(v.tobytes(), len(ipattern))
+        patterns = np.array([np.frombuffer(key, dtype=bool) for key in ipattern])
+        gram = _gram(patterns * mu0, X)[[ipattern[v.tobytes()] for v in valid]]
+        w = mu0 * valid
+        z = np.broadcast_to(z0, valid.shape)
+        mu = np.broadcast_to(mu0, valid.shape)
+
+    dev = _deviance(y, mu, valid)
+    converged = np.zeros(nsubsets, dtype=bool)
+
+    for _ in range(maxiter):
+        params, _ = solve(gram, (w * z) @ X)
+        eta = params @ X.T
+        mu = np.exp(eta)
+
+        new_dev = _deviance(y, mu, valid)
+        converged = np.abs(new_dev - dev) <= tol
+        dev = new_dev
+        if converged.all():
+            break
+
+        w = mu * valid
+        z = eta + (y - mu) / mu
+        gram = _gram(w, X)
+
+    # covariance at the fitted values
+    _, normalized_cov = solve(_gram(mu * valid, X), np.zeros((nsubsets, nvars)))
+
+    return params, normalized_cov, rank, valid, mu
+
+
+def fit_poisson(y, X, columns=None, scale='1', start_params=None):
+    """
+    Fit one Poisson regression, the same as
+    sm.GLM(y, X, family=sm.families.Poisson(), missing='drop').fit(scale=scale)
+    X : array or df, columns : the names of the columns (X.columns if X is a df)
+    return PoissonGLMResult
+    """
+    if columns is None:
+        columns = X.columns if isinstance(X, pd.DataFrame) else [f'x{i}' for i in range(np.shape(X)[1])]
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    params, cov, rank, valid, mu = fit_poisson_subsets(y, X, [list(range(X.shape[1]))], start_params)
+    return PoissonGLMResult(params[0], cov[0], y[valid[0]], mu[0, valid[0]], rank[0], columns, scale)
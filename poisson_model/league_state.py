@@ -0,0 +1,253 @@
+# Incremental state of a league during the season.
+# Every played match updates the table and the last-five-matches ring buffers in O(1), and the
+# regression variables (`Round`, `b5MatchGoal`, `bRival5MatchConceded`, `PtDiff`, ...) can be
+# queried in O(1) without rebuilding the table.
+
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+
+# all possible regression variables (the same order as `SimulateAllSeason.cols`)
+REG_VARS = [
+    'const',
+    'Round', 'isHome',
+    'b5MatchGoal',
+    'bRival5MatchGoal', 'bRival5MatchConceded',
+    'SelfAS', 'SelfDS', 'RivalAS', 'RivalDS',
+    'SelfFromCL', 'RivalFromCL',
+    'PtDiff', 'isDec'
+]
+
+ADC_COLS = ['SelfAS', 'SelfDS', 'RivalAS', 'RivalDS', 'SelfFromCL', 'RivalFromCL']
+
+
+@lru_cache(maxsize=None)
+def _is_december(date):
+    return pd.to_datetime(date).month == 12
+
+
+class LeagueState:
+    """
+    The table of `nsims` parallel leagues which play the same fixtures.
+    nsims = 1 for the real league, or nsims > 1 for the simulations.
+
+    The number of played matches only depends on the fixtures, so `self.played` has shape (nteams,),
+    and all the other arrays have shape (nsims, nteams).
+    """
+
+    def __init__(self, allteams, nsims=1):
+        self.allteams = np.asarray(allteams)
+        self.team_idx = {team: i for i, team in enumerate(self.allteams)}
+        self.nsims = nsims
+
+        nteams = len(self.allteams)
+        self.played = np.zeros(nteams, dtype=int)
+
+        # the arrays are stored team-major (column-major for the shape (nsims, nteams)),
+        # so the columns of a team, which are updated after every match, are contiguous.
+        # The counts of a season are int16 and the goals of a match are int8.
+        self.win = self._zeros(nsims, nteams)
+        self.draw = self._zeros(nsims, nteams)
+        self.loss = self._zeros(nsims, nteams)
+        self.goals = self._zeros(nsims, nteams)
+        self.conceded = self._zeros(nsims, nteams)
+
+        # goals / conceded of the last five matches, the slot of the next match is `played % 5`
+        self.last5_goals = np.zeros((nteams, 5, nsims), dtype=np.int8).transpose(2, 0, 1)
+        self.last5_conceded = np.zeros((nteams, 5, nsims), dtype=np.int8).transpose(2, 0, 1)
+        self.b5_goals = self._zeros(nsims, nteams)
+        self.b5_conceded = self._zeros(nsims, nteams)
+
+        # average points per match, and its sum / sum of square over teams (for standardization)
+        self.avg_points = self._zeros(nsims, nteams, dtype=float)
+        self.sum_avg_points = np.zeros(nsims)
+        self.sum_avg_points2 = np.zeros(nsims)
+        self.n_unplayed = nteams
+
+    @staticmethod
+    def _zeros(nsims, nteams, dtype=np.int16):
+        """zeros with shape (nsims, nteams), the columns are contiguous"""
+        return np.zeros((nteams, nsims), dtype=dtype).T
+
+    @classmethod
+    def from_matchs(cls, matchs_df, allteams=None):
+        """
+        Replay the played matches.
+        matchs_df : df with columns 'HomeTeam', 'HomeScore', 'AwayScore', 'AwayTeam',
+                    e.g. clean_data/<season>.csv (it will be sorted by 'Date' if it has the column)
+        """
+        if 'Date' in matchs_df.columns:
+            matchs_df = matchs_df.sort_values('Date', ignore_index=True)
+        if allteams is None:
+            allteams = matchs_df['HomeTeam'].unique()
+
+        state = cls(allteams)
+        for home, away, home_goal, away_goal in zip(
+            matchs_df['HomeTeam'], matchs_df['AwayTeam'], matchs_df['HomeScore'], matchs_df['AwayScore']
+        ):
+            state.update(home, away, home_goal, away_goal)
+        return state
+
+    def _index(self, team):
+        """team : str (name of the team) or int (index of the team)"""
+        if isinstance(team, str):
+            return self.team_idx[team]
+        return team
+
+    @property
+    def points(self):
+        return self.win * 3 + self.draw
+
+    def update(self, home, away, home_goal, away_goal):
+        """
+        home, away : str or int, the team name or index
+        home_goal, away_goal : int or array with shape (nsims,)
+        """
+        home = self._index(home)
+        away = self._index(away)
+        home_goal = np.broadcast_to(home_goal, (self.nsims,))
+        away_goal = np.broadcast_to(away_goal, (self.nsims,))
+
+        home_win = home_goal > away_goal
+        home_loss = home_goal < away_goal
+        is_draw = home_goal == away_goal
+
+        self.win[:,home] += home_win
+        self.win[:,away] += home_loss
+        self.draw[:,home] += is_draw
+        self.draw[:,away] += is_draw
+        self.loss[:,home] += home_loss
+        self.loss[:,away] += home_win
+
+        self.goals[:,home] += home_goal
+        self.goals[:,away] += away_goal
+        self.conceded[:,home] += away_goal
+        self.conceded[:,away] += home_goal
+
+        for team, goal, conceded in ((home, home_goal, away_goal), (away, away_goal, home_goal)):
+            slot = self.played[team] % 5
+            self.b5_goals[:,team] += goal - self.last5_goals[:,team,slot]
+            self.b5_conceded[:,team] += conceded - self.last5_conceded[:,team,slot]
+            self.last5_goals[:,team,slot] = goal
+            self.last5_conceded[:,team,slot] = conceded
+
+            if self.played[team] == 0:
+                self.n_unplayed -= 1
+            self.played[team] += 1
+
+            old = self.avg_points[:,team]
+            new = (self.win[:,team] * 3 + self.draw[:,team]) / self.played[team]
+            self.sum_avg_points += new - old
+            self.sum_avg_points2 += new ** 2 - old ** 2
+            self.avg_points[:,team] = new
+
+    def round(self, team):
+        """the round of the next match of `team`"""
+        return self.played[self._index(team)] + 1
+
+    def b5_match_goal(self, team):
+        """goals in the last five matches, shape = (nsims,)"""
+        return self.b5_goals[:,self._index(team)]
+
+    def b5_match_conceded(self, team):
+        """conceded in the last five matches, shape = (nsims,)"""
+        return self.b5_conceded[:,self._index(team)]
+
+    def std_points(self, team):
+        """
+        Standardized average points, shape = (nsims,)
+        It is nan if any team has not played yet.
+        """
+        if self.n_unplayed > 0:
+            return np.full(self.nsims, np.nan)
+
+        n = len(self.allteams)
+        mean = self.sum_avg_points / n
+        var = np.maximum(self.sum_avg_points2 - self.sum_avg_points * mean, 0) / (n - 1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (self.avg_points[:,self._index(team)] - mean) / np.sqrt(var)
+
+    def pt_diff(self, team, rival):
+        """standardized points of `team` minus that of `rival`, shape = (nsims,)"""
+        team = self._index(team)
+        rival = self._index(rival)
+
+        if self.n_unplayed > 0:
+            return np.full(self.nsims, np.nan)
+
+        n = len(self.allteams)
+        var = np.maximum(self.sum_avg_points2 - self.sum_avg_points ** 2 / n, 0) / (n - 1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (self.avg_points[:,team] - self.avg_points[:,rival]) / np.sqrt(var)
+
+    def reg_data(self, team, rival, is_team_home, date, adc, out=None):
+        """
+        Regression data of `team` in the next match, shape = (nsims, len(REG_VARS))
+        is_team_home : bool
+        date : str, e.g. '2020-10-12'
+        adc : array, [SelfAS, SelfDS, RivalAS, RivalDS, SelfFromCL, RivalFromCL]
+        out : optional array with shape (nsims, len(REG_VARS)) to put the result
+        """
+        if out is None:
+            out = np.empty((self.nsims, len(REG_VARS)))
+
+        out[:,0] = 1
+        out[:,1] = self.round(team)
+        out[:,2] = 1 if is_team_home else 0
+        out[:,3] = self.b5_match_goal(team)
+        out[:,4] = self.b5_match_goal(rival)
+        out[:,5] = self.b5_match_conceded(rival)
+        out[:,6:12] = adc
+        out[:,12] = self.pt_diff(team, rival)
+        out[:,13] = 1 if _is_december(date) else 0
+        return out
+
+    def reg_data_many(self, teams, rivals, is_team_home, dates, adc, isim=0):
+        """
+        Regression data of many matches in the `isim`'th league at once, shape = (n, len(REG_VARS)),
+        each row is the same as `self.reg_data` of the match
+        teams, rivals : (n,) int, the index of the teams
+        is_team_home : (n,) bool
+        dates : (n,) str
+        adc : (n, 6), see `self.reg_data`
+        """
+        teams = np.asarray(teams, dtype=int)
+        rivals = np.asarray(rivals, dtype=int)
+
+        out = np.empty((len(teams), len(REG_VARS)))
+        out[:,0] = 1
+        out[:,1] = self.played[teams] + 1
+        out[:,2] = np.asarray(is_team_home, dtype=bool)
+        out[:,3] = self.b5_goals[isim, teams]
+        out[:,4] = self.b5_goals[isim, rivals]
+        out[:,5] = self.b5_conceded[isim, rivals]
+        out[:,6:12] = adc
+
+        if self.n_unplayed > 0:
+            out[:,12] = np.nan
+        else:
+            n = len(self.allteams)
+            var = max(self.sum_avg_points2[isim] - self.sum_avg_points[isim] ** 2 / n, 0) / (n - 1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out[:,12] = (self.avg_points[isim, teams] - self.avg_points[isim, rivals]) / np.sqrt(var)
+
+        out[:,13] = [1 if _is_december(date) else 0 for date in dates]
+        return out
+
+    def table(self, isim=0):
+        """the table of the `isim`'th league, the same format as `SimulateAllSeason._create_table`"""
+        points = self.points[isim]
+        table = pd.DataFrame({
+            'Team': self.allteams,
+            'Win': self.win[isim],
+            'Draw': self.draw[isim],
+            'Loss': self.loss[isim],
+            'Goals': [f'{g}:{c}' for g, c in zip(self.goals[isim], self.conceded[isim])],
+            'Points': points
+        })
+        table = table.iloc[np.argsort(-points, kind='stable')].reset_index(drop=True)
+        table.insert(0, 'Rank', list(range(1, table.shape[0]+1)))
+        return table
@@ -0,0 +1,123 @@
+# On-disk store of the fitted team models of a season.
+# All teams are saved in one .npz file (models/<season>.npz under the root folder of the league,
+# e.g. leagues/la_liga/models/1819.npz): the selected variables, the coefficients, the covariance
+# and the scale of each team, the league, the training seasons, and the schema of team_data used
+# to build the regression variables.
+# Loading only reads the arrays (no statsmodels, no refit), and returns `CompiledModels` which can
+# predict directly.
+
+
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from data_store import team_data_columns
+from leagues import PREMIER_LEAGUE, get_league
+from poisson_model.compiled import CompiledModels
+from poisson_model.fitting import TEAM_DATA_COLS
+
+
+MODEL_DIR = 'models'
+MODEL_STORE_VERSION = 1
+
+ModelMeta = namedtuple('ModelMeta', ['league', 'season', 'season_start', 'season_end', 'scale', 'team_data_columns'])
+
+
+def model_path(season, league=None):
+    """league : League or the name of a registered league, default is Premier League (models/<season>.npz)"""
+    return os.path.join(get_league(league).root, MODEL_DIR, f'{season}.npz')
+
+
+def _last_season(season):
+    """e.g. season = '1819' -> '1718'"""
+    return f'{int(season[:2])-1:02d}{int(season[2:])-1:02d}'
+
+
+def save_models(season, team_res_dict, season_start='1011', season_end=None, path=None, league=None):
+    """
+    Save the models of `season` of `league`, which are trained by the seasons from `season_start`
+    to `season_end` (default: the last season of `season`).
+    team_res_dict : Dict[str_team_name, GLM_result_obj] (statsmodels result or `PoissonGLMResult`)
+    """
+    league = get_league(league)
+    if season_end is None:
+        season_end = _last_season(season)
+    if path is None:
+        path = model_path(season, league)
+
+    compiled = CompiledModels.compile(team_res_dict)
+    scale = np.array([float(team_res_dict[team].scale) for team in compiled.teams])
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp.npz'
+    np.savez(
+        tmp_path,
+        version=np.array(MODEL_STORE_VERSION),
+        league=np.array(league.name),
+        season=np.array(season),
+        season_range=np.array([season_start, season_end]),
+        teams=compiled.teams.astype(str),
+        variables=np.array(compiled.variables),
+        used=compiled.used,
+        coef=compiled.coef,
+        cov=compiled.cov,
+        scale=scale,
+        feature_columns=np.array(TEAM_DATA_COLS),
+        team_data_columns=np.array(team_data_columns(season_end, league)),
+    )
+    # replace the old file only after the new one is complete
+    os.replace(tmp_path, path)
+
+
+def load_models(season, path=None, check_schema=True, league=None):
+    """
+    return (compiled, meta)
+        compiled : CompiledModels
+        meta     : ModelMeta, scale is Dict[str_team_name, float]
+    check_schema : raise ValueError if the columns of team_data (of the last training season) or
+                   the columns used to build the regression variables have changed since saving
+    raise ValueError if the models are not fitted for `league`
+    """
+    league = get_league(league)
+    if path is None:
+        path = model_path(season, league)
+
+    with np.load(path, allow_pickle=False) as npz:
+        data = {key: npz[key] for key in npz.files}
+
+    if int(data['version']) != MODEL_STORE_VERSION:
+        raise ValueError(f'{path} is saved by model store version {int(data["version"])}, but the current version is {MODEL_STORE_VERSION}')
+
+    # the files saved before the league was recorded are all Premier League
+    saved_league = str(data['league']) if 'league' in data else PREMIER_LEAGUE.name
+    if saved_league != league.name:
+        raise ValueError(f'{path} has the models of {saved_league}, not {league.name}')
+
+    season_start, season_end = data['season_range'].tolist()
+    saved_columns = data['team_data_columns'].tolist()
+
+    if check_schema:
+        if data['feature_columns'].tolist() != TEAM_DATA_COLS:
+            raise ValueError(f'{path}: the regression variables are built from different team_data columns, refit the models')
+        current_columns = team_data_columns(season_end, league)
+        if saved_columns != current_columns:
+            diff = sorted(set(saved_columns).symmetric_difference(current_columns))
+            raise ValueError(f'{path}: the columns of team_data/{season_end} have changed {diff if diff else "(order)"}, refit the models')
+
+    teams = data['teams'].tolist()
+    compiled = CompiledModels(teams, data['variables'].tolist(), data['coef'], data['cov'], data['used'])
+    meta = ModelMeta(saved_league, str(data['season']), season_start, season_end, dict(zip(teams, data['scale'].tolist())), saved_columns)
+    return compiled, meta
+
+
+if __name__ == '__main__':
+    import sys
+    from poisson_model.fitting import fit_all_teams
+
+    # e.g. python -m poisson_model.model_store 1819 ["La Liga"]
+    season = sys.argv[1] if len(sys.argv) > 1 else '1819'
+    league = get_league(sys.argv[2] if len(sys.argv) > 2 else None)
+    team_res_dict, _ = fit_all_teams(season, verbose=True, league=league)
+    save_models(season, team_res_dict, league=league)
+    print(f'saved {model_path(season, league)}')
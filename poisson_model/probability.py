@@ -0,0 +1,144 @@
+# Win / draw / loss probabilities of many matches at once.
+# The goals of the two teams are independent Poisson variables (see `independence_test.py`), so
+#   P(draw) = sum_k p_home(k) p_away(k)
+#   P(win)  = sum_k p_home(k) P(away goals < k)
+#   P(loss) = sum_k p_away(k) P(home goals < k)
+# which are the sums over the upper / diagonal / lower part of the scoreline matrix in
+# `PredictGoals._calc_prob`, computed for all matches by a few array operations.
+
+
+import numpy as np
+import pandas as pd
+from scipy.stats import poisson
+
+
+# goals 0 ~ 14, the same grid as `PredictGoals._calc_prob` in `Modeling.ipynb`
+MAX_GOALS = 15
+
+# number of matches computed at once (the pmf arrays of a chunk stay in the cache)
+CHUNK_SIZE = 16384
+
+
+def poisson_pmf(mu, max_goals=MAX_GOALS):
+    """
+    mu : (n,)
+    return pmf, pmf.shape = (n, max_goals), pmf[:,k] = P(goals = k)
+    """
+    mu = np.asarray(mu, dtype=float).reshape(-1, 1)
+
+    # p(0) = exp(-mu), p(k) = p(k-1) * mu / k
+    pmf = np.empty((mu.shape[0], max_goals))
+    pmf[:,:1] = np.exp(-mu)
+    pmf[:,1:] = mu / np.arange(1, max_goals)
+    return np.cumprod(pmf, axis=1, out=pmf)
+
+
+def poisson_ppf(u, mu, max_goals=MAX_GOALS):
+    """
+    Inverse cdf of the Poisson distribution: the smallest k with P(goals <= k) >= u
+    u, mu : (n,), u is uniform in [0, 1)
+    The same `u` gives the same goals if `mu` changes a little (common random numbers).
+    """
+    u = np.asarray(u, dtype=float).ravel()
+    mu = np.asarray(mu, dtype=float).ravel()
+
+    # search k = 0, 1, 2, ... only for the elements with P(goals <= k) < u,
+    # p(k) and the cdf are accumulated in the same order as `poisson_pmf` and np.cumsum
+    goals = np.zeros(u.shape[0], dtype=int)
+    idx = np.arange(u.shape[0])
+    pmf = np.exp(-mu)
+    cdf = pmf.copy()
+    for k in range(1, max_goals):
+        active = cdf < u[idx]
+        idx, pmf, cdf = idx[active], pmf[active], cdf[active]
+        if idx.size == 0:
+            break
+        goals[idx] += 1
+        pmf *= mu[idx] / k
+        cdf += pmf
+    else:
+        # out of the grid (very rare)
+        beyond = idx[cdf < u[idx]]
+        goals[beyond] = poisson.ppf(u[beyond], mu[beyond])
+    return goals
+
+
+class PMFCache:
+    """
+    Poisson pmf of quantized mu (rounded to the multiple of `step`), for very large batches.
+    The error of mu is at most `step` / 2 (about `step` for the probabilities).
+    The mu out of [0, mu_max] (or nan) are not quantized.
+    """
+
+    def __init__(self, step=1e-3, mu_max=10., max_goals=MAX_GOALS):
+        self.step = step
+        self.mu_max = mu_max
+        self.max_goals = max_goals
+        self.table = poisson_pmf(np.arange(int(round(mu_max / step)) + 1) * step, max_goals)
+
+    def pmf(self, mu):
+        mu = np.asarray(mu, dtype=float).ravel()
+        inrange = (mu >= 0) & (mu <= self.mu_max)
+
+        pmf = self.table[np.rint(np.where(inrange, mu, 0) / self.step).astype(int)]
+        if not inrange.all():
+            pmf[~inrange] = poisson_pmf(mu[~inrange], self.max_goals)
+        return pmf
+
+
+def _pmf(mu, max_goals, cache):
+    if cache is None:
+        return poisson_pmf(mu, max_goals)
+    if cache.max_goals != max_goals:
+        raise ValueError(f'the cache is built for max_goals={cache.max_goals}')
+    return cache.pmf(mu)
+
+
+def match_probs(mu_home, mu_away, max_goals=MAX_GOALS, cache=None, chunksize=CHUNK_SIZE):
+    """
+    mu_home / mu_away : (n,), the expected goals of the home / away team
+    cache : PMFCache or None
+    return (prob_win, prob_draw, prob_loss) of the home team, each shape = (n,)
+    """
+    mu_home = np.asarray(mu_home, dtype=float).ravel()
+    mu_away = np.asarray(mu_away, dtype=float).ravel()
+    if mu_home.shape != mu_away.shape:
+        raise ValueError('mu_home and mu_away should have the same length')
+
+    n = mu_home.shape[0]
+    prob = np.empty((3, n))
+
+    for start in range(0, n, chunksize):
+        stop = min(start + chunksize, n)
+        pmf_home = _pmf(mu_home[start:stop], max_goals, cache)
+        pmf_away = _pmf(mu_away[start:stop], max_goals, cache)
+        cdf_home = np.cumsum(pmf_home, axis=1)
+        cdf_away = np.cumsum(pmf_away, axis=1)
+
+        prob[0, start:stop] = np.einsum('ij,ij->i', pmf_home[:,1:], cdf_away[:,:-1])
+        prob[1, start:stop] = np.einsum('ij,ij->i', pmf_home, pmf_away)
+        prob[2, start:stop] = np.einsum('ij,ij->i', pmf_away[:,1:], cdf_home[:,:-1])
+
+    return prob[0], prob[1], prob[2]
+
+
+def scoreline_matrix(mu_home, mu_away, max_goals=MAX_GOALS, cache=None):
+    """
+    mu_home / mu_away : (n,)
+    return (n, max_goals, max_goals) array, [:, i, j] = P(home goals = i, away goals = j)
+    (the transpose of `joint_pmf` in `PredictGoals._calc_prob`)
+    """
+    pmf_home = _pmf(mu_home, max_goals, cache)
+    pmf_away = _pmf(mu_away, max_goals, cache)
+    return pmf_home[:,:,np.newaxis] * pmf_away[:,np.newaxis,:]
+
+
+def append_match_probs(team_pred_res, cache=None):
+    """
+    team_pred_res : df with columns 'mu' and 'Rival_mu', e.g. the result of `PredictGoals`
+    return a new df with columns 'prob_win', 'prob_draw' and 'prob_loss' appended,
+    the same as `PredictGoals._calc_prob`
+    """
+    prob_win, prob_draw, prob_loss = match_probs(team_pred_res['mu'], team_pred_res['Rival_mu'], cache=cache)
+    prob_df = pd.DataFrame({'prob_win': prob_win, 'prob_draw': prob_draw, 'prob_loss': prob_loss})
+    return pd.concat([team_pred_res.reset_index(drop=True), prob_df], axis=1)
@@ -0,0 +1,232 @@
+# What-if scenarios on top of `BatchSimulateSeason`, e.g. "if Spurs beat Arsenal, how does
+# P(top 4) change?"
+#
+# The random numbers of every match and every simulation are drawn once and stored, and the goals
+# are their Poisson inverse cdf (common random numbers). A scenario forces the results of some
+# matches and re-simulates with the same random numbers:
+#   - the simulations whose baseline results already satisfy all forced results are unchanged
+#   - the other simulations replay the stored results before the first forced match, and are
+#     simulated again only from there.
+# So the scenarios are paired with the baseline (and with each other), and their difference has a
+# much smaller variance than two independent runs.
+#
+# A forced outcome ('H' / 'D' / 'A') keeps the simulated score if it has that outcome. Otherwise the
+# score is sampled from the distribution conditioned on the outcome, by the random numbers of a
+# separate stream of the match: the stored ones are not uniform any more once the score is rejected.
+
+
+import numpy as np
+import pandas as pd
+
+from poisson_model.league_state import REG_VARS, LeagueState
+from poisson_model.probability import poisson_pmf, poisson_ppf
+from poisson_model.simulation import MU_UPPER_BOUND, SeasonResult
+
+
+# the outcomes of the home team: win, draw and loss
+OUTCOMES = ('H', 'D', 'A')
+
+
+def _satisfy(result, home_goal, away_goal):
+    """result : (home_goal, away_goal) or 'H' / 'D' / 'A', return bool array"""
+    if isinstance(result, str):
+        return {
+            'H': home_goal > away_goal,
+            'D': home_goal == away_goal,
+            'A': home_goal < away_goal,
+        }[result]
+    return (home_goal == result[0]) & (away_goal == result[1])
+
+
+def _inverse_cdf(weights, u):
+    """
+    weights : (n, m), u : (n,) uniform in [0, 1)
+    return (n,), the index k sampled with the probability weights[:,k] / weights.sum(axis=1)
+    """
+    cdf = np.cumsum(weights, axis=1)
+    k = (cdf <= u[:,np.newaxis] * cdf[:,-1:]).sum(axis=1)
+    return np.minimum(k, weights.shape[1] - 1)
+
+
+def _sample_outcome(mu_home, mu_away, outcome, v):
+    """
+    Sample the scores of the matches conditioned on `outcome` ('H', 'D' or 'A')
+    mu_home, mu_away : (n,), v : (n, 2) uniform numbers
+    return (home_goal, away_goal), each shape = (n,)
+    The goals k of the winner are sampled from P(goals = k, goals of the other team < k) (the terms
+    of P(win) in `probability.py`), then the goals of the other team from 0 ~ k-1.
+    """
+    if outcome == 'A':
+        away_goal, home_goal = _sample_outcome(mu_away, mu_home, 'H', v)
+        return home_goal, away_goal
+
+    pmf_home = poisson_pmf(mu_home)
+    pmf_away = poisson_pmf(mu_away)
+    if outcome == 'D':
+        goal = _inverse_cdf(pmf_home * pmf_away, v[:,0])
+        return goal, goal.copy()
+
+    # home goals k = 1, 2, ... with the weights p_home(k) P(away goals < k)
+    cdf_away = np.cumsum(pmf_away, axis=1)
+    home_goal = _inverse_cdf(pmf_home[:,1:] * cdf_away[:,:-1], v[:,0]) + 1
+
+    bound = v[:,1] * cdf_away[np.arange(len(home_goal)), home_goal - 1]
+    away_goal = np.minimum((cdf_away <= bound[:,np.newaxis]).sum(axis=1), home_goal - 1)
+    return home_goal, away_goal
+
+
+class ScenarioSimulator:
+    """
+    The baseline simulations of a season, and the what-if scenarios of them.
+    The stored random numbers take nmatchs * nsims * 2 floats (about 30 MB for 5000 seasons of 380
+    matches, twice for 'resample').
+    """
+
+    def __init__(self, simulator, nsims=5000, method='sample', seed=None):
+        """
+        simulator : BatchSimulateSeason
+        method : 'sample' or 'resample' (see `BatchSimulateSeason.run`)
+        seed : None, int or np.random.SeedSequence
+        """
+        if method not in ('sample', 'resample'):
+            raise ValueError("method should be 'sample' or 'resample'")
+
+        self.sim = simulator
+        self.nsims = nsims
+        self.method = method
+        self.match_idx = {(self.sim.allteams[h], self.sim.allteams[a]): i for i, (h, a) in enumerate(zip(self.sim.home_idx, self.sim.away_idx))}
+
+        # (nmatchs, nsims, 2) for the home / away goals, and the normal variables of 'resample'
+        seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        rng = np.random.default_rng(seed)
+        nmatchs = len(self.sim.dates)
+        self.u = rng.random((nmatchs, nsims, 2))
+        self.z = rng.standard_normal((nmatchs, nsims, 2)) if method == 'resample' else None
+
+        # the streams of the scores sampled under a forced outcome, one per match (see `_outcome_uniforms`)
+        self.outcome_seeds = seed.spawn(nmatchs)
+
+        # results of the baseline: (nmatchs, nsims)
+        self.home_goals = np.empty((nmatchs, nsims), dtype=np.int16)
+        self.away_goals = np.empty((nmatchs, nsims), dtype=np.int16)
+
+        state = self._simulate(np.arange(nsims), {}, 0, LeagueState(self.sim.allteams, nsims))
+        self.baseline = SeasonResult(self.sim.allteams, state.win, state.draw, state.loss, state.goals, state.conceded)
+
+    def _mu(self, x, team, z):
+        """the same as `BatchSimulateSeason._predict_team_score`, but return mu"""
+        eta = x @ self.sim.coef[team]
+        if self.method == 'resample':
+            var = np.einsum('ni,ij,nj->n', x, self.sim.cov[team], x)
+            eta = eta + np.sqrt(var) * z
+        return np.minimum(np.exp(eta), MU_UPPER_BOUND)
+
+    def _outcome_uniforms(self, i):
+        """(nsims, 2) uniform numbers of the match i, the same in every scenario"""
+        return np.random.default_rng(self.outcome_seeds[i]).random((self.nsims, 2))
+
+    def _simulate(self, sims, forced, start, state):
+        """
+        Simulate the matches from `start` for the simulations `sims`.
+        forced : Dict[int_match_index, result]
+        state : LeagueState before the match `start`, nsims = len(sims)
+        The baseline (forced = {}) stores the results in `self.home_goals` / `self.away_goals`.
+        """
+        sim = self.sim
+        x_home = np.empty((len(sims), len(REG_VARS)))
+        x_away = np.empty((len(sims), len(REG_VARS)))
+
+        for i in range(start, len(sim.dates)):
+            home = sim.home_idx[i]
+            away = sim.away_idx[i]
+            result = forced.get(i)
+
+            if isinstance(result, tuple):
+                home_goal, away_goal = result
+
+            elif sim.use_real[i] and result is None:
+                home_goal = sim.home_score[i]
+                away_goal = sim.away_score[i]
+
+            else:
+                u = self.u[i, sims]
+                z = self.z[i, sims] if self.z is not None else np.zeros((len(sims), 2))
+                state.reg_data(home, away, True, sim.dates[i], sim.home_adc[i], out=x_home)
+                state.reg_data(away, home, False, sim.dates[i], sim.away_adc[i], out=x_away)
+                mu_home = self._mu(x_home, home, z[:,0])
+                mu_away = self._mu(x_away, away, z[:,1])
+                home_goal = poisson_ppf(u[:,0], mu_home)
+                away_goal = poisson_ppf(u[:,1], mu_away)
+
+                if result is not None:
+                    # keep the results of the outcome, and sample the others conditioned on it
+                    resample = ~_satisfy(result, home_goal, away_goal)
+                    if resample.any():
+                        home_goal[resample], away_goal[resample] = _sample_outcome(
+                            mu_home[resample], mu_away[resample], result, self._outcome_uniforms(i)[sims[resample]]
+                        )
+
+            if not forced:
+                self.home_goals[i] = home_goal
+                self.away_goals[i] = away_goal
+            state.update(home, away, home_goal, away_goal)
+
+        return state
+
+    def _match_index(self, home, away):
+        try:
+            return self.match_idx[(home, away)]
+        except KeyError:
+            raise KeyError(f'no match {home} (home) vs {away} (away) in {self.sim.season}') from None
+
+    def scenario(self, forced):
+        """
+        forced : Dict[(str_home_team, str_away_team), result]
+            result is the score (home_goal, away_goal), or the outcome 'H', 'D' or 'A' of the home team
+            e.g. {('Spurs', 'Arsenal'): 'H', ('Man City', 'Liverpool'): (1, 1)}
+        return SeasonResult, paired with `self.baseline` (the same random numbers)
+        """
+        forced_idx = {}
+        for (home, away), result in forced.items():
+            if not isinstance(result, str):
+                result = tuple(int(g) for g in result)
+            elif result not in OUTCOMES:
+                raise ValueError(f"result should be a score or 'H' / 'D' / 'A', got {result!r}")
+            forced_idx[self._match_index(home, away)] = result
+
+        base = self.baseline
+        win, draw, loss = base.win.copy(), base.draw.copy(), base.loss.copy()
+        goals, conceded = base.goals.copy(), base.conceded.copy()
+        if not forced_idx:
+            return SeasonResult(self.sim.allteams, win, draw, loss, goals, conceded)
+
+        # only the simulations against the forced results are simulated again
+        affected = np.zeros(self.nsims, dtype=bool)
+        for i, result in forced_idx.items():
+            affected |= ~_satisfy(result, self.home_goals[i], self.away_goals[i])
+        sims = np.flatnonzero(affected)
+
+        # replay the stored results before the first forced match
+        start = min(forced_idx)
+        state = LeagueState(self.sim.allteams, len(sims))
+        for i in range(start):
+            state.update(self.sim.home_idx[i], self.sim.away_idx[i], self.home_goals[i, sims], self.away_goals[i, sims])
+
+        state = self._simulate(sims, forced_idx, start, state)
+
+        win[sims], draw[sims], loss[sims] = state.win, state.draw, state.loss
+        goals[sims], conceded[sims] = state.goals, state.conceded
+        return SeasonResult(self.sim.allteams, win, draw, loss, goals, conceded)
+
+    def compare(self, scenarios, top=4):
+        """
+        scenarios : Dict[str_name, forced], see `self.scenario`
+        return df, index = teams, columns = ['baseline'] + names,
+            the probability of finishing in the top `top` ranks
+        """
+        results = {'baseline': self.baseline}
+        results.update({name: self.scenario(forced) for name, forced in scenarios.items()})
+        return pd.DataFrame(
+            {name: (res.rank <= top).mean(axis=0) for name, res in results.items()},
+            index=self.sim.allteams
+        )
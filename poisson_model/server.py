@@ -0,0 +1,407 @@
+# Resident prediction server on localhost (TCP or a Unix socket).
+# The fitted models (`models/<season>.npz`, see `model_store`), the attack / defence strength and the
+# `LeagueState` of the played matches are loaded once, then every query
+# "home vs away on date" is answered with mu, its confidence interval and the win / draw / loss
+# probabilities of the home team:
+#
+#   python -m poisson_model.server 1819 --port 8000
+#   curl 'http://127.0.0.1:8000/predict?home=Liverpool&away=Arsenal&date=2019-05-12'
+#   curl -d '[{"home": "Liverpool", "away": "Arsenal", "date": "2019-05-12"}, ...]' http://127.0.0.1:8000/predict
+#   curl http://127.0.0.1:8000/stats     # latency percentiles (the 400 / 500 answers included), errors and batch sizes
+#
+# The concurrent requests are coalesced into micro-batches: one worker thread computes all the
+# queries waiting in the queue by the vectorized predictor, while the next requests are queued.
+
+
+import os
+import json
+import time
+import queue
+import signal
+import argparse
+import threading
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+
+import numpy as np
+import pandas as pd
+
+from data_store import teams_of_season
+from leagues import get_league
+from parse_data5_att_def_strength import StrengthIndex
+from poisson_model.compiled import CompiledModels
+from poisson_model.fitting import fit_all_teams
+from poisson_model.league_state import REG_VARS, LeagueState
+from poisson_model.model_store import load_models, model_path
+from poisson_model.probability import match_probs
+
+
+# the largest micro-batch (queries)
+MAX_BATCH = 1024
+
+# number of the latest requests kept for the latency percentiles
+LATENCY_WINDOW = 100000
+
+
+class MatchPredictor:
+    """
+    The models, the strength and the league state of a season, loaded once.
+    `predict` computes many matches at once.
+    """
+
+    def __init__(self, season, compiled, strength_index, state, alpha=0.05):
+        self.season = season
+        self.compiled = compiled
+        self.state = state
+        self.alpha = alpha
+        self.team_idx = state.team_idx
+
+        # the model of each team of `state` (-1 if the team has no model)
+        self.model_idx = np.array([compiled.team_idx.get(team, -1) for team in state.allteams], dtype=int)
+
+        # the strength of each team at home / away: (nteams, 3) = [AS, DS, isFromCL]
+        allteams = state.allteams
+        self.strength_home = np.stack(strength_index.lookup(season, allteams, np.ones(len(allteams), dtype=bool)), axis=1).astype(float)
+        self.strength_away = np.stack(strength_index.lookup(season, allteams, np.zeros(len(allteams), dtype=bool)), axis=1).astype(float)
+
+        # the columns of REG_VARS in the regression data of the models
+        self.reg_cols = [compiled.variables.index(var) for var in REG_VARS if var in compiled.variables]
+        self.reg_vars = [i for i, var in enumerate(REG_VARS) if var in compiled.variables]
+
+    @classmethod
+    def load(cls, season, league=None, models=None, as_of=None, alpha=0.05):
+        """
+        season : e.g. '1819'
+        league : League or the name of a registered league, default is Premier League
+        models : path of the saved models, default is models/<season>.npz under the root folder of
+                 the league. The models are fitted (not saved) if the file does not exist.
+        as_of : only the matches before this date (e.g. '2019-01-01') are in the league state,
+                default is all matches in clean_data/<season>.csv
+        """
+        league = get_league(league)
+        models = models if models is not None else model_path(season, league)
+        if os.path.exists(models):
+            compiled, _ = load_models(season, models, league=league)
+        else:
+            compiled = CompiledModels.compile(fit_all_teams(season, league=league)[0])
+
+        strength_index = StrengthIndex.build(seasons=[season], league=league)
+
+        matchs_df = pd.read_csv(f'{league.clean_dir}/{season}.csv')
+        if as_of is not None:
+            matchs_df = matchs_df[matchs_df['Date'] < as_of]
+        state = LeagueState.from_matchs(matchs_df, allteams=teams_of_season(season, league))
+
+        return cls(season, compiled, strength_index, state, alpha)
+
+    def parse(self, query):
+        """
+        query : Dict with 'home', 'away' and 'date' (e.g. '2019-05-12')
+        return (home_index, away_index, date), raise ValueError for a wrong query
+        """
+        try:
+            home, away, date = query['home'], query['away'], query['date']
+        except (KeyError, TypeError):
+            raise ValueError("the query should have 'home', 'away' and 'date'") from None
+
+        for team in (home, away):
+            # e.g. a list in a json query, which can not be looked up
+            if not isinstance(team, str) or team not in self.team_idx:
+                raise ValueError(f'{team!r} is not in the season {self.season}')
+            if self.model_idx[self.team_idx[team]] < 0:
+                raise ValueError(f'no model of {team!r}')
+        if home == away:
+            raise ValueError('home and away should be different teams')
+        try:
+            date = pd.Timestamp(date).strftime('%Y-%m-%d')
+        except (ValueError, TypeError):
+            raise ValueError(f'can not parse the date {date!r}') from None
+
+        return self.team_idx[home], self.team_idx[away], date
+
+    def predict(self, home, away, dates):
+        """
+        home, away : (n,) int, from `self.parse`
+        dates : (n,) str
+        return Dict[str, array (n,)]: mu_home, mu_away, ci_home (n, 2), ci_away (n, 2),
+            prob_win, prob_draw, prob_loss (of the home team)
+        """
+        home = np.asarray(home, dtype=int)
+        away = np.asarray(away, dtype=int)
+        n = len(home)
+
+        # the rows of the home teams, then the rows of the away teams
+        teams = np.concatenate((home, away))
+        rivals = np.concatenate((away, home))
+        is_home = np.arange(2 * n) < n
+
+        # [SelfAS, SelfDS, RivalAS, RivalDS, SelfFromCL, RivalFromCL] from the view of each team
+        self_strength = np.where(is_home[:,np.newaxis], self.strength_home[teams], self.strength_away[teams])
+        rival_strength = np.where(is_home[:,np.newaxis], self.strength_away[rivals], self.strength_home[rivals])
+        adc = np.concatenate((self_strength[:,:2], rival_strength[:,:2], self_strength[:,2:], rival_strength[:,2:]), axis=1)
+
+        X_reg = self.state.reg_data_many(teams, rivals, is_home, list(dates) * 2, adc)
+        X = np.zeros((2 * n, len(self.compiled.variables)))
+        X[:,self.reg_cols] = X_reg[:,self.reg_vars]
+
+        mu, ci = self.compiled.predict(self.model_idx[teams], X, self.alpha)
+        prob_win, prob_draw, prob_loss = match_probs(mu[:n], mu[n:])
+        return {
+            'mu_home': mu[:n], 'mu_away': mu[n:], 'ci_home': ci[:n], 'ci_away': ci[n:],
+            'prob_win': prob_win, 'prob_draw': prob_draw, 'prob_loss': prob_loss,
+        }
+
+
+class _Pending:
+    """queries of one request, waiting for the result"""
+
+    def __init__(self, parsed):
+        self.parsed = parsed    # List[(home, away, date)]
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Coalesce the queries of concurrent requests: a worker thread takes every request waiting in
+    the queue (up to `max_batch` queries, or until `max_wait` seconds after the first one), and
+    computes them by one call of `predictor.predict`.
+    """
+
+    def __init__(self, predictor, max_batch=MAX_BATCH, max_wait=0.):
+        self.predictor = predictor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.batch_sizes = deque(maxlen=LATENCY_WINDOW)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, parsed):
+        """parsed : List[(home, away, date)], return List[Dict], one result per query (blocking)"""
+        pending = _Pending(parsed)
+        self.queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _collect(self, first):
+        """return the requests of the next batch, starting from `first`"""
+        batch = [first]
+        nqueries = len(first.parsed)
+        deadline = time.perf_counter() + self.max_wait
+        while nqueries < self.max_batch:
+            try:
+                timeout = deadline - time.perf_counter()
+                pending = self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if pending is None:
+                # stop after this batch
+                self.queue.put(None)
+                break
+            batch.append(pending)
+            nqueries += len(pending.parsed)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self.queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+
+            parsed = [query for pending in batch for query in pending.parsed]
+            try:
+                home, away, dates = zip(*parsed)
+                res = self.predictor.predict(home, away, dates)
+                results = [
+                    {key: values[i].tolist() for key, values in res.items()}
+                    for i in range(len(parsed))
+                ]
+            except Exception as err:
+                for pending in batch:
+                    pending.error = err
+                    pending.done.set()
+                continue
+
+            self.batch_sizes.append(len(parsed))
+            start = 0
+            for pending in batch:
+                pending.result = results[start:start+len(pending.parsed)]
+                start += len(pending.parsed)
+                pending.done.set()
+
+
+class LatencyStats:
+    """latency (seconds) of the latest `window` requests, the errors (400 / 500) included"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.count = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def add(self, seconds, status=200):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.count += 1
+            if status != 200:
+                self.errors += 1
+
+    def summary(self):
+        """return Dict, the percentiles in ms"""
+        with self.lock:
+            latencies = np.array(self.latencies)
+            count, errors = self.count, self.errors
+        if latencies.size == 0:
+            return {'count': count, 'errors': errors}
+        p50, p90, p99, p999 = np.percentile(latencies, [50, 90, 99, 99.9]) * 1e3
+        return {
+            'count': count, 'errors': errors, 'window': int(latencies.size),
+            'p50_ms': p50, 'p90_ms': p90, 'p99_ms': p99, 'p999_ms': p999, 'max_ms': latencies.max() * 1e3,
+        }
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    """GET /predict?home=..&away=..&date=.., POST /predict (json query or list), GET /stats, GET /health"""
+
+    protocol_version = 'HTTP/1.1'
+
+    # TCP_NODELAY: the headers and the body are written separately, do not wait for the delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        # no log line per request
+        pass
+
+    def _send(self, status, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _reply(self, t0, status, obj):
+        """send the answer of /predict, and record its latency from `t0` (the errors too)"""
+        self._send(status, obj)
+        self.server.latency.add(time.perf_counter() - t0, status)
+
+    def _predict(self, queries, single, t0=None):
+        t0 = time.perf_counter() if t0 is None else t0
+        self._reply(t0, *self._answer(queries, single))
+
+    def _answer(self, queries, single):
+        """return (status, obj) of the queries"""
+        server = self.server
+        try:
+            parsed = [server.predictor.parse(query) for query in queries]
+        except ValueError as err:
+            return 400, {'error': str(err)}
+        try:
+            results = server.batcher.submit(parsed) if parsed else []
+        except Exception as err:
+            return 500, {'error': f'{type(err).__name__}: {err}'}
+        for query, result in zip(queries, results):
+            result.update(home=query['home'], away=query['away'], date=query['date'])
+        return 200, (results[0] if single else results)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/predict':
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            self._predict([query], single=True)
+        elif url.path == '/stats':
+            stats = self.server.latency.summary()
+            sizes = np.array(self.server.batcher.batch_sizes)
+            if sizes.size:
+                stats.update(batches=int(sizes.size), mean_batch=float(sizes.mean()), max_batch=int(sizes.max()))
+            self._send(200, stats)
+        elif url.path == '/health':
+            self._send(200, {'season': self.server.predictor.season})
+        else:
+            self._send(404, {'error': f'unknown path {url.path}'})
+
+    def do_POST(self):
+        if urlsplit(self.path).path != '/predict':
+            self._send(404, {'error': f'unknown path {self.path}'})
+            return
+        t0 = time.perf_counter()
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        except ValueError:
+            body = None
+        if not isinstance(body, (dict, list)):
+            self._reply(t0, 400, {'error': 'the body should be a json query or a list of queries'})
+            return
+        single = isinstance(body, dict)
+        self._predict([body] if single else body, single, t0)
+
+
+class _UnixPredictionHandler(PredictionHandler):
+    # no TCP options on a Unix socket
+    disable_nagle_algorithm = False
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(predictor, host='127.0.0.1', port=8000, unix_socket=None, max_batch=MAX_BATCH, max_wait=0.):
+    """
+    return the server (call `serve_forever`), on `unix_socket` if given, otherwise on (host, port)
+    max_wait : seconds to wait for more requests after the first one of a batch
+    """
+    if unix_socket is not None:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = UnixHTTPServer(unix_socket, _UnixPredictionHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), PredictionHandler)
+
+    server.predictor = predictor
+    server.batcher = MicroBatcher(predictor, max_batch, max_wait)
+    server.latency = LatencyStats()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Resident prediction server of the Poisson models')
+    parser.add_argument('season', nargs='?', default='1819')
+    parser.add_argument('--league', default=None, help='registered league, default is Premier League')
+    parser.add_argument('--models', default=None, help='saved models (default: models/<season>.npz of the league, fitted if missing)')
+    parser.add_argument('--as-of', default=None, help='only the matches before this date are in the league state')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--unix-socket', default=None, help='serve on a Unix socket instead of TCP')
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    parser.add_argument('--max-wait-ms', type=float, default=0., help='wait for more requests after the first one of a batch')
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    predictor = MatchPredictor.load(args.season, args.league, args.models, args.as_of)
+    server = make_server(predictor, args.host, args.port, args.unix_socket, args.max_batch, args.max_wait_ms / 1e3)
+    where = args.unix_socket if args.unix_socket is not None else f'http://{args.host}:{args.port}'
+    print(f'loaded {args.season} in {time.perf_counter()-t0:.1f} s, serving on {where}')
+
+    # stop by Ctrl-C or SIGTERM, then print the latency percentiles
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.batcher.close()
+        if args.unix_socket is not None:
+            os.remove(args.unix_socket)
+        print(json.dumps(server.latency.summary()))
@@ -0,0 +1,296 @@
+# Vectorized Monte Carlo simulation of a whole season.
+# It is the batch version of `SimulateAllSeason` in `Modeling.ipynb`: the state of the league
+# (`LeagueState`) is kept in numpy arrays with a leading "simulation" axis, so every fixture is
+# simulated for all the seasons at once.
+
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import instrument
+from leagues import get_league
+from parse_data5_att_def_strength import StrengthIndex
+from poisson_model.compiled import CompiledModels
+from poisson_model.league_state import REG_VARS, LeagueState
+
+
+# something strange happened... set an upper bound to prevent the unreasonable result
+MU_UPPER_BOUND = 4
+
+# the first matches of every team use the real result
+N_REAL_MATCHS = 8
+
+# number of simulations sharing one random stream in `BatchSimulateSeason.run_parallel`
+CHUNK_SIZE = 1000
+
+
+class SeasonResult:
+    """
+    Final tables of `nsims` simulated seasons.
+    All the arrays have shape (nsims, nteams), and the columns follow `self.allteams`.
+    """
+
+    def __init__(self, allteams, win, draw, loss, goals, conceded):
+        self.allteams = np.asarray(allteams)
+        self.win = win
+        self.draw = draw
+        self.loss = loss
+        self.goals = goals
+        self.conceded = conceded
+        self.points = win * 3 + draw
+
+        # rank 1 for the most points. Teams with the same points are ranked by `allteams` order.
+        order = np.argsort(-self.points, axis=1, kind='stable')
+        self.rank = np.empty_like(order)
+        np.put_along_axis(self.rank, order, np.arange(1, order.shape[1]+1)[np.newaxis,:], axis=1)
+
+    @property
+    def nsims(self):
+        return self.points.shape[0]
+
+    def table(self, isim=0):
+        """the final table of the `isim`'th simulation, the same format as `SimulateAllSeason.table`"""
+        table = pd.DataFrame({
+            'Rank': self.rank[isim],
+            'Team': self.allteams,
+            'Win': self.win[isim],
+            'Draw': self.draw[isim],
+            'Loss': self.loss[isim],
+            'Goals': [f'{g}:{c}' for g, c in zip(self.goals[isim], self.conceded[isim])],
+            'Points': self.points[isim]
+        })
+        table = table.sort_values(by='Rank', ignore_index=True)
+        return table
+
+    def to_simu_dict(self, teams=None):
+        """
+        return Dict[str, List[List[int]]], the same format as `large_simulations`
+        e.g. {'Arsenal': [[1, 29,  0,  9, 77, 33, 87], [2, 24,  4, 10, 77, 45, 76], ...]}
+        each row = [rank, win, draw, loss, goals, conceded, points]
+        """
+        if teams is None:
+            teams = self.allteams
+
+        team_idx = {team: i for i, team in enumerate(self.allteams)}
+
+        # (nsims, nteams, 7)
+        allres = np.stack(
+            (self.rank, self.win, self.draw, self.loss, self.goals, self.conceded, self.points),
+            axis=-1
+        )
+        return {team: allres[:,team_idx[team],:].tolist() for team in teams}
+
+    def rank_distribution(self):
+        """
+        return df, index = teams, columns = rank (1 ~ nteams)
+        the number of simulations in which the team finishs at each rank
+        """
+        nteams = len(self.allteams)
+        counts = np.zeros((nteams, nteams), dtype=int)
+        for iteam in range(nteams):
+            counts[iteam] = np.bincount(self.rank[:,iteam]-1, minlength=nteams)
+
+        return pd.DataFrame(counts, index=self.allteams, columns=list(range(1, nteams+1)))
+
+
+class BatchSimulateSeason:
+    """
+    Simulate the whole season many times at once.
+    The first `N_REAL_MATCHS` matches of each team use the real result and the remaining
+    matches are predicted by the regression models in `team_res_dict`.
+    """
+
+    def __init__(self, season, team_res_dict, league=None):
+        """
+        e.g. season = '1819'
+        team_res_dict : Dict[str_team_name, GLM_result_obj], the fitted model of each team
+        league : League or the name of a registered league (default Premier League)
+        """
+        self.season = season
+        self.league = get_league(league)
+
+        matchs_df = pd.read_csv(f'{self.league.clean_dir}/{season}.csv').sort_values('Date', ignore_index=True).drop('Unnamed: 0', axis=1)
+        self.allteams = matchs_df['HomeTeam'].unique()
+        team_idx = {team: i for i, team in enumerate(self.allteams)}
+
+        # fixtures
+        self.dates = matchs_df['Date'].values
+        self.home_idx = matchs_df['HomeTeam'].map(team_idx).values
+        self.away_idx = matchs_df['AwayTeam'].map(team_idx).values
+        self.home_score = matchs_df['HomeScore'].values
+        self.away_score = matchs_df['AwayScore'].values
+
+        # the played matches do not depend on the simulated results
+        # -> number of matches played before each fixture, and whether to use the real result
+        nteams = len(self.allteams)
+        nmatchs = len(matchs_df)
+        played = np.zeros(nteams, dtype=int)
+        self.home_played = np.empty(nmatchs, dtype=int)
+        self.away_played = np.empty(nmatchs, dtype=int)
+        for i, (ihome, iaway) in enumerate(zip(self.home_idx, self.away_idx)):
+            self.home_played[i] = played[ihome]
+            self.away_played[i] = played[iaway]
+            played[ihome] += 1
+            played[iaway] += 1
+        self.use_real = (self.home_played <= N_REAL_MATCHS) | (self.away_played <= N_REAL_MATCHS)
+
+        # attack/defence strength: (nmatchs, 6), for the view of home team and away team
+        self.home_adc, self.away_adc = self._read_adc(matchs_df)
+
+        # regression coefficients: (nteams, nvars) and covariance: (nteams, nvars, nvars)
+        self.coef, self.cov = self._extract_coef(team_res_dict)
+
+    def _read_adc(self, matchs_df):
+        """
+        Return: (home_adc, away_adc), both shape = (nmatchs, 6)
+        columns = [SelfAS, SelfDS, RivalAS, RivalDS, SelfFromCL, RivalFromCL]
+        """
+        strength_index = StrengthIndex.build(seasons=[self.season], league=self.league)
+        home_as, home_ds, home_cl = strength_index.lookup(self.season, matchs_df['HomeTeam'], True)
+        away_as, away_ds, away_cl = strength_index.lookup(self.season, matchs_df['AwayTeam'], False)
+
+        home_adc = np.stack((home_as, home_ds, away_as, away_ds, home_cl, away_cl), axis=1).astype(float)
+        away_adc = np.stack((away_as, away_ds, home_as, home_ds, away_cl, home_cl), axis=1).astype(float)
+        return home_adc, away_adc
+
+    def _extract_coef(self, team_res_dict):
+        """
+        Return: (coef, cov)
+        coef.shape = (nteams, nvars), cov.shape = (nteams, nvars, nvars)
+        The eliminated variables are filled with 0.
+        """
+        compiled = CompiledModels.compile(team_res_dict, self.allteams, REG_VARS)
+        return compiled.coef, compiled.cov
+
+    def _predict_team_score(self, x, team, method, rng):
+        """
+        x.shape = (nsims, nvars), regression data of `team`
+        method : str, 'directly', 'sample' or 'resample' (see `self.run`)
+        return : predicted goals, shape = (nsims,)
+        """
+        beta = self.coef[team]
+        eta = x @ beta
+        mu = np.minimum(np.exp(eta), MU_UPPER_BOUND)
+
+        if method == 'directly':
+            return np.floor(mu).astype(int)
+
+        elif method == 'sample':
+            return rng.poisson(mu)
+
+        elif method == 'resample':
+            # resample `mu` from log-normal distribution
+            # with mean = x_i^T * beta and var = x_i^T * F^-1 * x_i
+            var = np.einsum('ni,ij,nj->n', x, self.cov[team], x)
+            mu = rng.lognormal(mean=eta, sigma=np.sqrt(var))
+            mu = np.minimum(mu, MU_UPPER_BOUND)
+            return rng.poisson(mu)
+
+        else:
+            raise ValueError("unacceptable method")
+
+    def run(self, nsims=1, method='sample', seed=None):
+        """
+        nsims : int, number of simulated seasons
+        method : str, 'directly', 'sample' or 'resample'
+            Let log(mu) = xi^T * beta, the regression model predicted value
+            where beta is normal distribution,
+            and Let y  = predicted goals
+            (1) if 'directly':
+                y = floor(mu)
+            (2) if 'sample':
+                y is sampled from poisson(mu)
+            (3) if 'resample':
+                mu_new = log-normal(mu, xi^T * Cov(beta) * xi)
+                and y is sampled from poisson(mu_new)
+        seed : None, int or np.random.SeedSequence, passed to `np.random.default_rng`
+        return : SeasonResult
+        """
+        if method not in ('directly', 'sample', 'resample'):
+            raise ValueError("unacceptable method")
+
+        rng = np.random.default_rng(seed)
+        state = LeagueState(self.allteams, nsims)
+
+        x_home = np.empty((nsims, len(REG_VARS)))
+        x_away = np.empty((nsims, len(REG_VARS)))
+
+        with instrument.span('simulate', season=self.season, rows_in=len(self.dates)) as sp:
+            for i, date in enumerate(self.dates):
+                home = self.home_idx[i]
+                away = self.away_idx[i]
+
+                if self.use_real[i]:
+                    home_goal = self.home_score[i]
+                    away_goal = self.away_score[i]
+
+                else:
+                    state.reg_data(home, away, True, date, self.home_adc[i], out=x_home)
+                    state.reg_data(away, home, False, date, self.away_adc[i], out=x_away)
+                    home_goal = self._predict_team_score(x_home, home, method, rng)
+                    away_goal = self._predict_team_score(x_away, away, method, rng)
+
+                state.update(home, away, home_goal, away_goal)
+            sp.rows_out = nsims * len(self.dates)
+
+        return SeasonResult(self.allteams, state.win, state.draw, state.loss, state.goals, state.conceded)
+
+    def run_parallel(self, nsims=1, method='sample', seed=None, nworkers=None, chunksize=CHUNK_SIZE):
+        """
+        The same as `self.run`, but the simulations are split into chunks of `chunksize` seasons
+        and spread over a process pool with `nworkers` processes (None for the number of CPUs).
+        Every chunk has its own `np.random.SeedSequence` child stream, so the result only depends
+        on `seed` and `chunksize`, not on `nworkers`.
+        return : SeasonResult
+        """
+        if method not in ('directly', 'sample', 'resample'):
+            raise ValueError("unacceptable method")
+
+        chunks = [chunksize] * (nsims // chunksize)
+        if nsims % chunksize:
+            chunks.append(nsims % chunksize)
+        seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+
+        if nworkers == 1:
+            results = [_run_chunk(self, n, method, s) for n, s in zip(chunks, seeds)]
+        else:
+            with ProcessPoolExecutor(max_workers=nworkers, initializer=_init_worker, initargs=(self,)) as executor:
+                results = list(executor.map(_run_chunk, [None] * len(chunks), chunks, [method] * len(chunks), seeds))
+
+        # (5, nsims, nteams): win, draw, loss, goals, conceded
+        results = np.concatenate(results, axis=1).astype(int)
+        return SeasonResult(self.allteams, *results)
+
+
+# the simulator shared by all the chunks in a worker process
+_worker_simulator = None
+
+
+def _init_worker(simulator):
+    global _worker_simulator
+    _worker_simulator = simulator
+
+
+def _run_chunk(simulator, nsims, method, seed):
+    """return compact array, shape = (5, nsims, nteams): win, draw, loss, goals, conceded"""
+    if simulator is None:
+        simulator = _worker_simulator
+    res = simulator.run(nsims=nsims, method=method, seed=seed)
+    return np.stack((res.win, res.draw, res.loss, res.goals, res.conceded)).astype(np.int16)
+
+
+def large_simulations(team_res_dict, method, ntimes=200, season='1819', seed=None, nworkers=1, league=None):
+    """
+    return Dict[str, List[List[int]]]
+    e.g. {'Arsenal': [[1, 29,  0,  9, 77, 33, 87], [2, 24,  4, 10, 77, 45, 76], ...]}
+    each row = [rank, win, draw, loss, goals, conceded, points]
+    and there are `ntimes` rows
+    nworkers : number of processes (None for the number of CPUs). The result of the same `seed`
+               does not depend on `nworkers`.
+    league : League or the name of a registered league (default Premier League)
+    """
+    simulator = BatchSimulateSeason(season, team_res_dict, league)
+    result = simulator.run_parallel(nsims=ntimes, method=method, seed=seed, nworkers=nworkers)
+    return result.to_simu_dict(teams=list(team_res_dict.keys()))
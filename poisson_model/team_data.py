@@ -0,0 +1,41 @@
+# Read team_data for the regression models (from the columnar store if available, see `data_store`)
+
+
+import pandas as pd
+
+from data_store import read_team_data, load_team_data
+
+
+def get_df_team(team, season_start='1011', season_end='1718', columns=None, league=None):
+    """
+    return df of `team` from `season_start` to `season_end`, with a 'Season' column
+    columns : only read these columns of team_data if not None
+    league : League or the name of a registered league, default is Premier League
+    """
+    df_seasons = []
+
+    nseason = int(season_end[:2]) - int(season_start[:2]) + 1
+
+    for iseason in range(nseason):
+        season = f'{int(season_start[:2])+iseason:02d}{int(season_start[2:])+iseason:02d}'
+        try:
+            df_iseason = read_team_data(season, team, columns, league)
+            df_iseason.insert(0, 'Season', season)
+            df_seasons.append(df_iseason)
+        except FileNotFoundError:
+            continue
+
+    if df_seasons == []:
+        raise ValueError("Empty (Wrong name of team?)")
+    else:
+        df_seasons = pd.concat(df_seasons)
+        df_seasons = df_seasons.reset_index(drop=True)
+        return df_seasons
+
+
+def read_season_team_data(season, columns=None, league=None):
+    """
+    return a dict: Dict[str_team_name, df_of_team]
+    the same as `PredictGoals._read_team_data` in `Modeling.ipynb`
+    """
+    return load_team_data(season, columns=columns, league=league)
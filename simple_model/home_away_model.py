@@ -1,8 +1,39 @@
 # This model is just use the average home/away goals of last season to predict the future goals.
 
-import pandas as pd
+import numpy as np
 from scipy.stats import poisson
 
+from simple_model.season_cache import table_goals
+
+
+def _last_season(season):
+    """e.g. season = '1920' -> '1819'"""
+    return f'{int(season[:2])-1:02d}{int(season[2:])-1:02d}'
+
+
+def _last_season_avg_goals(season, teams):
+    """
+    return (avg_goal_home, avg_goal_away), the goals per home / away match of `teams`
+    in the last season of `season`, shape = (nteams,)
+    The teams not in Premier League are found in Championship League.
+    """
+    last_season = _last_season(season)
+    df_goals = table_goals(last_season, 0).reindex(teams)
+    
+    missing = df_goals['GoalsHome'].isna().values
+    if missing.any():
+        # maybe the teams are from Championship League
+        df_goals.loc[missing] = table_goals(last_season, 1).reindex(np.asarray(teams)[missing]).values
+        
+        wrong = df_goals.index[df_goals['GoalsHome'].isna()]
+        if len(wrong) > 0:
+            raise ValueError(f"Wrong name of the team! ({', '.join(wrong)})")
+            
+    return (
+        df_goals['GoalsHome'].values / df_goals['MatchsHome'].values,
+        df_goals['GoalsAway'].values / df_goals['MatchsAway'].values
+    )
+
 
 class HomeAwayModel:
     """
@@ -14,22 +45,25 @@ class HomeAwayModel:
         """e.g. season = '1920', team = 'Liverpool' """
         self.team_home = team_home
         
-        last_season = f'{int(season[:2])-1:02d}{int(season[2:])-1:02d}'
-        df_table = pd.read_csv(f'table/{last_season}.csv')
+        self.avg_goal_home, self.avg_goal_away = _last_season_avg_goals(season, [team])
+        self.mu = self.avg_goal_home[0] if self.team_home else self.avg_goal_away[0]
         
-        team_idx = df_table['Team'] == team       
+    @classmethod
+    def batch_mu(cls, season, team, team_home=True):
+        """
+        mu of a whole fixture list at once, the same as [HomeAwayModel(s, t, h).mu for ...]
+        season / team / team_home : array-like of the same length (or a scalar for all matchs),
+                                    e.g. the columns of a df
+        return mu, mu.shape = (nmatchs,)
+        """
+        season, team, team_home = np.broadcast_arrays(np.atleast_1d(season), np.atleast_1d(team), np.atleast_1d(team_home))
+        mu = np.empty(season.shape[0])
         
-        if team_idx.sum() == 0:
-            # maybe `team` is from Championship League
-            df_table = pd.read_csv(f'table/Championship/csv/{last_season}.csv')
-            team_idx = df_table['Name'] == team
-            
-            if team_idx.sum() == 0:
-                raise ValueError(f"Wrong name of the team! ({team})")
-                
-        self.avg_goal_home = df_table.loc[team_idx, 'GoalsHome'].map(lambda s: int(s.split(':')[0])).values / 19
-        self.avg_goal_away = df_table.loc[team_idx, 'GoalsAway'].map(lambda s: int(s.split(':')[0])).values / 19
-        self.mu = self.avg_goal_home[0] if self.team_home else self.avg_goal_away[0]
+        for s in np.unique(season):
+            idx = np.flatnonzero(season == s)
+            avg_goal_home, avg_goal_away = _last_season_avg_goals(s, team[idx])
+            mu[idx] = np.where(team_home[idx].astype(bool), avg_goal_home, avg_goal_away)
+        return mu
         
     def calc(self):
         if self.team_home:
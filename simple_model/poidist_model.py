@@ -2,9 +2,11 @@
 # Only use the `attck strength` and `defence strength` to find the expected goals by poisson distribution.
 
 
-import pandas as pd
+import numpy as np
 from scipy.stats import poisson
 
+from simple_model.season_cache import league_avg_goals, team_strength
+
 
 class _StrengthContainer:
     def __init__(self, att_home=None, def_home=None, att_away=None, def_away=None):
@@ -14,6 +16,20 @@ class _StrengthContainer:
         self.def_away = def_away
         
 
+def _last_season(season):
+    """e.g. season = '1920' -> '1819'"""
+    return f'{int(season[:2])-1:02d}{int(season[2:])-1:02d}'
+
+
+def _strength(season, teams):
+    """return df of the strength of `teams`, the columns are the same as `team_strength`"""
+    df_stren = team_strength(season).reindex(teams)
+    wrong = df_stren.index[df_stren['att_home'].isna()]
+    if len(wrong) > 0:
+        raise ValueError(f"{', '.join(wrong)} not in team_data/{season}")
+    return df_stren
+
+
 class PoiDistModel:
     def __init__(self, season, team, rival, team_home=True):
         """
@@ -24,24 +40,13 @@ class PoiDistModel:
         self.mu    : the parameter of poisson distribution
         self.pmf() : find the corresponding pmf of self.mu
         """
-        df = pd.read_csv(f'team_data/{season}/{team}.csv')
-        is_home = df['isHome']
+        df_stren = _strength(season, [team, rival])
         
         # attack/defence strength of the team
-        team_stren = _StrengthContainer(
-            att_home=df.loc[is_home, 'SelfAS'].values[0],
-            def_home=df.loc[is_home, 'SelfDS'].values[0],
-            att_away=df.loc[~is_home, 'SelfAS'].values[0],
-            def_away=df.loc[~is_home, 'SelfDS'].values[0]
-        )
+        team_stren = _StrengthContainer(*df_stren.iloc[0])
         
         # strength of the rival
-        rival_stren = _StrengthContainer(
-            att_home=df.loc[~is_home, 'RivalAS'].values[0],
-            def_home=df.loc[~is_home, 'RivalDS'].values[0],
-            att_away=df.loc[is_home, 'RivalAS'].values[0],
-            def_away=df.loc[is_home, 'RivalDS'].values[0]
-        )
+        rival_stren = _StrengthContainer(*df_stren.iloc[1])
         
         # the home/away goals in the entire league
         league_home_goals, league_away_goals = self._calc_league_avg_goals(season)
@@ -50,14 +55,36 @@ class PoiDistModel:
             self.mu = team_stren.att_home * rival_stren.def_away * league_home_goals
         else:
             self.mu = team_stren.att_away * rival_stren.def_home * league_away_goals
+            
+    @classmethod
+    def batch_mu(cls, season, team, rival, team_home=True):
+        """
+        mu of a whole fixture list at once, the same as [PoiDistModel(s, t, r, h).mu for ...]
+        season / team / rival / team_home : array-like of the same length (or a scalar for all matchs),
+                                            e.g. the columns of a df
+        return mu, mu.shape = (nmatchs,)
+        """
+        season, team, rival, team_home = np.broadcast_arrays(
+            np.atleast_1d(season), np.atleast_1d(team), np.atleast_1d(rival), np.atleast_1d(team_home)
+        )
+        team_home = team_home.astype(bool)
+        mu = np.empty(season.shape[0])
+        
+        for s in np.unique(season):
+            idx = np.flatnonzero(season == s)
+            team_stren = _strength(s, team[idx])
+            rival_stren = _strength(s, rival[idx])
+            league_home_goals, league_away_goals = cls._calc_league_avg_goals(s)
+            
+            mu_home = team_stren['att_home'].values * rival_stren['def_away'].values * league_home_goals
+            mu_away = team_stren['att_away'].values * rival_stren['def_home'].values * league_away_goals
+            mu[idx] = np.where(team_home[idx], mu_home, mu_away)
+        return mu
         
-    def _calc_league_avg_goals(self, season):
+    @staticmethod
+    def _calc_league_avg_goals(season):
         """calculate the average home/away goals in the entire league"""
-        last_season = f'{int(season[:2])-1:02d}{int(season[2:])-1:02d}'
-        df_table = pd.read_csv(f'table/{last_season}.csv')
-        home_goals = df_table['GoalsHome'].map(lambda s: int(s.split(':')[0])).sum()
-        away_goals = df_table['GoalsAway'].map(lambda s: int(s.split(':')[0])).sum()
-        return home_goals/380, away_goals/380
+        return league_avg_goals(_last_season(season))
     
     def pmf(self, lower=0, upper=None):
         """lower/upper : the bounds of pmf"""
@@ -0,0 +1,68 @@
+# Parsed tables and strengths of each season, shared by `HomeAwayModel` and `PoiDistModel`.
+# Every season is read from the files once and kept in a bounded LRU cache, so building one model
+# per match (as `Modeling.ipynb`) does not read the same table / team_data again.
+# The cached frames are shared, do not modify them. Call `clear_cache()` after the data is rebuilt.
+
+
+from functools import lru_cache
+
+import pandas as pd
+
+from data_store import load_team_data, read_table
+
+
+# number of (season, level) entries kept by each cache
+CACHE_SIZE = 32
+
+
+def _goals(col):
+    """e.g. '45:20' -> 45"""
+    return col.map(lambda s: int(s.split(':')[0]))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def table_goals(season, level=0):
+    """
+    Goals scored at home / away, and the number of home / away matches of every team in `season`.
+    level : 0 (Premier league) or 1 (Championship league)
+    return df, index = team name, columns = ['GoalsHome', 'GoalsAway', 'MatchsHome', 'MatchsAway']
+    """
+    name_col = 'Team' if level == 0 else 'Name'
+    df_table = read_table(season, level=level)
+    return pd.DataFrame({
+        'GoalsHome': _goals(df_table['GoalsHome']).values,
+        'GoalsAway': _goals(df_table['GoalsAway']).values,
+        'MatchsHome': (df_table['WinHome'] + df_table['DrawHome'] + df_table['LossHome']).values,
+        'MatchsAway': (df_table['WinAway'] + df_table['DrawAway'] + df_table['LossAway']).values,
+    }, index=df_table[name_col].values)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def league_avg_goals(season):
+    """return (home goals, away goals) per match of Premier league in `season`"""
+    df_goals = table_goals(season, 0)
+    nmatchs = df_goals['MatchsHome'].sum()
+    return df_goals['GoalsHome'].sum() / nmatchs, df_goals['GoalsAway'].sum() / nmatchs
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def team_strength(season):
+    """
+    Attack / defence strength of every team in `season` (the same for all matches of the season).
+    return df, index = team name, columns = ['att_home', 'def_home', 'att_away', 'def_away']
+    """
+    df_team_dict = load_team_data(season, columns=['isHome', 'SelfAS', 'SelfDS'])
+
+    strength = {}
+    for team, df in df_team_dict.items():
+        is_home = df['isHome'].values.astype(bool)
+        strength[team] = (
+            df['SelfAS'].values[is_home][0], df['SelfDS'].values[is_home][0],
+            df['SelfAS'].values[~is_home][0], df['SelfDS'].values[~is_home][0]
+        )
+    return pd.DataFrame.from_dict(strength, orient='index', columns=['att_home', 'def_home', 'att_away', 'def_away'])
+
+
+def clear_cache():
+    for func in (table_goals, league_avg_goals, team_strength):
+        func.cache_clear()
@@ -0,0 +1,182 @@
+# Generate synthetic seasons in the same formats as the real data, for benchmarks and scaling tests:
+#   raw_data/<season>.txt                            : matches of the top league (parse_data1)
+#   table/Championship/raw_txt/{all,home,away}/<season>.txt : table of the second league (parse_data4)
+# Every league plays a double round robin, the goals are Poisson with random attack / defence
+# strength of each team, and `nswap` teams are promoted / relegated after every season.
+# The output only depends on the arguments (and `seed`).
+
+
+import os
+import string
+import datetime
+import numpy as np
+
+
+HOME_ADVANTAGE = 0.25
+BASE_GOALS = 0.1
+
+
+def season_name(iseason):
+    """e.g. 18 -> '1819'. The seasons are two-digit years, so there are at most 99 seasons."""
+    if not 0 <= iseason <= 98:
+        raise ValueError('the synthetic seasons are 0001 ~ 9899 (at most 99 seasons)')
+    return f'{iseason:02d}{iseason+1:02d}'
+
+
+def team_names(nteams):
+    """e.g. ['Team A', ..., 'Team Z', 'Team AA', ...], only letters and spaces (as the csv file names)"""
+    names = []
+    for i in range(nteams):
+        code = ''
+        i += 1
+        while i > 0:
+            i, r = divmod(i - 1, 26)
+            code = string.ascii_uppercase[r] + code
+        names.append(f'Team {code}')
+    return names
+
+
+def round_robin(nteams):
+    """
+    Fixtures of a double round robin (circle method)
+    return List[List[(home, away)]], the matches of each matchday, 2 * (nteams - 1) matchdays
+    (nteams - 1 is used for the odd number of teams, one team rests in each matchday)
+    """
+    teams = list(range(nteams)) + ([None] if nteams % 2 else [])
+    n = len(teams)
+
+    first_half = []
+    for iday in range(n - 1):
+        matchs = []
+        for i in range(n // 2):
+            home, away = teams[i], teams[n-1-i]
+            if home is not None and away is not None:
+                matchs.append((home, away) if (iday + i) % 2 == 0 else (away, home))
+        first_half.append(matchs)
+        teams = [teams[0], teams[-1]] + teams[1:-1]
+
+    return first_half + [[(away, home) for home, away in matchs] for matchs in first_half]
+
+
+def play_season(attack, defence, rng):
+    """
+    attack / defence : (nteams,), log strength of the teams
+    return (fixtures, home_goals, away_goals), fixtures is from `round_robin`, goals are List[array]
+    """
+    fixtures = round_robin(len(attack))
+    home_goals, away_goals = [], []
+    for matchs in fixtures:
+        home, away = np.array(matchs).T
+        home_goals.append(rng.poisson(np.exp(BASE_GOALS + HOME_ADVANTAGE + attack[home] - defence[away])))
+        away_goals.append(rng.poisson(np.exp(BASE_GOALS + attack[away] - defence[home])))
+    return fixtures, home_goals, away_goals
+
+
+def season_table(nteams, fixtures, home_goals, away_goals):
+    """
+    return (order, stats)
+        order : the teams sorted by points, goal difference and goals
+        stats : Dict[str_kind, (nteams, 5) array], kind = 'all' / 'home' / 'away',
+                columns = win, draw, loss, goals, conceded
+    """
+    stats = {kind: np.zeros((nteams, 5), dtype=int) for kind in ('all', 'home', 'away')}
+    for matchs, hg, ag in zip(fixtures, home_goals, away_goals):
+        for (home, away), h, a in zip(matchs, hg, ag):
+            for kind, team, g, c in (('home', home, h, a), ('away', away, a, h)):
+                result = np.array([g > c, g == c, g < c, g, c], dtype=int)
+                stats[kind][team] += result
+                stats['all'][team] += result
+
+    st = stats['all']
+    points = st[:,0] * 3 + st[:,1]
+    order = np.lexsort((-st[:,3], -(st[:,3] - st[:,4]), -points))
+    return order, stats
+
+
+def _date_line(date):
+    """e.g. 'Sunday 12 May 2019', the date format of the raw data"""
+    return date.strftime('%A %d %B %Y').replace(' 0', ' ')
+
+
+def raw_season_text(names, fixtures, home_goals, away_goals, start_date):
+    """return the content of raw_data/<season>.txt, the newest matchday first"""
+    interval = max(1, min(7, 280 // len(fixtures)))
+    blocks = []
+    for iday, (matchs, hg, ag) in enumerate(zip(fixtures, home_goals, away_goals)):
+        lines = [_date_line(start_date + datetime.timedelta(days=iday * interval))]
+        for (home, away), h, a in zip(matchs, hg, ag):
+            lines += [names[home], f'{h}-{a} ', names[away], ' ', f' {names[home]} Stadium, ', 'Synthetic City', ' ']
+        blocks.append('\n'.join(lines))
+    return '\n'.join(reversed(blocks)) + '\n'
+
+
+def champ_table_texts(names, order, stats):
+    """return Dict[str_kind, content], the raw_txt tables of the second league (9 lines per team)"""
+    texts = {}
+    for kind, st in stats.items():
+        lines = []
+        for rank, team in enumerate(order, 1):
+            win, draw, loss, goals, conceded = st[team]
+            lines += [
+                rank, f'{names[team]} FC', names[team], win + draw + loss,
+                win, draw, loss, f'{goals}:{conceded}', win * 3 + draw
+            ]
+        texts[kind] = ''.join(f'{line}\n' for line in lines)
+    return texts
+
+
+def generate_league(folder, nteams=20, nseasons=12, nteams_second=None, nswap=3, seed=0):
+    """
+    Write the synthetic data of `nseasons` seasons (0001, 0102, ...) into `folder`.
+    nteams / nteams_second : number of teams in the top / second league (default: nteams + 4)
+    nswap : number of promoted / relegated teams after every season
+    return List[str_season]
+    """
+    if nteams_second is None:
+        nteams_second = nteams + 4
+    if nswap > min(nteams, nteams_second):
+        raise ValueError('nswap should not be larger than the number of teams')
+
+    rng = np.random.default_rng(seed)
+    names = team_names(nteams + nteams_second)
+    attack = rng.normal(0, 0.25, len(names))
+    defence = rng.normal(0, 0.25, len(names))
+
+    # index of the teams in each league
+    top = np.arange(nteams)
+    second = np.arange(nteams, nteams + nteams_second)
+
+    os.makedirs(f'{folder}/raw_data', exist_ok=True)
+    for kind in ('all', 'home', 'away'):
+        os.makedirs(f'{folder}/table/Championship/raw_txt/{kind}', exist_ok=True)
+
+    seasons = []
+    for iseason in range(nseasons):
+        season = season_name(iseason)
+        seasons.append(season)
+        start_date = datetime.date(2000 + iseason, 8, 10)
+
+        # top league
+        fixtures, home_goals, away_goals = play_season(attack[top], defence[top], rng)
+        with open(f'{folder}/raw_data/{season}.txt', 'w') as file:
+            file.write(raw_season_text([names[t] for t in top], fixtures, home_goals, away_goals, start_date))
+        top_order, _ = season_table(len(top), fixtures, home_goals, away_goals)
+
+        # second league
+        fixtures, home_goals, away_goals = play_season(attack[second], defence[second], rng)
+        second_order, stats = season_table(len(second), fixtures, home_goals, away_goals)
+        for kind, text in champ_table_texts([names[t] for t in second], second_order, stats).items():
+            with open(f'{folder}/table/Championship/raw_txt/{kind}/{season}.txt', 'w') as file:
+                file.write(text)
+
+        # promotion / relegation
+        relegated = top[top_order[len(top)-nswap:]]
+        promoted = second[second_order[:nswap]]
+        top = np.concatenate((top[top_order[:len(top)-nswap]], promoted))
+        second = np.concatenate((second[second_order[nswap:]], relegated))
+
+        # the strength changes a little every season
+        attack += rng.normal(0, 0.05, len(names))
+        defence += rng.normal(0, 0.05, len(names))
+
+    return seasons
@@ -0,0 +1,76 @@
+# Registry of the team names: every team (and its aliases in the leagues, e.g. 'Wolverhampton' ->
+# 'Wolves') has a small integer id, which is the same in all the seasons and leagues of the process.
+# The joins by team (the strength lookup, the rival columns) compare the ids instead of the strings:
+#
+#   ids = team_ids(df['HomeTeam'])       # int16 array
+#   TEAMS.names_of(ids)                  # back to the names
+
+
+import numpy as np
+import pandas as pd
+
+from leagues import LEAGUES
+
+
+# dtype of the ids, so the registry has at most 32767 teams
+ID_DTYPE = np.int16
+
+
+class TeamRegistry:
+    """The ids are given in the order the teams are seen, and never change."""
+
+    def __init__(self):
+        self.ids = {}      # Dict[str_name_or_alias, int_id]
+        self.names = []    # List[str_name], names[id]
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name):
+        """return the id of `name`, a new id if it is not registered"""
+        if name not in self.ids:
+            if len(self.names) >= np.iinfo(ID_DTYPE).max:
+                raise OverflowError(f'more than {np.iinfo(ID_DTYPE).max} teams in the registry')
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        return self.ids[name]
+
+    def add_aliases(self, aliases):
+        """aliases : Dict[str_alias, str_name], the alias has the id of the name"""
+        for alias, name in aliases.items():
+            self.ids[alias] = self.add(name)
+
+    def intern(self, names):
+        """
+        names : array-like of str
+        return int16 array, the ids of `names`. Every distinct name is looked up once.
+        """
+        codes, uniques = pd.factorize(np.asarray(names, dtype=object))
+        if (codes < 0).any():
+            raise ValueError('the team name should not be missing')
+        uniq_ids = np.array([self.add(name) for name in uniques], dtype=ID_DTYPE)
+        return uniq_ids[codes]
+
+    def find(self, names):
+        """
+        names : array-like of str
+        return int array, the ids of `names`, -1 for the names not registered (they are not added)
+        """
+        codes, uniques = pd.factorize(np.asarray(names, dtype=object))
+        # the last -1 is for the missing names (code -1)
+        uniq_ids = np.array([self.ids.get(name, -1) for name in uniques] + [-1], dtype=int)
+        return uniq_ids[codes]
+
+    def names_of(self, ids):
+        """return object array, the names of `ids`"""
+        return np.array(self.names, dtype=object)[np.asarray(ids)]
+
+
+TEAMS = TeamRegistry()
+
+
+def team_ids(names):
+    """the ids of `names` in `TEAMS`, the aliases of the registered leagues are added first"""
+    for league in LEAGUES.values():
+        TEAMS.add_aliases(league.aliases)
+    return TEAMS.intern(names)
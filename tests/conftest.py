@@ -0,0 +1,19 @@
+# The scripts read the data by relative paths (e.g. clean_data/<season>.csv), so the tests run in
+# the root of the repository, which is also on sys.path (for the flat modules and `poisson_model`).
+
+import os
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope='session', autouse=True)
+def repo_root():
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    yield ROOT
+    os.chdir(cwd)
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.api as sm
+from scipy.stats import norm
+
+from data_store import load_team_data
+from poisson_model.compiled import CompiledModels, predict_season
+from poisson_model.fitting import TEAM_DATA_COLS, fit_team, reg_variables, team_reg_data
+from poisson_model.league_state import REG_VARS
+
+
+SEASON = '1819'
+
+# statsmodels warns about the column of zeros (SelfFromCL of a team never promoted)
+pytestmark = pytest.mark.filterwarnings('ignore:The design matrix is rank-deficient')
+
+
+def _conf_int_mu(X, beta, cov_mat, inv_link_func, alpha=0.05):
+    """`PredictGoals._conf_int_mu` of `Modeling.ipynb`"""
+    eta = X @ beta
+    eta_stderr = []
+    for xi in X:
+        eta_stderr.append(np.sqrt(xi @ cov_mat @ xi[:,np.newaxis]))
+    eta_stderr = np.array(eta_stderr).ravel()
+
+    z_cri = norm.ppf(1-alpha/2)
+    ci_lower = inv_link_func(eta - z_cri * eta_stderr)
+    ci_upper = inv_link_func(eta + z_cri * eta_stderr)
+    return np.vstack((ci_lower, ci_upper)).T
+
+
+@pytest.fixture(scope='module')
+def team_res_dict():
+    """statsmodels results of a few teams, trained by 16/17 ~ 17/18"""
+    team_res_dict = {}
+    for team in ['Arsenal', 'Everton', 'Brighton']:
+        y, X = team_reg_data(team, '1617', '1718')
+        variables = fit_team(team, '1617', '1718')[0].model.exog_names
+        team_res_dict[team] = sm.GLM(y, X[variables], family=sm.families.Poisson(), missing='drop').fit(scale='X2')
+
+    # all variables, so the rows with nan (PtDiff of the first round) have nan mu
+    y, X = team_reg_data('Chelsea', '1617', '1718')
+    team_res_dict['Chelsea'] = sm.GLM(y, X, family=sm.families.Poisson(), missing='drop').fit(scale='X2')
+    return team_res_dict
+
+
+def _notebook_predict(glmres, df_team, alpha):
+    """mu and ci of `PredictGoals.predict_by_real_data`"""
+    X = reg_variables(df_team).loc[:, glmres.model.exog_names]
+    mu = glmres.predict(X)
+    ci = _conf_int_mu(X.values, glmres.params.values, glmres.cov_params().values, glmres.model.family.link.inverse, alpha)
+    return np.asarray(mu), ci
+
+
+@pytest.mark.parametrize('alpha', [0.05, 0.2])
+def test_predict_season(team_res_dict, alpha):
+    compiled = CompiledModels.compile(team_res_dict)
+    predict_res = predict_season(compiled, SEASON, alpha)
+    df_team_dict = load_team_data(SEASON, list(team_res_dict), TEAM_DATA_COLS + ['Rival'])
+
+    assert list(predict_res) == list(team_res_dict)
+    for team, glmres in team_res_dict.items():
+        mu, ci = _notebook_predict(glmres, df_team_dict[team], alpha)
+        df = predict_res[team]
+
+        np.testing.assert_allclose(df['mu'], mu, rtol=1e-10)
+        np.testing.assert_allclose(np.array(df['ci'].tolist()), ci, rtol=1e-10)
+        np.testing.assert_array_equal(df['predict'], np.floor(mu))
+        assert (df['Rival'] == df_team_dict[team]['Rival']).all()
+
+    # the first round has no points difference
+    assert np.isnan(predict_res['Chelsea']['mu'].iloc[0])
+    assert np.isnan(predict_res['Chelsea']['ci'].iloc[0]).all()
+    assert not predict_res['Chelsea']['mu'].iloc[1:].isna().any()
+
+
+def test_predict_ignores_nan_of_unused_variables(team_res_dict):
+    compiled = CompiledModels.compile(team_res_dict)
+    team = 'Brighton'
+    assert 'PtDiff' not in team_res_dict[team].model.exog_names
+
+    df_team = load_team_data(SEASON, [team], TEAM_DATA_COLS)[team]
+    X = reg_variables(df_team)
+    assert X['PtDiff'].isna().any()
+
+    mu, ci = compiled.predict([team] * len(X), X[compiled.variables].values)
+    expected_mu, expected_ci = _notebook_predict(team_res_dict[team], df_team, 0.05)
+    assert not np.isnan(mu).any()
+    np.testing.assert_allclose(mu, expected_mu, rtol=1e-10)
+    np.testing.assert_allclose(ci, expected_ci, rtol=1e-10)
+
+
+def test_compile_order(team_res_dict):
+    compiled = CompiledModels.compile(team_res_dict, teams=['Brighton', 'Arsenal'])
+    assert list(compiled.teams) == ['Brighton', 'Arsenal']
+    assert compiled.variables[:len(REG_VARS)] == REG_VARS
+
+    res = team_res_dict['Arsenal']
+    ivar = [compiled.variables.index(var) for var in res.model.exog_names]
+    np.testing.assert_array_equal(compiled.coef[1, ivar], res.params.values)
+    assert (compiled.coef[1][~compiled.used[1]] == 0).all()
+    pd.testing.assert_frame_equal(
+        pd.DataFrame(compiled.cov[1][np.ix_(ivar, ivar)], index=res.model.exog_names, columns=res.model.exog_names),
+        res.cov_params()
+    )
@@ -0,0 +1,73 @@
+import os
+
+import pandas as pd
+import pytest
+
+import data_store
+from leagues import League
+
+
+@pytest.fixture
+def league(tmp_path):
+    return League('Test', nteams=2, root=str(tmp_path))
+
+
+def _team_data():
+    return {
+        'Arsenal': pd.DataFrame({'Round': [1, 2], 'Points': [3, 1]}),
+        'Burnley': pd.DataFrame({'Round': [1, 2], 'Points': [0, 1]}),
+    }
+
+
+def _write_csv(league, season, df_team_dict):
+    os.makedirs(f'{league.team_data_dir}/{season}', exist_ok=True)
+    for team, df_team in df_team_dict.items():
+        df_team.to_csv(f'{league.team_data_dir}/{season}/{team}.csv', index=False)
+
+
+def test_changed_csv_is_read_instead_of_the_store(league):
+    df_team_dict = _team_data()
+    _write_csv(league, '1819', df_team_dict)
+    data_store.save_team_data('1819', df_team_dict, league)
+    assert data_store.has_season('team_data', '1819', league)
+
+    # e.g. a parse_data script which only writes the csv files
+    new = pd.DataFrame({'Round': [1, 2], 'Points': [3, 4]})
+    new.to_csv(f'{league.team_data_dir}/1819/Arsenal.csv', index=False)
+
+    assert data_store.is_saved('team_data', '1819', league)
+    assert not data_store.has_season('team_data', '1819', league)
+    pd.testing.assert_frame_equal(data_store.read_team_data('1819', 'Arsenal', league=league), new)
+
+
+def test_new_csv_file_invalidates_the_store(league):
+    df_team_dict = _team_data()
+    _write_csv(league, '1819', df_team_dict)
+    data_store.save_team_data('1819', df_team_dict, league)
+
+    _write_csv(league, '1819', {'Chelsea': df_team_dict['Arsenal']})
+    assert not data_store.has_season('team_data', '1819', league)
+    assert data_store.teams_of_season('1819', league) == ['Arsenal', 'Burnley', 'Chelsea']
+
+
+def test_export_csv_replaces_the_changed_csv(league):
+    df_team_dict = _team_data()
+    _write_csv(league, '1819', df_team_dict)
+    data_store.save_team_data('1819', df_team_dict, league)
+    pd.DataFrame({'Round': [1], 'Points': [0]}).to_csv(f'{league.team_data_dir}/1819/Arsenal.csv', index=False)
+
+    data_store.export_csv('1819', league)
+    assert data_store.has_season('team_data', '1819', league)
+    pd.testing.assert_frame_equal(pd.read_csv(f'{league.team_data_dir}/1819/Arsenal.csv'), df_team_dict['Arsenal'])
+
+
+def test_changed_table_csv(league):
+    table = pd.DataFrame({'Rank': [1, 2], 'Team': ['Arsenal', 'Burnley'], 'Points': [4, 1]})
+    os.makedirs(league.table_dir, exist_ok=True)
+    table.to_csv(league.table_csv('1819'), index=False)
+    data_store.save_table('1819', table, league=league)
+    assert data_store.has_season('table', '1819', league)
+
+    new = table.assign(Points=[5, 1])
+    new.to_csv(league.table_csv('1819'), index=False)
+    pd.testing.assert_frame_equal(data_store.read_table('1819', league=league), new)
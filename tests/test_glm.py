@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.api as sm
+
+from poisson_model.backward_elimination import BackwardElimination
+from poisson_model.glm import fit_poisson, fit_poisson_subsets, poisson_aic
+
+
+# statsmodels warns about the column of zeros
+pytestmark = pytest.mark.filterwarnings('ignore:The design matrix is rank-deficient')
+
+
+def _data(nobs=200, seed=0):
+    """y on const, x1, x2 (x3 is noise), a column of zeros (as SelfFromCL) and a few rows with nan"""
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({
+        'const': 1.,
+        'x1': rng.normal(size=nobs),
+        'x2': rng.normal(size=nobs),
+        'zero': 0.,
+        'x3': rng.normal(size=nobs),
+    })
+    y = pd.Series(rng.poisson(np.exp(0.3 + 0.5 * X['x1'] - 0.3 * X['x2'])).astype(float))
+    y[[3, 50]] = np.nan
+    X.loc[[7, 120], 'x2'] = np.nan
+    X.loc[90, 'x1'] = np.nan
+    return y, X
+
+
+def _sm_fit(y, X, scale=None):
+    return sm.GLM(y, X, family=sm.families.Poisson(), missing='drop').fit(scale=scale)
+
+
+@pytest.mark.parametrize('columns', [
+    ['const', 'x1', 'x2', 'x3'],
+    ['const', 'x1', 'zero', 'x2', 'x3'],    # rank deficient
+    ['const', 'x1'],                        # x2 / x3 are not used, fewer dropped rows
+])
+@pytest.mark.parametrize('scale', ['1', 'X2'])
+def test_fit_poisson(columns, scale):
+    y, X = _data()
+    res = fit_poisson(y, X[columns], scale=scale)
+    expected = _sm_fit(y, X[columns], None if scale == '1' else 'X2')
+
+    assert res.nobs == expected.nobs
+    assert res.df_resid == expected.df_resid
+    np.testing.assert_allclose(res.params, expected.params, rtol=1e-6, atol=1e-10)
+    np.testing.assert_allclose(res.bse, expected.bse, rtol=1e-6, atol=1e-10)
+    np.testing.assert_allclose(res.cov_params(), expected.cov_params(), rtol=1e-6, atol=1e-10)
+    assert res.scale == pytest.approx(expected.scale, rel=1e-8)
+    assert res.llf == pytest.approx(expected.llf, rel=1e-8)
+    assert res.aic == pytest.approx(expected.aic, rel=1e-8)
+    assert res.pearson_chi2 == pytest.approx(expected.pearson_chi2, rel=1e-8)
+    assert res.deviance == pytest.approx(expected.deviance, rel=1e-8)
+
+
+def test_fit_poisson_subsets():
+    y, X = _data()
+    subsets = [[0, 1, 2, 4], [0, 1, 3, 4], [0, 2], [0, 1, 2, 3, 4]]
+    full = fit_poisson(y, X)
+
+    for start_params in (None, full.params.values):
+        params, cov, rank, valid, mu = fit_poisson_subsets(y, X, subsets, start_params)
+        aics = poisson_aic(y.values, mu, valid, rank)
+
+        for i, subset in enumerate(subsets):
+            expected = _sm_fit(y, X.iloc[:, subset])
+            out = np.setdiff1d(np.arange(X.shape[1]), subset)
+
+            assert valid[i].sum() == expected.nobs
+            assert rank[i] == expected.df_model + 1
+            np.testing.assert_allclose(params[i, subset], expected.params, rtol=1e-6, atol=1e-10)
+            np.testing.assert_allclose(cov[i][np.ix_(subset, subset)], expected.cov_params(), rtol=1e-6, atol=1e-10)
+            assert (params[i, out] == 0).all() and (cov[i][out] == 0).all()
+            assert aics[i] == pytest.approx(expected.aic, rel=1e-8)
+
+
+def _sm_backward_elimination(y, X):
+    """the procedure of `BackwardElimination` in `Modeling.ipynb`, by statsmodels"""
+    candidates = list(X.columns[1:])
+    target_aic = _sm_fit(y, X).aic
+    while candidates:
+        aics = [_sm_fit(y, X[['const'] + [c for c in candidates if c != drop]]).aic for drop in candidates]
+        imin = int(np.argmin(aics))
+        if aics[imin] > target_aic:
+            break
+        target_aic = aics[imin]
+        candidates.remove(candidates[imin])
+    return ['const'] + candidates, target_aic
+
+
+def test_backward_elimination():
+    y, X = _data(nobs=300)
+    X = X.drop(columns='zero')
+    idxcol, aic = BackwardElimination(y.values, X.values, columns=X.columns).find()
+
+    expected_cols, expected_aic = _sm_backward_elimination(y, X)
+    assert list(idxcol) == expected_cols == ['const', 'x1', 'x2']
+    assert aic == pytest.approx(expected_aic, rel=1e-8)
+
+    # without the names, the indices of the columns
+    assert BackwardElimination(y.values, X.values).find()[0] == [list(X.columns).index(c) for c in expected_cols]
+
+
+def test_backward_elimination_drops_the_zero_column():
+    y, X = _data(nobs=300)
+    idxcol, aic = BackwardElimination(y.values, X.values, columns=X.columns).find()
+
+    # the same AIC with or without the column of zeros, the drop is accepted within AIC_TOL
+    expected_cols, expected_aic = _sm_backward_elimination(y, X.drop(columns='zero'))
+    assert list(idxcol) == expected_cols
+    assert aic == pytest.approx(expected_aic, rel=1e-8)
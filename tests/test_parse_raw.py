@@ -0,0 +1,96 @@
+import io
+
+import pytest
+
+from parse_data1_raw2clean import (
+    ParseRawData, RawDataError, iter_raw_records, parse_new_matchs, raw_file_state
+)
+
+
+MATCHDAY = b"""Saturday 19 December 2020
+Arsenal
+1-1
+Burnley
+
+ Emirates Stadium,
+London
+
+
+Leeds
+2-0
+Everton
+
+ Elland Road,
+Leeds
+
+
+"""
+
+NEW_MATCHDAY = b"""Sunday 20 December 2020
+Chelsea
+3-0
+West Ham
+
+ Stamford Bridge,
+London
+
+
+"""
+
+
+def _write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_prepended_matchday(tmp_path):
+    raw_file = _write(tmp_path / '2021.txt', MATCHDAY)
+    _, state, _ = parse_new_matchs(raw_file)
+
+    _write(tmp_path / '2021.txt', NEW_MATCHDAY + MATCHDAY)
+    df, new_state, head_only = parse_new_matchs(raw_file, state)
+
+    assert head_only
+    assert df[['Date', 'HomeTeam', 'HomeScore', 'AwayScore', 'AwayTeam']].values.tolist() == [
+        ['2020-12-20', 'Chelsea', 3, 0, 'West Ham']
+    ]
+    assert new_state == raw_file_state(NEW_MATCHDAY + MATCHDAY)
+
+
+def test_unchanged_file(tmp_path):
+    raw_file = _write(tmp_path / '2021.txt', MATCHDAY)
+    _, state, _ = parse_new_matchs(raw_file)
+
+    df, new_state, head_only = parse_new_matchs(raw_file, state)
+    assert head_only and df.empty and new_state == state
+
+
+@pytest.mark.parametrize('new_data', [
+    # a corrected result
+    MATCHDAY.replace(b'2-0', b'2-1'),
+    # a match added below the first date line, the head of the file is changed
+    MATCHDAY.replace(b'Leeds\n2-0', NEW_MATCHDAY.split(b'\n', 1)[1] + b'Leeds\n2-0'),
+    # appended at the end
+    MATCHDAY + NEW_MATCHDAY,
+])
+def test_changed_head_is_parsed_again(tmp_path, new_data):
+    raw_file = _write(tmp_path / '2021.txt', MATCHDAY)
+    _, state, _ = parse_new_matchs(raw_file)
+
+    _write(tmp_path / '2021.txt', new_data)
+    df, _, head_only = parse_new_matchs(raw_file, state)
+
+    assert not head_only
+    assert df.equals(ParseRawData(raw_file).parse())
+
+
+def test_line_numbers_are_absolute():
+    data = NEW_MATCHDAY + MATCHDAY
+    records = list(iter_raw_records(io.BytesIO(data), start=len(NEW_MATCHDAY)))
+    assert [r.lineno for r in records] == [11, 19]
+
+    with pytest.raises(RawDataError, match='line 12'):
+        list(iter_raw_records(io.BytesIO(data.replace(b'1-1', b'x')), start=len(NEW_MATCHDAY)))
+
+    with pytest.raises(ValueError, match='beginning of a line'):
+        list(iter_raw_records(io.BytesIO(data), start=len(NEW_MATCHDAY) + 3))
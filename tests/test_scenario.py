@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from scipy.stats import chisquare
+
+from poisson_model.fitting import fit_all_teams
+from poisson_model.probability import poisson_pmf
+from poisson_model.scenario import OUTCOMES, ScenarioSimulator, _sample_outcome, _satisfy
+from poisson_model.simulation import BatchSimulateSeason
+
+
+NSIMS = 300
+
+
+@pytest.fixture(scope='module')
+def simulator():
+    return ScenarioSimulator(BatchSimulateSeason('1819', fit_all_teams('1819')[0]), nsims=NSIMS, seed=0)
+
+
+def _match(simulator, i):
+    sim = simulator.sim
+    return sim.allteams[sim.home_idx[i]], sim.allteams[sim.away_idx[i]]
+
+
+def _assert_same_rows(res, expected, rows):
+    for attr in ('win', 'draw', 'loss', 'goals', 'conceded'):
+        np.testing.assert_array_equal(getattr(res, attr)[rows], getattr(expected, attr)[rows])
+
+
+def test_no_forced_result_is_the_baseline(simulator):
+    _assert_same_rows(simulator.scenario({}), simulator.baseline, slice(None))
+
+
+@pytest.mark.parametrize('result', ['H', 'D', 'A', (3, 1)])
+def test_forced_result_holds(simulator, result):
+    # the last match: the change of the final table of the home team is the change of its goals in the match
+    i = len(simulator.sim.dates) - 1
+    home, away = _match(simulator, i)
+    ihome, iaway = simulator.sim.home_idx[i], simulator.sim.away_idx[i]
+    assert not simulator.sim.use_real[i]
+
+    res = simulator.scenario({(home, away): result})
+    base = simulator.baseline
+    home_goal = res.goals[:,ihome] - base.goals[:,ihome] + simulator.home_goals[i]
+    away_goal = res.goals[:,iaway] - base.goals[:,iaway] + simulator.away_goals[i]
+    assert _satisfy(result, home_goal, away_goal).all()
+
+    # the simulations which already satisfy the result are unchanged
+    kept = _satisfy(result, simulator.home_goals[i], simulator.away_goals[i])
+    assert not kept.all()
+    _assert_same_rows(res, base, kept)
+    np.testing.assert_array_equal(home_goal[kept], simulator.home_goals[i, kept])
+
+
+def test_unchanged_simulations(simulator):
+    i = len(simulator.sim.dates) // 2
+    assert not simulator.sim.use_real[i]
+    forced = {_match(simulator, i): 'H', _match(simulator, i + 5): (0, 0)}
+
+    res = simulator.scenario(forced)
+    kept = _satisfy('H', simulator.home_goals[i], simulator.away_goals[i]) & \
+        _satisfy((0, 0), simulator.home_goals[i+5], simulator.away_goals[i+5])
+    assert kept.any() and not kept.all()
+    _assert_same_rows(res, simulator.baseline, kept)
+
+    # the same random numbers in every scenario
+    _assert_same_rows(simulator.scenario(forced), res, slice(None))
+
+
+def test_wrong_forced_result(simulator):
+    home, away = _match(simulator, 0)
+    with pytest.raises(ValueError):
+        simulator.scenario({(home, away): 'W'})
+    with pytest.raises(KeyError, match='no match'):
+        simulator.scenario({(home, home): 'H'})
+
+
+@pytest.mark.parametrize('outcome', OUTCOMES)
+def test_sample_outcome_distribution(outcome):
+    n = 200000
+    mu_home, mu_away = 1.6, 1.1
+    v = np.random.default_rng(1).random((n, 2))
+    home_goal, away_goal = _sample_outcome(np.full(n, mu_home), np.full(n, mu_away), outcome, v)
+    assert _satisfy(outcome, home_goal, away_goal).all()
+
+    # the joint pmf of the independent Poisson goals, conditioned on the outcome
+    pmf = poisson_pmf([mu_home])[0][:,np.newaxis] * poisson_pmf([mu_away])[0][np.newaxis,:]
+    h, a = np.indices(pmf.shape)
+    pmf = np.where(_satisfy(outcome, h, a), pmf, 0)
+    pmf /= pmf.sum()
+
+    count = np.zeros(pmf.shape)
+    np.add.at(count, (home_goal, away_goal), 1)
+
+    # chi-square test of the scorelines, the rare ones (< 5 expected) in one bin
+    common = pmf * n >= 5
+    observed = np.append(count[common], count[~common].sum())
+    expected = np.append(pmf[common], pmf[~common].sum()) * n
+    assert chisquare(observed, expected).pvalue > 1e-3
@@ -0,0 +1,96 @@
+import os
+import json
+import threading
+import http.client
+
+import pytest
+
+from poisson_model.fitting import fit_team
+from poisson_model.model_store import load_models, model_path, save_models
+from poisson_model.server import MatchPredictor, make_server
+
+
+QUERY = {'home': 'Liverpool', 'away': 'Arsenal', 'date': '2019-05-12'}
+
+
+@pytest.fixture(scope='module')
+def predictor(tmp_path_factory):
+    # fitted in memory, the saved models/ of the repository are not used
+    return MatchPredictor.load('1819', models=str(tmp_path_factory.mktemp('models') / '1819.npz'))
+
+
+@pytest.fixture(scope='module')
+def server(predictor):
+    server = make_server(predictor, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    server.batcher.close()
+
+
+def _post(conn, body):
+    conn.request('POST', '/predict', body=json.dumps(body), headers={'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+
+@pytest.mark.parametrize('query', [
+    {'home': ['Arsenal'], 'away': 'Chelsea', 'date': '2019-05-12'},
+    {'home': 'Liverpool', 'away': {'team': 'Arsenal'}, 'date': '2019-05-12'},
+    {'home': 'Liverpool', 'away': 'Arsenal', 'date': ['2019-05-12']},
+    {'home': 'Liverpool', 'away': 'Arsenal'},
+    {'home': 'Nowhere', 'away': 'Arsenal', 'date': '2019-05-12'},
+])
+def test_parse_wrong_query(predictor, query):
+    with pytest.raises(ValueError):
+        predictor.parse(query)
+
+
+@pytest.mark.parametrize('body', [
+    {'home': ['Arsenal'], 'away': 'Chelsea', 'date': '2019-05-12'},
+    [QUERY, {'home': 'Liverpool', 'away': 'Arsenal', 'date': None}],
+    [1, 2],
+    5,
+])
+def test_invalid_body(server, body):
+    conn = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=10)
+    status, result = _post(conn, body)
+    assert status == 400
+    assert 'error' in result
+
+    # the connection is kept, and answers the next query
+    status, result = _post(conn, QUERY)
+    assert status == 200
+    assert result['prob_win'] + result['prob_draw'] + result['prob_loss'] == pytest.approx(1, abs=1e-6)
+    conn.close()
+
+
+def test_list_team_is_an_unknown_team(predictor):
+    for home in ('Nowhere', ['Arsenal']):
+        with pytest.raises(ValueError, match='is not in the season 1819'):
+            predictor.parse({'home': home, 'away': 'Chelsea', 'date': '2019-05-12'})
+
+
+def test_stats_count_the_errors(server):
+    conn = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=10)
+    before = server.latency.summary()
+    assert _post(conn, QUERY)[0] == 200
+    assert _post(conn, {'home': 'Nowhere', 'away': 'Arsenal', 'date': '2019-05-12'})[0] == 400
+    assert _post(conn, 5)[0] == 400
+
+    conn.request('GET', '/stats')
+    stats = json.loads(conn.getresponse().read())
+    assert stats['count'] - before['count'] == 3
+    assert stats['errors'] - before['errors'] == 2
+    conn.close()
+
+
+def test_models_of_another_league(tmp_path):
+    path = str(tmp_path / '1819.npz')
+    save_models('1819', {'Arsenal': fit_team('Arsenal', '1617', '1718')[0]}, '1617', path=path)
+    assert load_models('1819', path)[1].league == 'Premier League'
+    with pytest.raises(ValueError, match='not Championship'):
+        load_models('1819', path, league='Championship')
+    assert model_path('1819') == os.path.join('models', '1819.npz')
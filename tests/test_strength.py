@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from parse_data5_att_def_strength import StrengthIndex
+from team_ids import TEAMS
+
+
+@pytest.fixture(scope='module')
+def strength_index():
+    return StrengthIndex.build(seasons=['1819'])
+
+
+def test_lookup(strength_index):
+    AS, DS, from_cl = strength_index.lookup('1819', ['Arsenal', 'Wolves', 'Arsenal'], [True, False, False])
+    for i, (team, venue) in enumerate([('Arsenal', 0), ('Wolves', 1), ('Arsenal', 1)]):
+        row = strength_index.rows[('1819', team)]
+        assert (AS[i], DS[i]) == tuple(strength_index.strength[row, venue])
+    np.testing.assert_array_equal(from_cl, [False, True, False])
+
+
+@pytest.mark.parametrize('team', ['Nowhere', 'Leeds'])
+def test_unknown_team_is_not_registered(strength_index, team):
+    nteams = len(TEAMS)
+    with pytest.raises(KeyError, match=f"no strength of \\('1819', '{team}'\\)"):
+        strength_index.lookup('1819', ['Arsenal', team], [True, False])
+    assert len(TEAMS) == nteams
+    assert 'Nowhere' not in TEAMS.ids
@@ -0,0 +1,21 @@
+import pandas as pd
+
+from parse_data3_create_table import create_table_from_team_data
+
+
+def _team(goal, conceded, points):
+    return pd.DataFrame({'Goal': goal, 'Conceded': conceded, 'Points': points, 'isHome': [True, False]})
+
+
+def test_ties_by_goal_difference_then_goals():
+    df_team_dict = {
+        'A': _team([1, 0], [0, 0], [3, 1]),     # 4 points, GD +1, GF 1
+        'B': _team([3, 0], [0, 2], [3, 0]),     # 3 points, GD +1
+        'C': _team([2, 2], [0, 2], [3, 1]),     # 4 points, GD +2
+        'D': _team([3, 1], [2, 1], [3, 1]),     # 4 points, GD +1, GF 4
+        'E': _team([1, 0], [0, 0], [3, 1]),     # the same as A
+    }
+    table = create_table_from_team_data(df_team_dict)
+    assert table['Team'].tolist() == ['C', 'D', 'A', 'E', 'B']
+    assert table['Rank'].tolist() == [1, 2, 3, 4, 5]
+    assert table.columns[:7].tolist() == ['Rank', 'Team', 'Win', 'Draw', 'Loss', 'Goals', 'Points']
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from leagues import get_league
+from parse_data2_create_teamdata import MakeTeamData, _group_positions, form_columns, make_season_team_data
+
+
+@pytest.mark.parametrize('season', ['1011', '1819'])
+def test_make_season_team_data(season):
+    maker = MakeTeamData(f'{get_league().clean_dir}/{season}.csv')
+    df_team_dict = make_season_team_data(maker.df_season)
+
+    assert list(df_team_dict) == maker.allteams
+    for team, df_team in df_team_dict.items():
+        expected = maker._parse_team(team)
+        assert list(df_team.columns) == list(expected.columns)
+        df_team = df_team.astype({'Rival': object})
+        pd.testing.assert_frame_equal(df_team, expected, check_dtype=False)
+
+
+@pytest.mark.parametrize('window', [3, 'ewm5'])
+def test_form_columns(window):
+    df_season = MakeTeamData(f'{get_league().clean_dir}/1819.csv').df_season
+    df = pd.concat(make_season_team_data(df_season).values(), ignore_index=True)
+    pos = df['Round'].values - 1
+    cols = form_columns(df['Points'].values, df['Goal'].values, df['Conceded'].values, pos, [window])
+
+    # the form of each team before the match (excluding it), by pandas
+    goal = df.groupby(np.cumsum(pos == 0))['Goal']
+    if window == 3:
+        expected = goal.transform(lambda s: s.rolling(4, min_periods=1).sum()) - df['Goal']
+        np.testing.assert_array_equal(cols['b3MatchGoal'], expected)
+    else:
+        expected = goal.transform(lambda s: s.ewm(span=5, adjust=False).mean().shift())
+        np.testing.assert_allclose(cols['bEw5MatchGoal'], expected, rtol=1e-12)
+    np.testing.assert_array_equal(cols['bCumGoal'], goal.cumsum() - df['Goal'])
+    np.testing.assert_array_equal(_group_positions(np.cumsum(pos == 0)), pos)